@@ -1,18 +1,127 @@
 import json
+import logging
 
-from flask import Flask
+from flask import Flask, Response
 from flask import request
 from dm_function import send_message
-from llm_model import build_graph
-from langchain_core.messages import HumanMessage
+from dispatcher import Coalescer, Dispatcher, SenderInbox, SenderLocks
+from webhook_events import iter_messages, open_deduper
+import intent_rules
+import threading
+import time
+from usage_stats import usage_stats
+from sms import get_outbox
+from qa_cache import qa_cache
+from llm_gateway import LLMUnavailable
+import metrics
+from log_config import SAMPLED, setup_logging
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
-graph = build_graph()
+setup_logging()
+logger = logging.getLogger(__name__)
+
+GRAPH_MODE = os.getenv("graph_mode", "two_hop")
+# serve.py sets sender_lock_dir so several worker processes never run the
+# same conversation at once.
+dispatcher = Dispatcher(
+    max_workers=int(os.getenv("webhook_workers", "4")),
+    sender_locks=SenderLocks(os.getenv("sender_lock_dir")) if os.getenv("sender_lock_dir") else None,
+)
+# serve.py also sets sender_inbox: each worker only sees the webhook calls it
+# received, so a guest's messages are queued where every worker can take
+# them, in order, and where they outlive a worker restart.
+inbox = SenderInbox(os.getenv("sender_inbox")) if os.getenv("sender_inbox") else None
+INBOX_RECOVER_SECONDS = float(os.getenv("inbox_recover_seconds", "60"))
+deduper = open_deduper()
+WEBHOOK_MESSAGES = metrics.registry.counter("hotel_webhook_messages_total", "Incoming guest messages by outcome.", ["result"])
+INBOX_JOBS = metrics.registry.counter("hotel_inbox_jobs_total", "Inbox turns by outcome: handled, taken by another worker, or recovered after a worker died.", ["result"])
+
+
+def flush(sender_id, texts):
+    if inbox is None:
+        dispatcher.submit(sender_id, handle_message, sender_id, "\n".join(text for text in texts if text))
+    else:
+        dispatcher.submit(sender_id, handle_inbox, sender_id)
+
+
+# Guests often send a thought in several quick messages; they become one turn.
+coalescer = Coalescer(
+    flush,
+    delay=float(os.getenv("coalesce_seconds", "1.5")),
+    max_delay=float(os.getenv("coalesce_max_seconds", "5")),
+)
+
+# LangGraph, the LLM SDK and the stores are loaded on first use (or by
+# warm_up in the background), so the server can bind its port right away.
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                started = time.perf_counter()
+                import llm_model
+                llm_model.warm_up()
+                _graph = llm_model.build_graph(GRAPH_MODE)
+                logger.info("Graph ready in %.2fs", time.perf_counter() - started)
+    return _graph
+
+
+def warm_up():
+    threading.Thread(target=get_graph, daemon=True).start()
+    if inbox is not None:
+        threading.Thread(target=recover_inbox, name="inbox-recovery", daemon=True).start()
 
 app = Flask(__name__)
 
+
+def handle_message(sender_id, user_input_str):
+    if not user_input_str:
+        send_message(sender_id, "please provide text input only")
+        return
+    logger.debug("User input from %s: %s", sender_id, user_input_str, extra=SAMPLED)
+    from langchain_core.messages import HumanMessage
+    started = time.perf_counter()
+    try:
+        with metrics.turn(GRAPH_MODE):
+            get_graph().invoke({"messages": [HumanMessage(content=user_input_str)],"sender_id": sender_id}, config={"configurable": {"thread_id": sender_id}})
+    except LLMUnavailable as e:
+        # Quota or overload: tell the guest instead of dropping the message.
+        logger.warning("No LLM capacity for %s: %s", sender_id, e)
+        send_message(sender_id, "We're receiving a lot of messages right now. Please send your message again in a minute.")
+        return
+    usage_stats.record_turn(GRAPH_MODE, time.perf_counter() - started)
+
+
+def handle_inbox(sender_id, recovered=False):
+    """One turn from everything the sender has waiting in the inbox; runs under the sender's lock."""
+    messages = inbox.take(sender_id)
+    if not messages:
+        INBOX_JOBS.inc(result="taken")
+        return
+    INBOX_JOBS.inc(result="recovered" if recovered else "handled")
+    try:
+        handle_message(sender_id, "\n".join(text for _, text in messages if text))
+    finally:
+        inbox.done([message_id for message_id, _ in messages])
+
+
+def recover_inbox():
+    """Periodically turn messages that no worker took (its process died first) into turns."""
+    while True:
+        time.sleep(INBOX_RECOVER_SECONDS)
+        try:
+            for sender_id in inbox.stale(INBOX_RECOVER_SECONDS):
+                logger.info("Recovering waiting messages for %s", sender_id)
+                dispatcher.submit(sender_id, handle_inbox, sender_id, recovered=True)
+        except Exception:
+            logger.exception("Could not recover inbox messages")
+
 @app.route("/")
 def hello_world():
     return "<p>Hello, World!</p>"
@@ -21,22 +130,21 @@ def hello_world():
 def webhook():
     if request.method == "POST":
         try:
-            json_data = json.dumps(request.get_json(), indent=4)
-            print(json_data)
-            json_data = json.loads(json_data)
-            json_data = json_data["entry"][0]["messaging"][0]
-            sender_id = json_data["sender"]["id"]
-            user_input_str = json_data["message"].get("text", "")
-            print(f"Sender ID: {sender_id}")
-            if not user_input_str:
-                send_message(sender_id, "please provide text input only")
-                return "<p>No user input found.</p>"
-            if sender_id != os.getenv('my_instagram_id'):
-                print(f"User input: {user_input_str}")
-                print(f"Sender ID: {sender_id}")
-                graph.invoke({"messages": [HumanMessage(content=user_input_str)],"sender_id": sender_id}, config={"configurable": {"thread_id": sender_id}})
-        except:
-            pass
+            json_data = request.get_json()
+            logger.debug("Webhook payload: %s", json.dumps(json_data), extra=SAMPLED)
+            for sender_id, message_id, user_input_str in iter_messages(json_data):
+                if sender_id == os.getenv('my_instagram_id'):
+                    continue
+                if deduper.seen(message_id):
+                    logger.info("Ignoring redelivered message %s", message_id)
+                    WEBHOOK_MESSAGES.inc(result="duplicate")
+                    continue
+                WEBHOOK_MESSAGES.inc(result="accepted")
+                if inbox is not None:
+                    inbox.add(sender_id, user_input_str)
+                coalescer.add(sender_id, user_input_str)
+        except Exception:
+            logger.exception("Could not process webhook payload")
         return "<p>This is POST Request, Hello Webhook!</p>"
     
     if request.method == "GET":
@@ -48,5 +156,55 @@ def webhook():
         else:
             return "<p>This is GET Request, Hello Webhook!</p>"
 
+# serve.py sets metrics_db so /metrics adds up every worker, not just the one that answered.
+if os.getenv("metrics_db"):
+    metrics.registry.share(os.getenv("metrics_db"), interval=float(os.getenv("metrics_publish_seconds", "5")))
+metrics.registry.gauge("hotel_dispatcher_queue_depth", "Webhook jobs waiting for a dispatcher thread.", lambda: dispatcher.stats()["queue_depth"])
+metrics.registry.gauge("hotel_coalescer_waiting_senders", "Senders whose messages are being coalesced.", lambda: coalescer.stats()["waiting_senders"])
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/dispatcher")
+def dispatcher_stats():
+    return dispatcher.stats()
+
+@app.route("/webhook_events")
+def webhook_event_stats():
+    return {"dedup": deduper.stats(), "coalescing": coalescer.stats(), "inbox": inbox.stats() if inbox is not None else None}
+
+@app.route("/intent_classifier")
+def intent_classifier_stats():
+    return intent_rules.path_stats.snapshot()
+
+@app.route("/llm_usage")
+def llm_usage_stats():
+    return {"graph_mode": GRAPH_MODE, "modes": usage_stats.snapshot(), "context": usage_stats.context_snapshot()}
+
+@app.route("/structured_output")
+def structured_output_stats():
+    from structured_output import parse_stats
+    return parse_stats.snapshot()
+
+@app.route("/llm_gateway")
+def llm_gateway_stats():
+    import llm_model
+    return llm_model.get_gateway().stats()
+
+@app.route("/prompt_cache")
+def prompt_cache_stats():
+    import llm_model
+    return llm_model.get_prompt_cache().stats()
+
+@app.route("/qa_cache")
+def qa_cache_stats():
+    return qa_cache.stats()
+
+@app.route("/sms_outbox")
+def sms_outbox_stats():
+    return get_outbox().stats()
+
 if __name__ == "__main__":
+    warm_up()
     app.run(port=5000)
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""Bulk admin jobs against a live store: memory and the bot's write latency.
+
+Seeds a SQLite store with `--rows` synthetic bookings, then runs each
+booking_admin job (import, export, occupancy, conversion) in a child process
+while this process plays the bot: `--writers` threads upserting and reading
+single bookings, as the webhook path does. Reports each job's time and peak
+RSS growth, and the bot's p50/p99/max upsert latency during the job against
+an idle baseline. RSS MB is growth over the job, peak MB the child's
+whole peak. Run it at two sizes to see memory stay flat.
+
+    python benchmarks/bench_admin.py --rows 100000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import booking_admin
+from bench_snapshot import generate_csv
+from booking_store import open_store
+
+JOBS = {
+    "import": lambda store, csv_path, workdir: booking_admin.import_rows(store, booking_admin.read_rows(csv_path)),
+    "export": lambda store, csv_path, workdir: booking_admin.write_rows(os.path.join(workdir, "export.csv"), booking_admin.store_rows(store)),
+    "occupancy": lambda store, csv_path, workdir: booking_admin.occupancy(booking_admin.store_rows(store), "2025-01-01", "2026-12-31"),
+    "conversion": lambda store, csv_path, workdir: booking_admin.conversion(booking_admin.store_rows(store)),
+}
+
+
+def child(job, url, csv_path, workdir):
+    store = open_store(url, seed=None)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    JOBS[job](store, csv_path, workdir)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": time.perf_counter() - started, "rss_kb": peak - before, "peak_kb": peak}))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def live_traffic(url, writers, stop):
+    """Upsert latencies (seconds) of `writers` threads until `stop` is set."""
+    latencies = []
+    lock = threading.Lock()
+
+    def writer(index):
+        store = open_store(url, seed=None)
+        count = 0
+        while not stop.is_set():
+            reservation_id = f"LIVE{index}-{count % 50}"
+            started = time.perf_counter()
+            store.upsert(reservation_id, {"guest_name": "live guest", "status": "not_confirmed", "num_guests": 2})
+            store.get(reservation_id)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+            count += 1
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(writers)]
+    for thread in threads:
+        thread.start()
+    return threads, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--writers", type=int, default=4, help="threads upserting like the webhook path")
+    parser.add_argument("--child", nargs=4, metavar=("JOB", "URL", "CSV", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "bookings.csv")
+        url = f"sqlite:{os.path.join(workdir, 'bookings.db')}"
+        generate_csv(csv_path, args.rows)
+        booking_admin.import_rows(open_store(url, seed=None), booking_admin.read_rows(csv_path), pause=0)
+        print(f"{args.rows} bookings, {args.writers} live writers")
+        print(f"{'job':<12}{'seconds':>9}{'RSS MB':>9}{'peak MB':>9}{'live p50 ms':>13}{'p99 ms':>9}{'max ms':>9}")
+        for job in ["idle"] + list(JOBS):
+            stop = threading.Event()
+            threads, latencies = live_traffic(url, args.writers, stop)
+            if job == "idle":
+                time.sleep(2)
+                result = {"seconds": 2.0, "rss_kb": 0, "peak_kb": 0}
+            else:
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", job, url, csv_path, workdir],
+                                        check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+            stop.set()
+            for thread in threads:
+                thread.join()
+            print(f"{job:<12}{result['seconds']:>9.2f}{result['rss_kb'] / 1024:>9.1f}{result['peak_kb'] / 1024:>9.1f}{percentile(latencies, 0.5) * 1000:>13.2f}"
+                  f"{percentile(latencies, 0.99) * 1000:>9.2f}{max(latencies) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
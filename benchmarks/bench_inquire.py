@@ -0,0 +1,72 @@
+"""Turn latency of the `inquire` node: templated renderer vs LLM formatting.
+
+Runs offline against fake_llm.FakeChatModel with a configurable latency and
+a stubbed Instagram sender, using a throwaway booking store.
+
+    python benchmarks/bench_inquire.py --turns 200 --llm-latency 0.6
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds to first token of the fake LLM")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_inquire_")
+    shutil.copy(os.path.join(ROOT, "booking_data.csv"), workdir)
+    os.chdir(workdir)
+    os.environ.setdefault("gemini_api_key", "benchmark")
+    os.environ["checkpointer"] = "memory"
+    os.environ["reply_streaming"] = "0"
+
+    from langchain_core.messages import HumanMessage
+    from fake_llm import FakeChatModel
+    import inquire_renderer
+    import llm_model
+
+    llm_model.send_message = lambda id, message: None
+    llm_model.llm = FakeChatModel(
+        [json.dumps({"message": "Your booking RES2 for rohit is confirmed."})],
+        first_token_latency=args.llm_latency,
+    )
+
+    def run(question, fallback):
+        inquire_renderer.INQUIRE_LLM_FALLBACK = fallback
+        timings = []
+        for _ in range(args.turns):
+            state = {"messages": [HumanMessage(content=question)], "sender_id": "bench", "current_reservation_id": "RES2"}
+            started = time.perf_counter()
+            llm_model.inquire(state)
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    results = {
+        "template": run("What is the status of RES2?", fallback=False),
+        "llm": run("Could you tell me in your own words how RES2 looks overall", fallback=True),
+    }
+    print(f"{'path':<10}{'turns':>8}{'p50 ms':>12}{'p99 ms':>12}{'mean ms':>12}")
+    for path, timings in results.items():
+        print(f"{path:<10}{len(timings):>8}{percentile(timings, 0.5) * 1000:>12.3f}"
+              f"{percentile(timings, 0.99) * 1000:>12.3f}{statistics.mean(timings) * 1000:>12.3f}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
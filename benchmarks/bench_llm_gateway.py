@@ -0,0 +1,114 @@
+"""A burst of LLM calls against a rate-limited stub, with and without llm_gateway.
+
+The stub is fake_llm.FakeChatModel behind a provider-style quota: a token
+bucket of `--quota-rpm` requests per minute holding one second's worth,
+answering over-quota calls with "429 RESOURCE_EXHAUSTED" like Gemini.
+`--calls` callers start at once with a mix of priorities; `--duplicates` of
+them send the same prompt. Calling the stub directly, the calls above the
+quota fail; through the gateway (configured with the same quota) they are
+queued by priority, identical prompts share one call, and only calls whose
+deadline passes fail, with LLMUnavailable.
+
+    python benchmarks/bench_llm_gateway.py --calls 200 --quota-rpm 1200 --deadline 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from fake_llm import FakeChatModel, UNIVERSAL_REPLY
+from llm_gateway import LLMGateway, LLMUnavailable, NODE_PRIORITIES, TokenBucket
+
+NODES = ["update", "book", "chatBot", "inquire", "qa", "qa", "compact_history"]
+
+
+class QuotaStub(FakeChatModel):
+    def __init__(self, requests_per_minute, latency):
+        super().__init__([UNIVERSAL_REPLY], first_token_latency=latency)
+        self._quota = TokenBucket(requests_per_minute, burst_seconds=1)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _check(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._quota.wait_time(1, now) > 0:
+                self.rejected += 1
+                raise RuntimeError("429 RESOURCE_EXHAUSTED: quota exceeded for generate_content requests per minute")
+            self._quota.take(1, now)
+
+    def invoke(self, messages, **kwargs):
+        self._check()
+        return super().invoke(messages, **kwargs)
+
+    def stream(self, messages, **kwargs):
+        self._check()
+        yield from super().stream(messages, **kwargs)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(label, call, calls, duplicates):
+    results = {}
+    lock = threading.Lock()
+
+    def one(index):
+        node = NODES[index % len(NODES)]
+        text = "What time is check-in?" if index < duplicates else f"Guest message {index}"
+        messages = [SystemMessage(content=f"You answer for the {node} node."), HumanMessage(content=text)]
+        started = time.perf_counter()
+        try:
+            call(node, messages)
+            outcome = "ok"
+        except LLMUnavailable:
+            outcome = "unavailable"
+        except Exception:
+            outcome = "error"
+        with lock:
+            results.setdefault(NODE_PRIORITIES[node], []).append((outcome, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=calls) as pool:
+        list(pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - started
+    print(f"\n{label}: {calls} calls in {elapsed:.2f}s")
+    print(f"{'priority':<10}{'calls':>7}{'ok':>6}{'quota err':>11}{'deadline':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for priority, rows in sorted(results.items()):
+        latencies = [seconds for outcome, seconds in rows if outcome == "ok"] or [0.0]
+        count = lambda kind: sum(1 for outcome, _ in rows if outcome == kind)
+        print(f"{priority:<10}{len(rows):>7}{count('ok'):>6}{count('error'):>11}{count('unavailable'):>10}"
+              f"{percentile(latencies, 0.5) * 1000:>10.0f}{percentile(latencies, 0.99) * 1000:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--duplicates", type=int, default=20, help="calls that send the same prompt")
+    parser.add_argument("--quota-rpm", type=int, default=1200, help="stub quota, requests per minute")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stub call")
+    parser.add_argument("--deadline", type=float, default=8.0, help="gateway deadline per call")
+    parser.add_argument("--concurrency", type=int, default=16, help="gateway max_concurrency")
+    args = parser.parse_args()
+
+    direct = QuotaStub(args.quota_rpm, args.latency)
+    run("direct", lambda node, messages: direct.invoke(messages), args.calls, args.duplicates)
+
+    stub = QuotaStub(args.quota_rpm, args.latency)
+    gateway = LLMGateway(stub, requests_per_minute=args.quota_rpm, burst_seconds=1, max_concurrency=args.concurrency,
+                         deadline_seconds=args.deadline)
+    run("gateway", lambda node, messages: gateway.invoke(messages, NODE_PRIORITIES[node]), args.calls, args.duplicates)
+    print(f"provider calls {stub.calls}, rejected by quota {stub.rejected}; gateway {gateway.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Prompt size and build cost per turn with static prompt prefixes.
+
+Every node prompt is a static prefix (prompt_cache.STATIC_PREFIXES) plus a
+short per-turn context message. For one representative turn per node this
+reports:
+
+  build us     time to build the node's system messages for a turn, against
+               rebuilding the whole prompt text every turn as before
+  prompt B     bytes of the whole prompt (system messages, history, input)
+  prefix %     share of those bytes that is the byte-identical static prefix,
+               which Gemini's implicit caching can reuse
+  sent B       bytes still sent with prompt_cache=gemini, where the prefix is
+               referenced as cached content
+  tokens       estimated at four bytes per token, sent and total
+
+    python benchmarks/bench_prompts.py --history 6
+"""
+import argparse
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("gemini_api_key", "bench")
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+import prompt
+from prompt_cache import STATIC_PREFIXES, prompt_bytes
+
+DATE = "2026-11-01"
+ROW = {"guest_name": "Priya Sharma", "check_in_date": "2026-11-20", "check_out_date": "2026-11-22", "num_guests": 2,
+       "phone_number": "9876543210", "room_type": "king", "status": "not_confirmed"}
+
+
+def node_prompts():
+    """(node, build) where build() returns the node's system messages for one turn."""
+    return [
+        ("chatBot", lambda: [prompt.hotel_booking_flags_prompt]),
+        ("book", lambda: prompt.booking_details_prompt(DATE, "RES42")),
+        ("update", lambda: prompt.update_details_prompt(DATE, "RES42", ROW)),
+        ("inquire", lambda: prompt.inquire_response_prompt("RES42", ROW)),
+        ("qa", lambda: [prompt.qa_response_prompt]),
+        ("combined", lambda: prompt.combined_prompt(DATE, "TRUE", "RES42", ROW)),
+    ]
+
+
+def rebuild(messages):
+    # What each turn paid before the split: one fresh f-string of the whole prompt.
+    return SystemMessage(content="".join(str(message.content) for message in messages))
+
+
+def history(turns):
+    messages = []
+    for index in range(turns):
+        messages.append(HumanMessage(content=f"Guest message number {index} about the booking"))
+        messages.append(AIMessage(content='{"message": "Thanks! Could you share the check-in date for your stay?"}'))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=4, help="earlier guest/assistant exchanges in the prompt")
+    parser.add_argument("--repeat", type=int, default=20000, help="builds timed per node")
+    args = parser.parse_args()
+
+    earlier = history(args.history)
+    user_input = [HumanMessage(content="User input: Please make it 3 guests and a queen room")]
+    print(f"history={args.history} exchanges")
+    print(f"{'node':<10}{'build us':>10}{'rebuild us':>12}{'prompt B':>10}{'prefix %':>10}{'sent B':>9}{'tokens':>9}{'sent tok':>10}")
+    totals = [0, 0]
+    for node, build in node_prompts():
+        system_messages = build()
+        build_us = timeit.timeit(build, number=args.repeat) / args.repeat * 1e6
+        rebuild_us = timeit.timeit(lambda: rebuild(build()), number=args.repeat) / args.repeat * 1e6
+        messages = system_messages + earlier + user_input
+        total = prompt_bytes(messages)
+        prefix = prompt_bytes([STATIC_PREFIXES[node]])
+        sent = total - prefix
+        totals[0] += total
+        totals[1] += sent
+        print(f"{node:<10}{build_us:>10.2f}{rebuild_us:>12.2f}{total:>10}{prefix / total * 100:>9.0f}%{sent:>9}{total // 4:>9}{sent // 4:>10}")
+    print(f"all nodes: {totals[0]} prompt bytes, {totals[1]} sent with cached prefixes "
+          f"({(1 - totals[1] / totals[0]) * 100:.0f}% less)")
+
+
+if __name__ == "__main__":
+    main()
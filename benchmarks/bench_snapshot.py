@@ -0,0 +1,147 @@
+"""Load time and memory of the booking table: CSV against booking_snapshot.
+
+Generates `--rows` synthetic bookings, writes them as a booking CSV (in the
+legacy float-formatted style of booking_data.csv) and as a snapshot, then
+measures each way of reading them in a fresh child process:
+
+  csv dicts        csv.DictReader + normalize_row into a dict keyed by
+                   reservation ID, i.e. the whole table held as Python objects
+  pandas           pd.read_csv of the whole file, as llm_model.py used to do
+                   (skipped when pandas is not installed)
+  snapshot open    BookingSnapshot(path): mmap and header only
+  snapshot scan    every (reservation_id, row) pair decoded once, not kept
+  snapshot report  confirmed check-ins per day from the raw columns
+
+and, in this process, get() latency for random reservation IDs. Times and
+peak RSS growth are also shown scaled to one million bookings.
+
+    python benchmarks/bench_snapshot.py --rows 200000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from booking_snapshot import BookingSnapshot, read_csv, write_snapshot
+from booking_store import BOOKING_FIELDS
+
+NAMES = ["rohit", "raj", "dev", "Priya Sharma", "Ananya", "Kabir Mehta", "John Smith", "Meera"]
+ROOM_TYPES = ["king", "queen", "single bed", "king room", "suite", "twin"]
+STATUSES = ["confirmed", "not_confirmed"]
+
+
+def generate_csv(path, rows, seed=7):
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",".join(["reservation_id"] + BOOKING_FIELDS) + "\n")
+        for index in range(rows):
+            check_in = start + timedelta(days=rng.randrange(730))
+            values = [
+                f"RES{index + 1}",
+                f"{rng.choice(NAMES)} {index % 997}",
+                check_in.isoformat(),
+                (check_in + timedelta(days=rng.randrange(1, 8))).isoformat(),
+                f"{rng.randrange(1, 6)}.0",
+                f"{rng.randrange(6000000000, 9999999999)}.0",
+                rng.choice(ROOM_TYPES),
+                rng.choice(STATUSES),
+            ]
+            if index % 20 == 0:
+                # Drafts abandoned part way, like RES4/RES5 in booking_data.csv.
+                values[3:6] = ["", "", ""]
+            f.write(",".join(values) + "\n")
+
+
+def child(kind, path):
+    """Runs one measurement; prints seconds and peak RSS growth in KB as JSON."""
+    if kind == "pandas":
+        import pandas as pd
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if kind == "csv":
+        table = dict(read_csv(path))
+    elif kind == "pandas":
+        table = pd.read_csv(path)
+    elif kind == "snapshot-open":
+        table = BookingSnapshot(path)
+    elif kind == "snapshot-scan":
+        table = BookingSnapshot(path)
+        for _ in table.rows():
+            pass
+    elif kind == "snapshot-report":
+        table = BookingSnapshot(path)
+        confirmed = table.statuses.index("confirmed")
+        per_day = {}
+        for day, status in zip(table.column("check_in"), table.column("status")):
+            if status == confirmed:
+                per_day[day] = per_day.get(day, 0) + 1
+    else:
+        raise ValueError(kind)
+    seconds = time.perf_counter() - started
+    grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    print(json.dumps({"seconds": seconds, "rss_kb": grown}))
+
+
+def measure(kind, path):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", kind, path],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=20000, help="random get() calls timed on the snapshot")
+    parser.add_argument("--child", nargs=2, metavar=("KIND", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    scale = 1000000 / args.rows
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "bookings.csv")
+        snapshot_path = os.path.join(workdir, "bookings.snap")
+        generate_csv(csv_path, args.rows)
+        started = time.perf_counter()
+        write_snapshot(snapshot_path, read_csv(csv_path))
+        write_seconds = time.perf_counter() - started
+        csv_size, snapshot_size = os.path.getsize(csv_path), os.path.getsize(snapshot_path)
+        print(f"{args.rows} bookings: csv {csv_size / 1e6:.1f} MB, snapshot {snapshot_size / 1e6:.1f} MB "
+              f"({snapshot_size / csv_size * 100:.0f}%), csv -> snapshot in {write_seconds:.2f}s")
+
+        print(f"{'':<18}{'seconds':>10}{'RSS MB':>10}{'s / 1M':>10}{'MB / 1M':>10}")
+        runs = [("csv dicts", "csv", csv_path), ("pandas", "pandas", csv_path),
+                ("snapshot open", "snapshot-open", snapshot_path), ("snapshot scan", "snapshot-scan", snapshot_path),
+                ("snapshot report", "snapshot-report", snapshot_path)]
+        for label, kind, path in runs:
+            try:
+                result = measure(kind, path)
+            except subprocess.CalledProcessError as e:
+                print(f"{label:<18}skipped ({e.stderr.strip().splitlines()[-1]})")
+                continue
+            megabytes = result["rss_kb"] / 1024
+            print(f"{label:<18}{result['seconds']:>10.3f}{megabytes:>10.1f}{result['seconds'] * scale:>10.3f}{megabytes * scale:>10.1f}")
+
+        snapshot = BookingSnapshot(snapshot_path)
+        rng = random.Random(11)
+        ids = [f"RES{rng.randrange(1, args.rows + 1)}" for _ in range(args.lookups)]
+        started = time.perf_counter()
+        for reservation_id in ids:
+            snapshot.get(reservation_id)
+        print(f"snapshot get(): {(time.perf_counter() - started) / args.lookups * 1e6:.1f} us per lookup")
+        snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
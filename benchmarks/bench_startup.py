@@ -0,0 +1,92 @@
+"""Cold-start time of the webhook server, from a fresh interpreter to the first reply.
+
+Every run starts a new Python process in a throwaway directory (so the
+booking store is seeded from booking_data.csv again) and reports:
+
+  import_app     seconds to `import app` (what a worker pays before it can bind)
+  first_ack      seconds until the first POST /webhook is acknowledged
+  first_reply    seconds until the reply to that message is sent
+
+The LLM is fake_llm.FakeChatModel and Instagram sends are stubbed, so the
+numbers are the application's own startup cost.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, threading, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import app
+import_app = time.perf_counter() - started
+
+replied = threading.Event()
+app.send_message = lambda id, message: replied.set()
+client = app.app.test_client()
+body = {"entry": [{"messaging": [{"sender": {"id": "bench"}, "message": {"mid": "m1", "text": "hi"}}]}]}
+
+def patch_llm():
+    # Runs in the worker before the graph is built, as soon as llm_model is importable.
+    import llm_model
+    from fake_llm import FakeChatModel
+    llm_model.llm = FakeChatModel([json.dumps({"message": "Hello! How can I help with your stay?"})], first_token_latency=float(sys.argv[2]))
+    llm_model.send_message = lambda id, message: replied.set()
+    llm_model.send_action = lambda id, action="typing_on": True
+
+original_get_graph = app.get_graph
+def get_graph():
+    if app._graph is None:
+        patch_llm()
+    return original_get_graph()
+app.get_graph = get_graph
+
+client.post("/webhook", json=body)
+first_ack = time.perf_counter() - started
+replied.wait(60)
+first_reply = time.perf_counter() - started
+print("\nBENCH " + json.dumps({"import_app": import_app, "first_ack": first_ack, "first_reply": first_reply}))
+app.dispatcher.shutdown()
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds to first token of the fake LLM")
+    args = parser.parse_args()
+
+    results = {"import_app": [], "first_ack": [], "first_reply": [], "process": []}
+    for _ in range(args.runs):
+        workdir = tempfile.mkdtemp(prefix="bench_startup_")
+        shutil.copy(os.path.join(ROOT, "booking_data.csv"), workdir)
+        env = dict(os.environ, gemini_api_key="benchmark", checkpointer="sqlite:checkpoints.db", coalesce_seconds="0")
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD, ROOT, str(args.llm_latency)],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        results["process"].append(time.perf_counter() - started)
+        timings = json.loads(next(line[6:] for line in output.splitlines() if line.startswith("BENCH ")))
+        for key, value in timings.items():
+            results[key].append(value)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'phase':<14}{'runs':>6}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for phase, timings in results.items():
+        print(f"{phase:<14}{len(timings):>6}{statistics.median(timings) * 1000:>12.1f}"
+              f"{min(timings) * 1000:>10.1f}{max(timings) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
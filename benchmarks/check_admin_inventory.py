@@ -0,0 +1,100 @@
+"""booking_admin jobs whose store write fails must leave room holds as the store has the bookings.
+
+One king and three queen rooms and a handful of bookings, then set-status and
+import chunks whose transaction fails part way (an upsert raises), and the
+same jobs succeeding. After each, the rooms held must match the bookings'
+stored statuses: a confirmed booking holds its room and nothing else does.
+The exit status is 1 on any mismatch.
+
+    python benchmarks/check_admin_inventory.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import booking_admin
+from booking_store import open_store
+from inventory import RoomInventory
+
+STAY = {"check_in_date": "2030-05-01", "check_out_date": "2030-05-03", "num_guests": 2, "phone_number": "9876543210"}
+BOOKINGS = {
+    "ADM1": dict(STAY, guest_name="held", room_type="king", status="confirmed"),
+    "ADM2": dict(STAY, guest_name="waiting", room_type="queen", status="not_confirmed"),
+    "ADM3": dict(STAY, guest_name="waiting too", room_type="queen", status="not_confirmed"),
+}
+
+
+class FailingUpsert:
+    """Makes the store's upsert raise for `reservation_id` while active."""
+
+    def __init__(self, store, reservation_id):
+        self.store = store
+        self.reservation_id = reservation_id
+        self.upsert = store.upsert
+
+    def __enter__(self):
+        def upsert(reservation_id, row):
+            if reservation_id == self.reservation_id:
+                raise RuntimeError("disk full")
+            return self.upsert(reservation_id, row)
+        self.store.upsert = upsert
+
+    def __exit__(self, *exc):
+        self.store.upsert = self.upsert
+
+
+def mismatches(store, inventory, step):
+    """Bookings whose stored status disagrees with the rooms held."""
+    problems = []
+    expected = {"king": 1, "queen": 3}
+    for reservation_id, row in store.rows():
+        if row.get("status") == "confirmed":
+            expected[row["room_type"]] -= 1
+    for room_type, free in expected.items():
+        free_now = inventory.available(room_type, STAY["check_in_date"], STAY["check_out_date"])
+        if free_now != free:
+            problems.append(f"{step}: {free} {room_type} room(s) should be free by the store, {free_now} free in the inventory")
+    return problems
+
+
+def main():
+    os.chdir(tempfile.mkdtemp(prefix="admin_inventory_"))
+    store = open_store("sqlite:bookings.db", seed=None)
+    inventory = RoomInventory("inventory.db")
+    inventory.set_rooms({"king": 1, "queen": 3})
+    for reservation_id, row in BOOKINGS.items():
+        store.upsert(reservation_id, row)
+    inventory.sync_from(store)
+
+    steps = [
+        ("failed cancel", lambda: booking_admin.set_status(store, ["ADM1"], "cancelled", pause=0, inventory=inventory), "ADM1"),
+        ("failed confirm", lambda: booking_admin.set_status(store, ["ADM2", "ADM3"], "confirmed", pause=0, inventory=inventory), "ADM3"),
+        ("failed import", lambda: booking_admin.import_rows(store, [("ADM4", dict(STAY, guest_name="new", room_type="queen", status="confirmed")),
+                                                                    ("ADM5", dict(STAY, guest_name="new too", room_type="queen", status="not_confirmed"))],
+                                                             pause=0, inventory=inventory), "ADM5"),
+        ("confirm", lambda: booking_admin.set_status(store, ["ADM2", "ADM3"], "confirmed", pause=0, inventory=inventory), None),
+        ("cancel", lambda: booking_admin.set_status(store, ["ADM1", "ADM2"], "cancelled", pause=0, inventory=inventory), None),
+    ]
+    problems = mismatches(store, inventory, "seeded")
+    for step, job, failing in steps:
+        try:
+            if failing:
+                with FailingUpsert(store, failing):
+                    job()
+                problems.append(f"{step}: the store write did not fail")
+            else:
+                job()
+        except RuntimeError:
+            pass
+        problems += mismatches(store, inventory, step)
+    print(f"{len(steps)} admin jobs, {len(problems)} mismatches between the store and the room holds")
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Two-turn cancellation through build_graph(): only a confirmation right after the request cancels.
+
+Each script starts with a confirmed booking and the guest asking to cancel
+it; the scripted LLM marks the booking cancelled on every cancel turn and
+says so in its reply, as the update prompt tells the real model to. Reply
+streaming is on and room inventory off, so a reply streamed before the
+cancellation step would reach the guest. Checked after every turn, in both
+graph modes: the booking's status, the pending cancellation, and that the
+guest never saw "successfully cancelled" for a booking still on the books.
+The exit status is 1 on any mismatch.
+
+    python benchmarks/check_cancellation.py
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USER_INPUT = re.compile(r"User [Ii]nput: (.*?)(?:\n|$)")
+CANCEL = "I want to cancel my booking"
+CONFIRM = "Yes, go ahead and cancel it"
+QUESTION = "Do you have parking for guests"
+CANCELLED_REPLY = "Your booking {reservation_id} has been successfully cancelled."
+# (text, expected status after the turn, expected pending cancellation) per turn.
+SCRIPTS = {
+    "confirmed": [(CANCEL, "confirmed", True), (CONFIRM, "cancelled", False)],
+    "interrupted": [(CANCEL, "confirmed", True), (QUESTION, "confirmed", False), (CONFIRM, "confirmed", True),
+                    (CONFIRM, "cancelled", False)],
+}
+BOOKING = {"guest_name": "rohit", "check_in_date": "2030-05-01", "check_out_date": "2030-05-03", "num_guests": 2,
+           "phone_number": "9876543210", "room_type": "king", "status": "confirmed"}
+
+
+def reply(messages):
+    from fake_llm import detect_node
+    node = detect_node(messages)
+    text = "\n".join(str(message.content) for message in messages)
+    reservation_id = re.findall(r"Current Reservation ID[^:]*: (\w+)", text)
+    reservation_id = reservation_id[-1] if reservation_id else None
+    user_text = USER_INPUT.findall(str(messages[-1].content))
+    user_text = user_text[-1].strip() if user_text else ""
+    cancelling = user_text in (CANCEL, CONFIRM)
+    intent = "UPDATE" if cancelling else "QA"
+    message = CANCELLED_REPLY.format(reservation_id=reservation_id) if cancelling else "Yes, parking is free."
+    if node == "chatBot":
+        return json.dumps({"reservation_id": None, "intent": intent})
+    if node == "combined":
+        return json.dumps({"intent": intent, "reservation_id": reservation_id if cancelling else None, "message": message,
+                           "booking_data": {"status": "cancelled"} if cancelling else {}, "update_init": int(cancelling)})
+    if node == "update":
+        return json.dumps({"message": message, "reservation_id": reservation_id, "data": {"status": "cancelled"}, "update_init": 1})
+    return json.dumps({"message": message})
+
+
+def setup(workdir):
+    os.chdir(workdir)
+    os.environ.update(gemini_api_key="check", booking_store="sqlite:bookings.db", reply_streaming="1", llm_streaming="1",
+                      log_level=os.environ.get("log_level", "WARNING"))
+    os.environ.pop("room_inventory", None)
+    import llm_model
+    import sms
+    from fake_llm import FakeChatModel
+    sent = {}
+    llm_model.send_message = lambda id, message: sent.setdefault(id, []).append(message) or {"message_id": "check"}
+    llm_model.send_action = lambda id, action="typing_on": True
+    sms._outbox = sms.SmsOutbox("sms_outbox.db", transport=sms.FakeTransport(), rate_per_second=0, poll_interval=0.1).start()
+    llm_model.llm = FakeChatModel(reply)
+    llm_model.warm_up()
+    return llm_model, sent
+
+
+def check(llm_model, sent, mode):
+    from langchain_core.messages import HumanMessage
+    os.environ["checkpointer"] = f"sqlite:checkpoints_{mode}.db"
+    graph = llm_model.build_graph(mode)
+    problems = []
+    for name, script in SCRIPTS.items():
+        sender_id = f"{mode}-{name}"
+        reservation_id = f"CX{mode.upper()}{name.upper()}"
+        llm_model.get_store().upsert(reservation_id, BOOKING)
+        config = {"configurable": {"thread_id": sender_id}}
+        opening = {"current_reservation_id": reservation_id, "own_reservation_ids": [reservation_id]}
+        for index, (text, status, pending) in enumerate(script):
+            before = len(sent.get(sender_id, []))
+            graph.invoke({"messages": [HumanMessage(content=text)], "sender_id": sender_id, **(opening if index == 0 else {})}, config=config)
+            state = graph.get_state(config).values
+            got = ((llm_model.get_store().get(reservation_id) or {}).get("status"), state.get("pending_cancellation") == reservation_id)
+            if got != (status, pending):
+                problems.append(f"{mode} {name} turn {index} {text!r}: got (status, pending) {got}, expected {(status, pending)}")
+            replies = sent.get(sender_id, [])[before:]
+            if status != "cancelled" and any("successfully cancelled" in message for message in replies):
+                problems.append(f"{mode} {name} turn {index} {text!r}: guest told {reservation_id} was cancelled: {replies}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["two_hop", "combined", "both"], default="both")
+    args = parser.parse_args()
+
+    llm_model, sent = setup(tempfile.mkdtemp(prefix="cancellation_"))
+    problems = []
+    for mode in (["two_hop", "combined"] if args.mode == "both" else [args.mode]):
+        found = check(llm_model, sent, mode)
+        print(f"{mode}: {sum(len(script) for script in SCRIPTS.values())} turns, {len(found)} mismatches")
+        problems += found
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""LLM calls from several worker processes must stay within one provider quota.
+
+Starts `--processes` processes, each with an open_gateway() gateway, as
+serve.py's workers have, in front of an instant fake model. Each sends
+calls from `--threads` threads for `--seconds`. The quota
+(llm_requests_per_minute, one second of burst) is the provider's, so
+across all processes at most rate x (seconds + call deadline) + burst
+calls may reach the model. With the buckets shared through llm_limits_db
+that holds; with --per-process every worker spends the whole quota. The
+exit status is 1 when the total is over the quota.
+
+    python benchmarks/check_gateway_quota.py --processes 4 --rpm 600 --seconds 3
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEADLINE = 0.5
+
+
+def worker(env, threads, seconds, start_at, results):
+    os.environ.update(env)
+    from langchain_core.messages import HumanMessage
+    from fake_llm import FakeChatModel, UNIVERSAL_REPLY
+    from llm_gateway import LLMUnavailable, open_gateway
+    gateway = open_gateway(FakeChatModel([UNIVERSAL_REPLY]))
+    counts = {"called": 0, "unavailable": 0}
+    lock = threading.Lock()
+
+    def caller(index):
+        number = 0
+        while time.time() < start_at + seconds:
+            number += 1
+            try:
+                gateway.invoke([HumanMessage(content=f"{os.getpid()} {index} {number}")], deadline_seconds=DEADLINE)
+                outcome = "called"
+            except LLMUnavailable:
+                outcome = "unavailable"
+            with lock:
+                counts[outcome] += 1
+
+    time.sleep(max(0.0, start_at - time.time()))
+    pool = [threading.Thread(target=caller, args=(index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="calling threads per process")
+    parser.add_argument("--rpm", type=int, default=600, help="provider quota, requests per minute")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--per-process", action="store_true", help="without llm_limits_db, to see what it prevents")
+    args = parser.parse_args()
+
+    env = {"llm_requests_per_minute": str(args.rpm), "llm_burst_seconds": "1", "llm_processes": str(args.processes),
+           "llm_max_concurrency": str(args.processes * args.threads), "llm_coalesce": "0"}
+    if not args.per_process:
+        env["llm_limits_db"] = os.path.join(tempfile.mkdtemp(prefix="gateway_quota_"), "llm_limits.db")
+    results = multiprocessing.Queue()
+    start_at = time.time() + 2
+    processes = [multiprocessing.Process(target=worker, args=(env, args.threads, args.seconds, start_at, results))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    totals = {"called": 0, "unavailable": 0}
+    for _ in processes:
+        for outcome, count in results.get(timeout=60).items():
+            totals[outcome] += count
+    for process in processes:
+        process.join()
+
+    # A call queued at the end of the run may still go out within its deadline.
+    allowed = int(args.rpm / 60 * (args.seconds + DEADLINE) + max(1, args.rpm / 60))
+    print(f"{'per process' if args.per_process else 'shared'}: {args.processes} processes x {args.threads} threads for {args.seconds}s "
+          f"at {args.rpm} rpm: {totals['called']} calls reached the model (quota allows {allowed}), "
+          f"{totals['unavailable']} LLMUnavailable")
+    sys.exit(1 if totals["called"] > allowed else 0)
+
+
+if __name__ == "__main__":
+    main()
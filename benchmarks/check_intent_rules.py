@@ -0,0 +1,57 @@
+"""Phrases the intent rules must (and must not) classify without the LLM.
+
+Each case is (text, booking_in_progress, expected) where expected is the
+intent the rules settle on, or "LLM" when they must leave the message to
+the model (no rule, or confidence below MIN_CONFIDENCE). The exit status
+is 1 on any mismatch.
+
+    python benchmarks/check_intent_rules.py
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import intent_rules
+
+CASES = [
+    ("I want a new booking", False, "BOOK"),
+    ("I want a new booking", True, "BOOK"),
+    ("Can you book a room for me", False, "BOOK"),
+    ("Can you book a room for me", True, "LLM"),
+    ("Please confirm my new booking", False, "LLM"),
+    ("Please confirm my new booking", True, "LLM"),
+    ("cancel my new booking", True, "LLM"),
+    ("Can I change the dates on my new reservation?", True, "LLM"),
+    ("Is my new booking confirmed?", False, "LLM"),
+    ("Is my new booking confirmed?", True, "LLM"),
+    ("What is the status of RES3", False, "INQUIRE"),
+    ("RES3", False, "INQUIRE"),
+    ("can you confirm the status of RES3", False, "LLM"),
+    ("cancel RES3", False, "LLM"),
+    ("Show bookings for 8595995026", False, "LLM"),
+    ("thanks!", True, "QA"),
+    ("hello", False, "QA"),
+]
+
+
+def settled(text, booking_in_progress):
+    rule = intent_rules.classify(text, booking_in_progress)
+    return rule[0] if rule and rule[2] >= intent_rules.MIN_CONFIDENCE else "LLM"
+
+
+def main():
+    problems = []
+    for text, booking_in_progress, expected in CASES:
+        got = settled(text, booking_in_progress)
+        if got != expected:
+            problems.append(f"{text!r} (booking_in_progress={booking_in_progress}): got {got}, expected {expected}")
+    print(f"{len(CASES)} phrases, {len(problems)} mismatches")
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
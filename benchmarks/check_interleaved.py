@@ -0,0 +1,135 @@
+"""Interleaved senders through build_graph(): booking progress must stay per conversation.
+
+Half the senders start a booking and then say "two guests please"; the
+other half ask a hotel question and then say the same thing. The fake LLM
+classifies "two guests please" as UPDATE only when the prompt it receives
+says current_booking_progress is TRUE, so a booking flag shared between
+conversations would turn the browsers' turns into UPDATEs (and a lost
+flag would turn the bookers' into QA). All senders play each turn at the
+same moment, in both graph modes, and every turn's intent and
+booking_in_progress are checked against the script. The exit status is 1
+on any mismatch.
+
+    python benchmarks/check_interleaved.py --senders 16 --rounds 3
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROGRESS = re.compile(r"current_booking_progress: (TRUE|FALSE)")
+USER_INPUT = re.compile(r"User [Ii]nput: (.*?)(?:\n|$)")
+START = "I would like to stay with you next month"
+QUESTION = "Do you have parking for guests"
+AMBIGUOUS = "two guests please"
+# (text, expected intent, expected booking_in_progress) per turn.
+SCRIPTS = {
+    "booker": [(START, "BOOK", "TRUE"), (AMBIGUOUS, "UPDATE", "TRUE")],
+    "browser": [(QUESTION, "QA", "FALSE"), (AMBIGUOUS, "QA", "FALSE")],
+}
+BOOKING = {"guest_name": None, "check_in_date": None, "check_out_date": None, "num_guests": None,
+           "phone_number": None, "room_type": None, "status": "not_confirmed"}
+
+
+def reply(messages):
+    """What the scripted LLM answers; the intent depends only on what the prompt says."""
+    from fake_llm import detect_node
+    node = detect_node(messages)
+    if node == "compact_history":
+        return "The guest asked about a stay."
+    text = "\n".join(str(message.content) for message in messages)
+    progress = PROGRESS.findall(text)
+    in_progress = bool(progress) and progress[-1] == "TRUE"
+    user_text = USER_INPUT.findall(str(messages[-1].content))
+    user_text = user_text[-1].strip() if user_text else ""
+    if user_text == START:
+        intent = "BOOK"
+    elif user_text == AMBIGUOUS and in_progress:
+        intent = "UPDATE"
+    else:
+        intent = "QA"
+    message = f"Noted ({intent})."
+    if node == "chatBot":
+        return json.dumps({"reservation_id": None, "intent": intent})
+    if node == "combined":
+        return json.dumps({"intent": intent, "reservation_id": None, "message": message,
+                           "booking_data": dict(BOOKING) if intent == "BOOK" else {}, "update_init": 0})
+    if node == "book":
+        return json.dumps({"message": message, "booking_data": dict(BOOKING)})
+    if node == "update":
+        return json.dumps({"message": message, "reservation_id": None, "data": {}, "update_init": 0})
+    return json.dumps({"message": message})
+
+
+def setup(workdir, latency):
+    os.chdir(workdir)
+    os.environ.update(gemini_api_key="check", booking_store="sqlite:bookings.db", log_level=os.environ.get("log_level", "WARNING"))
+    os.environ.pop("room_inventory", None)
+    import llm_model
+    import sms
+    from fake_llm import FakeChatModel
+    llm_model.send_message = lambda id, message: {"message_id": "check"}
+    llm_model.send_action = lambda id, action="typing_on": True
+    sms._outbox = sms.SmsOutbox("sms_outbox.db", transport=sms.FakeTransport(), rate_per_second=0, poll_interval=0.1).start()
+    llm_model.llm = FakeChatModel(reply, first_token_latency=latency)
+    llm_model.warm_up()
+    return llm_model
+
+
+def check(llm_model, mode, senders, rounds):
+    """Mismatches, as messages, from `rounds` of every sender playing its script in lockstep."""
+    from langchain_core.messages import HumanMessage
+    os.environ["checkpointer"] = f"sqlite:checkpoints_{mode}.db"
+    graph = llm_model.build_graph(mode)
+    kinds = [list(SCRIPTS)[index % len(SCRIPTS)] for index in range(senders)]
+    problems = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(senders)
+
+    def sender(index):
+        sender_id = f"{mode}-{kinds[index]}-{index}"
+        config = {"configurable": {"thread_id": sender_id}}
+        for round_number in range(rounds):
+            # The opening turn once, then the ambiguous turn every round.
+            for text, intent, in_progress in SCRIPTS[kinds[index]][1 if round_number else 0:]:
+                barrier.wait()
+                graph.invoke({"messages": [HumanMessage(content=text)], "sender_id": sender_id}, config=config)
+                state = graph.get_state(config).values
+                got = (state.get("intent"), state.get("booking_in_progress", "FALSE"))
+                if got != (intent, in_progress):
+                    with lock:
+                        problems.append(f"{mode} {sender_id} round {round_number} {text!r}: got {got}, expected {(intent, in_progress)}")
+
+    with ThreadPoolExecutor(max_workers=senders) as pool:
+        list(pool.map(sender, range(senders)))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--senders", type=int, default=8, help="conversations played at once, half of them booking")
+    parser.add_argument("--rounds", type=int, default=3, help="times each sender repeats the ambiguous turn")
+    parser.add_argument("--mode", choices=["two_hop", "combined", "both"], default="both")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="seconds per fake LLM call, to overlap turns")
+    args = parser.parse_args()
+
+    llm_model = setup(tempfile.mkdtemp(prefix="interleaved_"), args.llm_latency)
+    problems = []
+    for mode in (["two_hop", "combined"] if args.mode == "both" else [args.mode]):
+        found = check(llm_model, mode, args.senders, args.rounds)
+        print(f"{mode}: {args.senders} senders x {args.rounds} rounds, {len(found)} mismatches")
+        problems += found
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Several worker processes behind one webhook: each guest's turns must stay in order, none lost.
+
+Starts `--workers` processes that each import app.py as a gunicorn worker
+would (shared sender_lock_dir and sender_inbox), with handle_message
+replaced by a stub that takes a random few milliseconds and appends the
+turn to a shared log. Every sender's numbered messages are posted to the
+workers in rotation, so consecutive messages land in different processes.
+Then one extra worker that holds its messages in a long coalescing window is
+killed, and the others must pick those messages up from the inbox. Checks
+that every sender's messages were handled exactly once and in the order they
+were sent, and that /metrics scraped from one worker counts the messages
+accepted by all of them, the killed one included. The exit status is 1 on
+any problem.
+
+    python benchmarks/check_multiworker.py --workers 3 --senders 8 --messages 6
+    python benchmarks/check_multiworker.py --per-process   # per-process queues and metrics
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ACCEPTED = re.compile(r'^hotel_webhook_messages_total\{result="accepted"\} (\S+)$', re.MULTILINE)
+
+
+def worker(workdir, use_inbox, commands, acks, env):
+    os.chdir(workdir)
+    os.environ.update({"sender_lock_dir": "locks", "coalesce_seconds": "0", "log_level": "WARNING", **env})
+    if use_inbox:
+        os.environ.update(sender_inbox="sender_inbox.db", metrics_db="metrics.db")
+    os.environ.pop("my_instagram_id", None)
+    import app
+
+    def handle_message(sender_id, text):
+        time.sleep(random.uniform(0.001, 0.02))
+        with open("turns.log", "a") as f:
+            f.write(f"{sender_id}\t{text.replace(chr(10), '|')}\n")
+
+    app.handle_message = handle_message
+    app.get_graph = lambda: None
+    app.warm_up()
+    client = app.app.test_client()
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+        if command == "scrape":
+            acks.put(client.get("/metrics").get_data(as_text=True))
+            continue
+        sender_id, message_id, text = command
+        client.post("/webhook", json={"entry": [{"messaging": [{"sender": {"id": sender_id}, "message": {"mid": message_id, "text": text}}]}]})
+        acks.put(message_id)
+    app.dispatcher.shutdown(wait=True)
+
+
+def start(workdir, use_inbox, acks, env):
+    commands = multiprocessing.Queue()
+    process = multiprocessing.Process(target=worker, args=(workdir, use_inbox, commands, acks, env), daemon=True)
+    process.start()
+    return process, commands
+
+
+def read_turns(workdir):
+    """{sender_id: [text, ...]} in the order the turns were handled."""
+    handled = {}
+    path = os.path.join(workdir, "turns.log")
+    if not os.path.exists(path):
+        return handled
+    with open(path) as f:
+        for line in f:
+            sender_id, texts = line.rstrip("\n").split("\t")
+            handled.setdefault(sender_id, []).extend(texts.split("|"))
+    return handled
+
+
+def wait_for_turns(workdir, messages, timeout=30):
+    deadline = time.monotonic() + timeout
+    while sum(map(len, read_turns(workdir).values())) < messages and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--senders", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=6, help="messages per sender")
+    parser.add_argument("--per-process", action="store_true", help="without the shared inbox and metrics file, to see what they prevent")
+    args = parser.parse_args()
+    use_inbox = not args.per_process
+
+    workdir = tempfile.mkdtemp(prefix="multiworker_")
+    acks = multiprocessing.Queue()
+    workers = [start(workdir, use_inbox, acks, {"inbox_recover_seconds": "1", "metrics_publish_seconds": "0.5"}) for _ in range(args.workers)]
+    # Holds every message for a minute, then dies before handling any.
+    doomed = start(workdir, use_inbox, acks, {"coalesce_seconds": "60", "coalesce_max_seconds": "60", "metrics_publish_seconds": "0.2"})
+    sent = {}
+    # Like Instagram, a sender's next message is only posted once the webhook
+    # call for the previous one returned; handling it is up to the workers.
+    for number in range(args.messages):
+        for index in range(args.senders):
+            sender_id = f"guest{index}"
+            text = f"m{number}"
+            sent.setdefault(sender_id, []).append(text)
+            _, commands = workers[(number + index) % args.workers]
+            commands.put((sender_id, f"{sender_id}-{number}", text))
+        for _ in range(args.senders):
+            acks.get(timeout=30)
+    wait_for_turns(workdir, args.senders * args.messages)
+    for index in range(args.senders):
+        sender_id = f"guest{index}"
+        sent[sender_id].append("late")
+        doomed[1].put((sender_id, f"{sender_id}-late", "late"))
+    for _ in range(args.senders):
+        acks.get(timeout=30)
+    time.sleep(1)
+    doomed[0].kill()
+    time.sleep(4)
+    workers[0][1].put("scrape")
+    scraped = acks.get(timeout=30)
+    for process, commands in workers:
+        commands.put(None)
+    for process, _ in workers:
+        process.join(30)
+
+    handled = read_turns(workdir)
+    problems = [f"{sender_id}: handled {handled.get(sender_id, [])}, sent {texts}"
+                for sender_id, texts in sent.items() if handled.get(sender_id, []) != texts]
+    print(f"{'shared' if use_inbox else 'per process'}: {args.workers} workers, {args.senders} senders x {args.messages + 1} messages, "
+          f"{len(problems)} senders out of order or missing messages")
+    accepted = ACCEPTED.search(scraped)
+    accepted = int(float(accepted.group(1))) if accepted else 0
+    print(f"/metrics from one worker: {accepted} of {args.senders * (args.messages + 1)} accepted messages")
+    if accepted != args.senders * (args.messages + 1):
+        problems.append("/metrics does not count every worker's messages")
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Load test: replay recorded webhook payloads against serve.py with a stubbed LLM.
+
+Starts serve.py with `--workers` processes in a throwaway directory (fake LLM
+via llm_backend=fake, Instagram sends going to instagram_stub.InstagramStub),
+then POSTs payloads from a JSONL file, one Instagram webhook body per line.
+Each replayed message gets a fresh message ID and is assigned to one of
+`--senders` conversations. Messages a sender sends within the server's
+coalescing window are answered by a single reply; the reply latency is
+measured from the oldest message each reply answers.
+
+    python benchmarks/load_test.py --workers 4 --messages 400 --senders 80 --llm-latency 0.3
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from instagram_stub import InstagramStub
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def load_payloads(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay_body(template, index, sender_id):
+    body = copy.deepcopy(template)
+    for entry in body.get("entry", []):
+        for event in entry.get("messaging", []):
+            event["sender"]["id"] = sender_id
+            if "message" in event:
+                event["message"]["mid"] = f"load-{index}-{event['message'].get('mid', '')}"
+    return body
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"serve.py exited with status {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError("serve.py did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payloads", default=os.path.join(ROOT, "benchmarks", "webhook_payloads.jsonl"))
+    parser.add_argument("--workers", type=int, default=2, help="serve.py worker processes")
+    parser.add_argument("--threads", type=int, default=4, help="request threads per worker")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--senders", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent webhook POSTs")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds to first token of the fake LLM")
+    parser.add_argument("--coalesce-seconds", type=float, default=None, help="server coalescing window (default: server setting)")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for all replies")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.payloads)
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    shutil.copy(os.path.join(ROOT, "booking_data.csv"), workdir)
+    stub = InstagramStub().start()
+    env = dict(
+        os.environ,
+        web_bind=f"127.0.0.1:{args.port}",
+        web_workers=str(args.workers),
+        web_threads=str(args.threads),
+        llm_backend="fake",
+        fake_llm_latency=str(args.llm_latency),
+        instagram_api_base=stub.url,
+        gemini_api_key="load-test",
+        checkpointer="sqlite:checkpoints.db",
+        booking_store="sqlite:bookings.db",
+        PYTHONUNBUFFERED="1",
+    )
+    env.pop("my_instagram_id", None)
+    if args.coalesce_seconds is not None:
+        env["coalesce_seconds"] = str(args.coalesce_seconds)
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "serve.py")], cwd=workdir, env=env,
+        stdout=open(os.path.join(workdir, "server.log"), "w"), stderr=subprocess.STDOUT,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    sent = {}
+    sent_lock = threading.Lock()
+    ack_seconds = []
+    errors = 0
+    try:
+        wait_until_up(base_url + "/", server)
+        session = requests.Session()
+
+        def post(index):
+            nonlocal errors
+            sender_id = f"load-sender-{index % args.senders}"
+            body = replay_body(payloads[index % len(payloads)], index, sender_id)
+            started = time.time()
+            with sent_lock:
+                sent.setdefault(sender_id, []).append(started)
+            try:
+                response = session.post(base_url + "/webhook", json=body, timeout=10)
+                response.raise_for_status()
+            except requests.RequestException:
+                errors += 1
+            ack_seconds.append(time.time() - started)
+
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(post, range(args.messages)))
+        post_seconds = time.time() - started
+
+        deadline = time.time() + args.timeout
+        last_count, last_change = -1, time.time()
+        while time.time() < deadline:
+            count = sum(1 for request in stub.requests if "message" in request["body"])
+            if count >= args.messages:
+                break
+            if count != last_count:
+                last_count, last_change = count, time.time()
+            elif count and time.time() - last_change > 10:
+                break
+            time.sleep(0.2)
+        finished = max([request["at"] for request in stub.requests] or [time.time()])
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        stub.stop()
+
+    replies = {}
+    for request in stub.requests:
+        if "message" in request["body"]:
+            replies.setdefault(request["body"]["recipient"]["id"], []).append(request["at"])
+    latencies = []
+    unanswered = 0
+    for sender_id, times in sent.items():
+        times.sort()
+        position = 0
+        for replied in sorted(replies.get(sender_id, [])):
+            if position < len(times) and times[position] <= replied:
+                latencies.append(replied - times[position])
+            while position < len(times) and times[position] <= replied:
+                position += 1
+        unanswered += len(times) - position
+    answered = sum(len(times) for times in replies.values())
+
+    print(f"workers={args.workers} threads={args.threads} messages={args.messages} senders={args.senders} llm_latency={args.llm_latency}s")
+    print(f"posted in {post_seconds:.2f}s, {errors} POST errors, {answered} replies in {finished - started:.2f}s "
+          f"({answered / max(finished - started, 1e-9):.1f} replies/s), {unanswered} messages unanswered")
+    print(f"{'metric':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for name, values in (("webhook ack", ack_seconds), ("reply latency", latencies)):
+        if values:
+            print(f"{name:<16}{percentile(values, 0.5) * 1000:>10.1f}{percentile(values, 0.95) * 1000:>10.1f}"
+                  f"{percentile(values, 0.99) * 1000:>10.1f}{statistics.mean(values) * 1000:>10.1f}")
+    print(f"server log: {os.path.join(workdir, 'server.log')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""Offline replay benchmark: recorded conversations through the graph with a fake LLM.
+
+Replays the conversations in a JSONL corpus (one {"name", "turns"} object per
+line; see benchmarks/conversations.jsonl) in a throwaway directory seeded
+from booking_data.csv. Each turn lists the reply the LLM gives for it per
+graph node; fake_llm.detect_node tells which node is asking and
+"{RESERVATION_ID}" is replaced with the reservation ID in the prompt. LLM
+latency is simulated, and Instagram and SMS sends go to in-memory stubs,
+so the numbers are the application's own cost.
+
+Turns go straight to app.handle_message (--through graph) or are POSTed
+to /webhook through the Flask test client (--through webhook). Reported:
+turns/s, p50/p99 turn latency per intent, LLM calls per turn and RSS growth.
+
+    python benchmarks/replay.py --repeat 20 --concurrency 8 --llm-latency 0.2
+    python benchmarks/replay.py --json-out baseline.json
+    python benchmarks/replay.py --baseline baseline.json --tolerance 0.2
+
+With --baseline the exit status is 1 if throughput, p50 or mean latency of
+an intent, LLM calls per turn or RSS growth got worse by more than the
+tolerance, so it can run on every change.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESERVATION_ID = re.compile(r"\bRES\d+\b")
+USER_INPUT = re.compile(r"^User [Ii]nput: (.*?)(?:\n current_booking_progress: .*)?$", re.DOTALL)
+DEFAULT_REPLIES = {
+    "chatBot": {"reservation_id": None, "intent": "QA"},
+    "qa": {"message": "Thanks for your message! How can I help with your stay?"},
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def load_conversations(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class ScriptedReplies:
+    """LLM replies looked up by the guest's text and the node that asks."""
+
+    def __init__(self, conversations):
+        from fake_llm import UNIVERSAL_REPLY
+        self.default = UNIVERSAL_REPLY
+        self.replies = {}
+        for conversation in conversations:
+            for turn in conversation["turns"]:
+                self.replies[turn["user"]] = turn.get("replies", {})
+
+    def __call__(self, messages):
+        from fake_llm import detect_node
+        node = detect_node(messages)
+        if node == "compact_history":
+            return "The guest asked about their stay and bookings."
+        match = USER_INPUT.match(str(messages[-1].content))
+        user_text = match.group(1) if match else str(messages[-1].content)
+        reply = self.replies.get(user_text, {}).get(node) or DEFAULT_REPLIES.get(node)
+        if reply is None:
+            return self.default
+        text = json.dumps(reply)
+        if "{RESERVATION_ID}" in text:
+            found = RESERVATION_ID.search("\n".join(str(message.content) for message in messages if message.type == "system"))
+            text = text.replace("{RESERVATION_ID}", found.group(0) if found else "RES1")
+        return text
+
+
+def setup(args, workdir):
+    shutil.copy(os.path.join(ROOT, "booking_data.csv"), workdir)
+    os.chdir(workdir)
+    os.environ.update(
+        gemini_api_key="replay",
+        graph_mode=args.mode,
+        coalesce_seconds="0",
+        checkpointer="sqlite:checkpoints.db",
+        booking_store="sqlite:bookings.db",
+        log_level=os.environ.get("log_level", "WARNING"),
+    )
+    os.environ.pop("my_instagram_id", None)
+    os.environ.pop("sender_lock_dir", None)
+    os.environ.pop("sender_inbox", None)
+
+    import app
+    import llm_model
+    import sms
+    from fake_llm import FakeChatModel
+
+    replies = {}
+    replies_lock = threading.Lock()
+
+    def send_message(id, message):
+        with replies_lock:
+            replies[id] = replies.get(id, 0) + 1
+        return {"message_id": "replay"}
+
+    app.send_message = llm_model.send_message = send_message
+    llm_model.send_action = lambda id, action="typing_on": True
+    sms._outbox = sms.SmsOutbox("sms_outbox.db", transport=sms.FakeTransport(), rate_per_second=0, poll_interval=0.1).start()
+    llm_model.llm = FakeChatModel(
+        ScriptedReplies(load_conversations(args.conversations)),
+        first_token_latency=args.llm_latency, token_latency=args.token_latency,
+    )
+    app.get_graph()
+    return app, replies
+
+
+def make_runner(app, through):
+    """`run(sender_id, text)` plays one turn and returns once it has been handled."""
+    if through == "graph":
+        return app.handle_message
+
+    done = {}
+    done_lock = threading.Lock()
+    handle_message = app.handle_message
+
+    def handled(sender_id, text):
+        try:
+            handle_message(sender_id, text)
+        finally:
+            with done_lock:
+                event = done.get(sender_id)
+            if event is not None:
+                event.set()
+
+    app.handle_message = handled
+    client = app.app.test_client()
+    counter = iter(range(1 << 62))
+
+    def run(sender_id, text):
+        event = threading.Event()
+        with done_lock:
+            done[sender_id] = event
+        body = {"entry": [{"messaging": [{"sender": {"id": sender_id}, "message": {"mid": f"replay-{next(counter)}", "text": text}}]}]}
+        client.post("/webhook", json=body)
+        if not event.wait(120):
+            raise RuntimeError(f"no reply for {sender_id}")
+    return run
+
+
+def play(app, run, conversations, prefix, repeat, concurrency):
+    """Replay every conversation `repeat` times; returns [(intent, seconds)] per turn."""
+    graph = app.get_graph()
+
+    def conversation(job):
+        index, item = job
+        sender_id = f"{prefix}-{item['name']}-{index}"
+        results = []
+        for turn in item["turns"]:
+            started = time.perf_counter()
+            run(sender_id, turn["user"])
+            seconds = time.perf_counter() - started
+            state = graph.get_state({"configurable": {"thread_id": sender_id}}).values
+            results.append((state.get("intent") or "unknown", seconds))
+        return results
+
+    jobs = [(index, item) for index in range(repeat) for item in conversations]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return [result for results in pool.map(conversation, jobs) for result in results]
+
+
+def by_intent(counts, position):
+    totals = {}
+    for key, count in counts.items():
+        totals[key[position]] = totals.get(key[position], 0) + count
+    return totals
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of `report` against `baseline`, as messages."""
+    problems = []
+    if report["turns_per_sec"] < baseline["turns_per_sec"] * (1 - tolerance):
+        problems.append(f"turns/s {report['turns_per_sec']:.1f} < {baseline['turns_per_sec']:.1f}")
+    if report["llm_calls_per_turn"] > baseline["llm_calls_per_turn"] + 0.01:
+        problems.append(f"LLM calls/turn {report['llm_calls_per_turn']:.2f} > {baseline['llm_calls_per_turn']:.2f}")
+    for intent, row in report["intents"].items():
+        before = baseline["intents"].get(intent)
+        if before is None:
+            continue
+        # p99 of a few hundred turns is too noisy to gate on; the mean still
+        # moves when the tail does. 1 ms of slack so millisecond turns do not flap.
+        for field in ("p50_ms", "mean_ms"):
+            if row[field] > before[field] * (1 + tolerance) + 1:
+                problems.append(f"{intent} {field} {row[field]:.1f} > {before[field]:.1f}")
+        if row["llm_calls_per_turn"] > before["llm_calls_per_turn"] + 0.01:
+            problems.append(f"{intent} LLM calls/turn {row['llm_calls_per_turn']:.2f} > {before['llm_calls_per_turn']:.2f}")
+    growth, before = report["rss_growth_kb_per_1000_turns"], baseline["rss_growth_kb_per_1000_turns"]
+    if growth > max(before, 0) * (1 + tolerance) + 4096:
+        problems.append(f"RSS growth {growth:.0f} KB/1000 turns > {before:.0f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", default=os.path.join(ROOT, "benchmarks", "conversations.jsonl"))
+    parser.add_argument("--mode", choices=["two_hop", "combined"], default="two_hop", help="graph_mode to build")
+    parser.add_argument("--through", choices=["graph", "webhook"], default="graph")
+    parser.add_argument("--repeat", type=int, default=10, help="times each conversation is replayed, by a new sender each time")
+    parser.add_argument("--concurrency", type=int, default=4, help="conversations replayed at once")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds to first token of the fake LLM")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per streamed chunk of the fake LLM")
+    parser.add_argument("--tracemalloc", action="store_true", help="also list the allocation sites that grew most")
+    parser.add_argument("--json-out", help="write the report to this file")
+    parser.add_argument("--baseline", help="report from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown against --baseline")
+    args = parser.parse_args()
+    args.conversations = os.path.abspath(args.conversations)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    json_out = os.path.abspath(args.json_out) if args.json_out else None
+
+    workdir = tempfile.mkdtemp(prefix="replay_")
+    conversations = load_conversations(args.conversations)
+    app, replies = setup(args, workdir)
+    import metrics
+    run = make_runner(app, args.through)
+
+    # One untimed pass so lazy imports, caches and SQLite files are warm.
+    play(app, run, conversations, "warmup", 1, args.concurrency)
+    if args.tracemalloc:
+        tracemalloc.start()
+        snapshot = tracemalloc.take_snapshot()
+    llm_before = by_intent(metrics.LLM_SECONDS.counts(), 1)
+    turns_before = by_intent(metrics.TURN_SECONDS.counts(), 1)
+    replies_before = sum(replies.values())
+    rss_before = rss_kb()
+    started = time.perf_counter()
+    results = play(app, run, conversations, "replay", args.repeat, args.concurrency)
+    elapsed = time.perf_counter() - started
+    rss_after = rss_kb()
+    llm_calls = {intent: count - llm_before.get(intent, 0) for intent, count in by_intent(metrics.LLM_SECONDS.counts(), 1).items()}
+    graph_turns = {intent: count - turns_before.get(intent, 0) for intent, count in by_intent(metrics.TURN_SECONDS.counts(), 1).items()}
+
+    latencies = {}
+    for intent, seconds in results:
+        latencies.setdefault(intent, []).append(seconds)
+    report = {
+        "mode": args.mode,
+        "through": args.through,
+        "llm_latency": args.llm_latency,
+        "turns": len(results),
+        "seconds": elapsed,
+        "turns_per_sec": len(results) / elapsed,
+        "replies": sum(replies.values()) - replies_before,
+        "llm_calls_per_turn": sum(llm_calls.values()) / max(sum(graph_turns.values()), 1),
+        "rss_kb": rss_after,
+        "rss_growth_kb_per_1000_turns": (rss_after - rss_before) * 1000 / max(len(results), 1),
+        "intents": {
+            intent: {
+                "turns": len(values),
+                "p50_ms": percentile(values, 0.5) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "mean_ms": statistics.mean(values) * 1000,
+                "llm_calls_per_turn": llm_calls.get(intent, 0) / max(graph_turns.get(intent, 0), 1),
+            }
+            for intent, values in sorted(latencies.items())
+        },
+    }
+
+    print(f"mode={args.mode} through={args.through} conversations={len(conversations)}x{args.repeat} "
+          f"concurrency={args.concurrency} llm_latency={args.llm_latency}s")
+    print(f"{report['turns']} turns in {elapsed:.2f}s ({report['turns_per_sec']:.1f} turns/s), {report['replies']} replies sent, "
+          f"{report['llm_calls_per_turn']:.2f} LLM calls/turn")
+    print(f"RSS {rss_after / 1024:.1f} MB, grew {(rss_after - rss_before) / 1024:.1f} MB "
+          f"({report['rss_growth_kb_per_1000_turns']:.0f} KB per 1000 turns)")
+    print(f"{'intent':<10}{'turns':>7}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'LLM/turn':>10}")
+    for intent, row in report["intents"].items():
+        print(f"{intent:<10}{row['turns']:>7}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['mean_ms']:>10.1f}{row['llm_calls_per_turn']:>10.2f}")
+    if args.tracemalloc:
+        print("largest allocation growth:")
+        for stat in tracemalloc.take_snapshot().compare_to(snapshot, "lineno")[:10]:
+            print(f"  {stat}")
+
+    app.dispatcher.shutdown()
+    if json_out:
+        with open(json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    if baseline_path:
+        with open(baseline_path) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        if problems:
+            print("REGRESSION against baseline:\n  " + "\n  ".join(problems))
+            sys.exit(1)
+        print("no regression against baseline")
+
+
+if __name__ == "__main__":
+    main()
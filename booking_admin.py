@@ -0,0 +1,281 @@
+"""Bulk import, export and reports over the booking store, for hotel staff.
+
+    python booking_admin.py export <out.csv|out.snap> [--status STATUS]
+    python booking_admin.py import <in.csv|in.snap>
+    python booking_admin.py set-status <status> <ids-file|->
+    python booking_admin.py occupancy <start> <end> [--out occupancy.csv]
+    python booking_admin.py conversion [--by month|room_type]
+
+Every command takes --store (default: the `booking_store` env var, the same
+store the bot uses) and --chunk-size. Reports can also read a CSV or
+snapshot instead of the store with --from.
+"""
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+from booking_snapshot import BookingSnapshot, read_csv, write_csv, write_snapshot
+from booking_store import normalize_row, open_store
+from inventory import nights, normalize_room_type, open_inventory
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.getenv("admin_chunk_size", "500"))
+# Seconds to sleep between write chunks, so the bot's own writes get the
+# store's write lock in between.
+CHUNK_PAUSE = float(os.getenv("admin_chunk_pause", "0.01"))
+
+
+def chunked(rows, size=CHUNK_SIZE):
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def store_rows(store, chunk_size=CHUNK_SIZE):
+    """(reservation_id, row) pairs from `store`, read a chunk at a time."""
+    for chunk in store.chunks(chunk_size):
+        yield from chunk
+
+
+def read_rows(path):
+    """(reservation_id, row) pairs from a booking CSV or a ".snap" snapshot, one at a time."""
+    if not path.endswith(".snap"):
+        yield from read_csv(path)
+        return
+    snapshot = BookingSnapshot(path)
+    try:
+        yield from snapshot.rows()
+    finally:
+        snapshot.close()
+
+
+def write_rows(path, rows):
+    """Write pairs as CSV, or as a snapshot if `path` ends in ".snap"; returns the count.
+
+    CSV is written as rows arrive. A snapshot is built as packed columns
+    before it is written, a few dozen bytes per booking.
+    """
+    return write_snapshot(path, rows) if path.endswith(".snap") else write_csv(path, rows)
+
+
+def _hold(inventory, reservation_id, row):
+    """Hold or release `row`'s room to match its status; False if no room was left to hold."""
+    if inventory is None or not inventory.enabled:
+        return True
+    if row.get("status") != "confirmed":
+        inventory.release(reservation_id)
+        return True
+    if not (row.get("room_type") and row.get("check_in_date") and row.get("check_out_date")):
+        return False
+    return inventory.reserve(reservation_id, row["room_type"], row["check_in_date"], row["check_out_date"])
+
+
+def _commit(store, changes, inventory=None, held=()):
+    """Upsert `changes` in one transaction, keeping `inventory` in step with what was stored.
+
+    `held` are (reservation_id, stored row or None) for the rooms already
+    reserved for `changes`; if the transaction fails they are put back as
+    the stored rows have them. Other rooms are only released once it commits.
+    """
+    try:
+        with store.transaction():
+            for reservation_id, row in changes:
+                store.upsert(reservation_id, row)
+    except BaseException:
+        for reservation_id, row in held:
+            if not _hold(inventory, reservation_id, row or {}):
+                logger.warning("Could not restore the room hold of %s", reservation_id)
+        raise
+    for reservation_id, row in changes:
+        row = normalize_row(row)
+        if row.get("status") != "confirmed":
+            _hold(inventory, reservation_id, row)
+
+
+def import_rows(store, rows, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE, inventory=None):
+    """Upsert (reservation_id, row) pairs into `store`, one transaction per chunk.
+
+    With an enabled `inventory`, confirmed bookings hold their rooms; those
+    that find none left are imported unchanged and counted as "unheld".
+    """
+    counts = {"imported": 0, "unheld": 0}
+    for chunk in chunked(rows, chunk_size):
+        held = []
+        for reservation_id, row in chunk:
+            if normalize_row(row).get("status") != "confirmed":
+                continue
+            previous = store.get(reservation_id)
+            if _hold(inventory, reservation_id, normalize_row(row)):
+                held.append((reservation_id, previous))
+            else:
+                counts["unheld"] += 1
+                logger.warning("Imported %s as confirmed without a held room", reservation_id)
+        _commit(store, chunk, inventory, held)
+        counts["imported"] += len(chunk)
+        time.sleep(pause)
+    return counts
+
+
+def set_status(store, reservation_ids, status, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE, inventory=None):
+    """Set `status` on each booking in `reservation_ids`, one transaction per chunk.
+
+    Rooms are held and released as the bot does when a guest confirms or
+    cancels; a booking that cannot be confirmed (no room left, or missing
+    room type or dates) keeps its status and is counted as "unheld".
+    """
+    counts = {"updated": 0, "unchanged": 0, "missing": 0, "unheld": 0}
+    for chunk in chunked(reservation_ids, chunk_size):
+        changes, held = [], []
+        for reservation_id in chunk:
+            row = store.get(reservation_id)
+            if row is None:
+                counts["missing"] += 1
+            elif row.get("status") == status:
+                counts["unchanged"] += 1
+            elif status == "confirmed" and not _hold(inventory, reservation_id, dict(row, status=status)):
+                counts["unheld"] += 1
+            else:
+                changes.append((reservation_id, dict(row, status=status)))
+                if status == "confirmed":
+                    held.append((reservation_id, row))
+        _commit(store, changes, inventory, held)
+        counts["updated"] += len(changes)
+        time.sleep(pause)
+    return counts
+
+
+def read_ids(path):
+    """Reservation IDs from a file (or "-" for stdin): one per line, or a CSV with a reservation_id column."""
+    f = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        first = f.readline()
+        if "," in first or first.strip() == "reservation_id":
+            column = next(csv.reader([first])).index("reservation_id")
+            for record in csv.reader(f):
+                if len(record) > column and record[column].strip():
+                    yield record[column].strip()
+            return
+        if first.strip():
+            yield first.strip()
+        for line in f:
+            if line.strip():
+                yield line.strip()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def occupancy(rows, start, end):
+    """{(night, room_type): rooms} for confirmed bookings, nights from `start` to `end` inclusive.
+
+    Memory grows with nights times room types, not with bookings.
+    """
+    counts = {}
+    for _, row in rows:
+        if row.get("status") != "confirmed":
+            continue
+        if not row.get("check_in_date") or row["check_in_date"] > end:
+            continue
+        room_type = normalize_room_type(row.get("room_type")) or "unknown"
+        for night in nights(row["check_in_date"], row.get("check_out_date")):
+            if start <= night <= end:
+                counts[(night, room_type)] = counts.get((night, room_type), 0) + 1
+    return dict(sorted(counts.items()))
+
+
+def conversion(rows, by="month"):
+    """Bookings per status and the not_confirmed -> confirmed rate, grouped by check-in month or room type.
+
+    Every booking starts as not_confirmed, so the confirmed share of the
+    bookings that were not cancelled is the conversion rate.
+    """
+    groups = {}
+    for _, row in rows:
+        if by == "month":
+            key = (row.get("check_in_date") or "")[:7] or "no date"
+        else:
+            key = normalize_room_type(row.get("room_type")) or "unknown"
+        group = groups.setdefault(key, {"bookings": 0, "confirmed": 0, "not_confirmed": 0, "cancelled": 0})
+        group["bookings"] += 1
+        if row.get("status") in group:
+            group[row["status"]] += 1
+    for group in groups.values():
+        decided = group["confirmed"] + group["not_confirmed"]
+        group["rate"] = round(group["confirmed"] / decided, 4) if decided else None
+    return dict(sorted(groups.items()))
+
+
+def write_report(path, header, records):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", help="store URL, e.g. sqlite:bookings.db (default: booking_store env var)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the store to a CSV or snapshot")
+    export.add_argument("path")
+    export.add_argument("--status", help="only bookings with this status")
+    load = commands.add_parser("import", help="upsert bookings from a CSV or snapshot")
+    load.add_argument("path")
+    status = commands.add_parser("set-status", help="change the status of many bookings")
+    status.add_argument("status", choices=["confirmed", "not_confirmed", "cancelled"])
+    status.add_argument("ids", help="file of reservation IDs, or - for stdin")
+    report = commands.add_parser("occupancy", help="confirmed rooms per night and room type")
+    report.add_argument("start")
+    report.add_argument("end")
+    report.add_argument("--from", dest="source", help="read a CSV or snapshot instead of the store")
+    report.add_argument("--out", help="write the report as CSV instead of printing it")
+    rate = commands.add_parser("conversion", help="not_confirmed -> confirmed conversion")
+    rate.add_argument("--by", choices=["month", "room_type"], default="month")
+    rate.add_argument("--from", dest="source", help="read a CSV or snapshot instead of the store")
+    args = parser.parse_args(argv)
+
+    if getattr(args, "source", None):
+        store, rows = None, read_rows(args.source)
+    else:
+        store = open_store(args.store, seed=None)
+        rows = store_rows(store, args.chunk_size)
+
+    if args.command == "export":
+        if args.status:
+            rows = ((reservation_id, row) for reservation_id, row in rows if row.get("status") == args.status)
+        print(f"Wrote {write_rows(args.path, rows)} bookings to {args.path}")
+    elif args.command == "import":
+        counts = import_rows(store, read_rows(args.path), args.chunk_size, inventory=open_inventory())
+        print(f"Imported {counts['imported']} bookings ({counts['unheld']} confirmed without a room)")
+    elif args.command == "set-status":
+        counts = set_status(store, read_ids(args.ids), args.status, args.chunk_size, inventory=open_inventory())
+        print(", ".join(f"{count} {outcome}" for outcome, count in counts.items()))
+    elif args.command == "occupancy":
+        report = occupancy(rows, args.start, args.end)
+        if args.out:
+            write_report(args.out, ["night", "room_type", "rooms"], [[night, room_type, rooms] for (night, room_type), rooms in report.items()])
+        else:
+            for (night, room_type), rooms in report.items():
+                print(f"{night}  {room_type:<14}{rooms:>6}")
+    elif args.command == "conversion":
+        for key, group in conversion(rows, args.by).items():
+            rate_text = "-" if group["rate"] is None else f"{group['rate'] * 100:.1f}%"
+            print(f"{key:<14}{group['bookings']:>8} bookings{group['confirmed']:>8} confirmed"
+                  f"{group['not_confirmed']:>8} not_confirmed{group['cancelled']:>6} cancelled{rate_text:>9}")
+    if store is not None:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
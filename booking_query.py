@@ -0,0 +1,75 @@
+import re
+from datetime import date, timedelta
+from booking_store import normalize_phone
+from intent_rules import PHONE_NUMBER
+
+NAME_IN_TEXT = re.compile(
+    r"\b(?:name is|named|under(?: the name)?(?: of)?|booked (?:as|for)|for guest)\s+([A-Za-z][A-Za-z.'-]*(?:\s+[A-Za-z][A-Za-z.'-]*){0,2})",
+    re.IGNORECASE,
+)
+NAME_STOP_WORDS = {"and", "with", "please", "for", "from", "on", "at", "phone", "number", "my", "the"}
+
+
+class BookingQuery:
+    """Lookups over a BookingStore that do not need a reservation ID.
+
+    Every method returns (reservation_id, row) pairs, oldest booking first,
+    and is answered from the store's secondary indexes.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def by_phone(self, phone):
+        digits = normalize_phone(phone)
+        if not digits:
+            return []
+        found = self.store.find("phone_number", digits)
+        if not found and len(digits) > 10:
+            # Guests often add or drop the country code.
+            found = self.store.find("phone_number", digits[-10:])
+        return found
+
+    def by_guest_name(self, name):
+        name = (name or "").strip()
+        return self.store.find("guest_name", name) if name else []
+
+    def by_status(self, status):
+        return self.store.find("status", status)
+
+    def check_in_between(self, start, end):
+        return self.store.check_in_between(start, end)
+
+    def arrivals(self, day=None):
+        day = (day or date.today()).isoformat()
+        return self.store.check_in_between(day, day)
+
+    def arrivals_tomorrow(self, today=None):
+        return self.arrivals((today or date.today()) + timedelta(days=1))
+
+    def latest(self, matches):
+        return matches[-1] if matches else None
+
+    def mentions_guest(self, text):
+        """True if `text` names a phone number or guest name that resolve() would look up."""
+        return bool(PHONE_NUMBER.search(text or "") or NAME_IN_TEXT.search(text or ""))
+
+    def resolve(self, text):
+        """Bookings matching a phone number or guest name mentioned in `text`."""
+        for match in PHONE_NUMBER.finditer(text or ""):
+            found = self.by_phone(match.group(0))
+            if found:
+                return found
+        match = NAME_IN_TEXT.search(text or "")
+        if match:
+            words = []
+            for word in match.group(1).split():
+                if word.lower() in NAME_STOP_WORDS:
+                    break
+                words.append(word)
+            while words:
+                found = self.by_guest_name(" ".join(words))
+                if found:
+                    return found
+                words.pop()
+        return []
@@ -0,0 +1,255 @@
+"""Compact, memory-mappable snapshot of the booking table.
+
+    python booking_snapshot.py export <store-url> <snapshot>
+    python booking_snapshot.py import <snapshot> <store-url>
+    python booking_snapshot.py from-csv <csv-path> <snapshot>
+    python booking_snapshot.py to-csv <snapshot> <csv-path>
+    python booking_snapshot.py info <snapshot>
+"""
+import array
+import bisect
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+from datetime import date
+from booking_store import BOOKING_FIELDS, normalize_row
+
+MAGIC = b"BKSNAP01"
+EPOCH = date(1970, 1, 1).toordinal()
+NULL_DATE = -(2 ** 31)
+NULL_GUESTS = -1
+OVERFLOW_CODE = 255
+# Column name -> array typecode. Strings are an offsets column ("I", one
+# more entry than rows) plus a UTF-8 heap; `nulls` has one bit per field.
+COLUMNS = {
+    "id_offsets": "I", "id_heap": "B",
+    "name_offsets": "I", "name_heap": "B",
+    "check_in": "i", "check_out": "i",
+    "num_guests": "h",
+    "phone": "Q", "phone_digits": "B",
+    "room_type": "B", "status": "B",
+    "nulls": "B",
+    "by_id": "I",
+}
+NULL_BITS = {field: 1 << index for index, field in enumerate(BOOKING_FIELDS)}
+
+
+def _day(value):
+    """Days since 1970-01-01 for a YYYY-MM-DD string, or None if it is not one."""
+    if len(value) != 10:
+        return None
+    try:
+        return date.fromisoformat(value).toordinal() - EPOCH
+    except ValueError:
+        return None
+
+
+def write_snapshot(path, rows):
+    """Write (reservation_id, row) pairs to `path` atomically; rows are normalised first.
+
+    Values that do not fit the fixed-width columns (non-ISO dates, huge
+    guest counts, more than 254 room types) are kept exactly in an overflow
+    table, so the snapshot is lossless.
+    """
+    columns = {name: array.array(code) for name, code in COLUMNS.items()}
+    columns["id_offsets"].append(0)
+    columns["name_offsets"].append(0)
+    id_heap, name_heap = bytearray(), bytearray()
+    codes = {"room_type": {}, "status": {}}
+    overflow = {}
+    ids = []
+    for index, (reservation_id, row) in enumerate(rows):
+        row = normalize_row(row)
+        ids.append(reservation_id)
+        id_heap += str(reservation_id).encode()
+        columns["id_offsets"].append(len(id_heap))
+        nulls = 0
+        for field, value in row.items():
+            if value is None:
+                nulls |= NULL_BITS[field]
+        if row["guest_name"] is not None:
+            name_heap += row["guest_name"].encode()
+        columns["name_offsets"].append(len(name_heap))
+        extra = {}
+        for field, column in (("check_in_date", "check_in"), ("check_out_date", "check_out")):
+            day = _day(row[field]) if row[field] is not None else NULL_DATE
+            if day is None:
+                extra[field], day = row[field], NULL_DATE
+            columns[column].append(day)
+        guests = row["num_guests"]
+        if guests is not None and not 0 <= guests < 2 ** 15:
+            extra["num_guests"], guests = guests, None
+        columns["num_guests"].append(NULL_GUESTS if guests is None else guests)
+        phone = row["phone_number"]
+        if phone is not None and len(phone) > 19:
+            extra["phone_number"], phone = phone, None
+        columns["phone"].append(int(phone) if phone else 0)
+        columns["phone_digits"].append(len(phone) if phone else 0)
+        for field in ("room_type", "status"):
+            value = row[field]
+            code = 0
+            if value is not None:
+                code = codes[field].setdefault(value, len(codes[field]) + 1)
+                if code >= OVERFLOW_CODE:
+                    extra[field], code = value, OVERFLOW_CODE
+            columns[field].append(code)
+        columns["nulls"].append(nulls)
+        if extra:
+            overflow[index] = extra
+    if len(id_heap) >= 2 ** 32 or len(name_heap) >= 2 ** 32:
+        raise ValueError("snapshot string heap over 4 GiB")
+    columns["by_id"] = array.array("I", sorted(range(len(ids)), key=ids.__getitem__))
+    columns["id_heap"] = array.array("B", id_heap)
+    columns["name_heap"] = array.array("B", name_heap)
+
+    meta = {
+        "rows": len(ids),
+        "byteorder": sys.byteorder,
+        "room_types": [value for value, code in sorted(codes["room_type"].items(), key=lambda item: item[1]) if code < OVERFLOW_CODE],
+        "statuses": [value for value, code in sorted(codes["status"].items(), key=lambda item: item[1]) if code < OVERFLOW_CODE],
+        "overflow": {str(index): extra for index, extra in overflow.items()},
+        "columns": {},
+    }
+    # Column offsets depend on the header length, which depends on the offsets.
+    header_size = 0
+    while True:
+        offset = header_size
+        for name, values in columns.items():
+            offset = -(-offset // 8) * 8
+            meta["columns"][name] = [offset, len(values)]
+            offset += len(values) * values.itemsize
+        header = json.dumps(meta).encode()
+        size = -(-(len(MAGIC) + 4 + len(header)) // 8) * 8
+        if size == header_size:
+            break
+        header_size = size
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for name, values in columns.items():
+            f.write(b"\0" * (meta["columns"][name][0] - f.tell()))
+            values.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(ids)
+
+
+class BookingSnapshot:
+    """Read-only view of a snapshot file.
+
+    The file is memory-mapped and columns are typed memoryviews over it, so
+    opening is constant time and only the pages a query touches are read.
+    `get` binary-searches a reservation ID ordering stored in the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a booking snapshot")
+        (header_length,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        meta = json.loads(self._mmap[start:start + header_length])
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {meta['byteorder']}-endian machine")
+        self._rows = meta["rows"]
+        self.room_types = [None] + meta["room_types"]
+        self.statuses = [None] + meta["statuses"]
+        self._overflow = {int(index): extra for index, extra in meta["overflow"].items()}
+        self._view = memoryview(self._mmap)
+        self._columns = {}
+        for name, code in COLUMNS.items():
+            offset, count = meta["columns"][name]
+            self._columns[name] = self._view[offset:offset + count * array.array(code).itemsize].cast(code)
+        self._id_heap = self._columns["id_heap"]
+        self._name_heap = self._columns["name_heap"]
+
+    def __len__(self):
+        return self._rows
+
+    def column(self, name):
+        """Raw typed column, e.g. "check_in" (days since 1970-01-01) for reports."""
+        return self._columns[name]
+
+    def reservation_id(self, index):
+        offsets = self._columns["id_offsets"]
+        return bytes(self._id_heap[offsets[index]:offsets[index + 1]]).decode()
+
+    def row(self, index):
+        c = self._columns
+        nulls = c["nulls"][index]
+        offsets = c["name_offsets"]
+        row = {
+            "guest_name": None if nulls & NULL_BITS["guest_name"] else bytes(self._name_heap[offsets[index]:offsets[index + 1]]).decode(),
+            "check_in_date": None if c["check_in"][index] == NULL_DATE else date.fromordinal(c["check_in"][index] + EPOCH).isoformat(),
+            "check_out_date": None if c["check_out"][index] == NULL_DATE else date.fromordinal(c["check_out"][index] + EPOCH).isoformat(),
+            "num_guests": None if c["num_guests"][index] == NULL_GUESTS else c["num_guests"][index],
+            "phone_number": None if nulls & NULL_BITS["phone_number"] else str(c["phone"][index]).zfill(c["phone_digits"][index]),
+            "room_type": self.room_types[c["room_type"][index]] if c["room_type"][index] != OVERFLOW_CODE else None,
+            "status": self.statuses[c["status"][index]] if c["status"][index] != OVERFLOW_CODE else None,
+        }
+        row.update(self._overflow.get(index, {}))
+        return row
+
+    def rows(self):
+        for index in range(self._rows):
+            yield self.reservation_id(index), self.row(index)
+
+    def get(self, reservation_id):
+        by_id = self._columns["by_id"]
+        position = bisect.bisect_left(range(self._rows), reservation_id, key=lambda i: self.reservation_id(by_id[i]))
+        if position < self._rows and self.reservation_id(by_id[position]) == reservation_id:
+            return self.row(by_id[position])
+        return None
+
+    def close(self):
+        for column in self._columns.values():
+            column.release()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+
+def read_csv(csv_path):
+    """(reservation_id, row) pairs from a booking CSV, one at a time."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for raw in csv.DictReader(f):
+            reservation_id = raw.pop("reservation_id", None)
+            if reservation_id:
+                yield reservation_id, normalize_row(raw)
+
+
+def write_csv(csv_path, rows):
+    """Write (reservation_id, row) pairs as CSV with plain integers, for spreadsheets and other tools."""
+    count = 0
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["reservation_id"] + BOOKING_FIELDS)
+        for reservation_id, row in rows:
+            writer.writerow([reservation_id] + ["" if row.get(field) is None else row[field] for field in BOOKING_FIELDS])
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    from booking_store import import_snapshot, open_store
+    command, arguments = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    if command == "export" and len(arguments) == 2:
+        print(f"Wrote {write_snapshot(arguments[1], open_store(arguments[0], seed=None).rows())} bookings to {arguments[1]}")
+    elif command == "import" and len(arguments) == 2:
+        print(f"Imported {import_snapshot(open_store(arguments[1], seed=None), arguments[0])} bookings into {arguments[1]}")
+    elif command == "from-csv" and len(arguments) == 2:
+        print(f"Wrote {write_snapshot(arguments[1], read_csv(arguments[0]))} bookings to {arguments[1]}")
+    elif command == "to-csv" and len(arguments) == 2:
+        print(f"Wrote {write_csv(arguments[1], BookingSnapshot(arguments[0]).rows())} bookings to {arguments[1]}")
+    elif command == "info" and len(arguments) == 1:
+        snapshot = BookingSnapshot(arguments[0])
+        print(f"{len(snapshot)} bookings, {os.path.getsize(arguments[0])} bytes, room types {snapshot.room_types[1:]}, statuses {snapshot.statuses[1:]}")
+    else:
+        print(__doc__.strip())
+        sys.exit(1)
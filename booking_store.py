@@ -0,0 +1,405 @@
+import bisect
+import csv
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BOOKING_FIELDS = ["guest_name", "check_in_date", "check_out_date", "num_guests", "phone_number", "room_type", "status"]
+INDEXED_FIELDS = ["phone_number", "guest_name", "status"]
+
+
+def normalize_phone(value):
+    if value is None:
+        return None
+    value = str(value)
+    if value.endswith(".0"):
+        value = value[:-2]
+    digits = re.sub(r"\D", "", value)
+    return digits or None
+
+
+def normalize_row(row):
+    """Coerce a raw booking row (CSV strings, LLM output, NaN floats) to stored types."""
+    clean = {}
+    for field in BOOKING_FIELDS:
+        value = row.get(field)
+        if isinstance(value, float) and value != value:
+            value = None
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "" or value.lower() in ("null", "none", "nan"):
+                value = None
+        if value is not None and field == "num_guests":
+            try:
+                value = int(float(value))
+            except (TypeError, ValueError):
+                value = None
+        if value is not None and field == "phone_number":
+            value = normalize_phone(value)
+        clean[field] = value
+    return clean
+
+
+class BookingStore:
+    """Interface for booking persistence.
+
+    Rows are plain dicts keyed by BOOKING_FIELDS. Writes are single-row
+    upserts; several writes inside `transaction()` commit together.
+    """
+
+    def get(self, reservation_id):
+        raise NotImplementedError
+
+    def upsert(self, reservation_id, row):
+        raise NotImplementedError
+
+    def rows(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self):
+        yield self
+
+    def find(self, field, value):
+        """(reservation_id, row) pairs whose `field` equals `value`, oldest first.
+
+        guest_name matches case-insensitively. Backends answer this from an
+        index; this fallback scans.
+        """
+        if field == "guest_name" and value is not None:
+            value = value.lower()
+            return [(rid, row) for rid, row in self.rows() if (row.get(field) or "").lower() == value]
+        return [(rid, row) for rid, row in self.rows() if row.get(field) == value]
+
+    def check_in_between(self, start, end):
+        """Bookings with start <= check_in_date <= end (YYYY-MM-DD strings), by date."""
+        found = [(rid, row) for rid, row in self.rows() if row.get("check_in_date") and start <= row["check_in_date"] <= end]
+        return sorted(found, key=lambda item: item[1]["check_in_date"])
+
+    def chunks(self, size=1000):
+        """Lists of up to `size` (reservation_id, row) pairs covering the whole store, oldest first."""
+        chunk = []
+        for item in self.rows():
+            chunk.append(item)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def __contains__(self, reservation_id):
+        return self.get(reservation_id) is not None
+
+    def close(self):
+        pass
+
+
+class SQLiteBookingStore(BookingStore):
+    def __init__(self, path="bookings.db"):
+        self.path = path
+        self._local = threading.local()
+        with self.transaction():
+            columns = ", ".join(f"{field} {'INTEGER' if field == 'num_guests' else 'TEXT'}" for field in BOOKING_FIELDS)
+            self._conn().execute(f"CREATE TABLE IF NOT EXISTS bookings (reservation_id TEXT PRIMARY KEY, {columns})")
+            self._conn().execute("CREATE INDEX IF NOT EXISTS bookings_phone ON bookings (phone_number)")
+            self._conn().execute("CREATE INDEX IF NOT EXISTS bookings_guest ON bookings (guest_name COLLATE NOCASE)")
+            self._conn().execute("CREATE INDEX IF NOT EXISTS bookings_check_in ON bookings (check_in_date)")
+            self._conn().execute("CREATE INDEX IF NOT EXISTS bookings_status ON bookings (status)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._conn()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield self
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield self
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def get(self, reservation_id):
+        if reservation_id is None:
+            return None
+        cursor = self._conn().execute(
+            f"SELECT {', '.join(BOOKING_FIELDS)} FROM bookings WHERE reservation_id = ?", (reservation_id,)
+        )
+        found = cursor.fetchone()
+        if found is None:
+            return None
+        return dict(zip(BOOKING_FIELDS, found))
+
+    def upsert(self, reservation_id, row):
+        row = normalize_row(row)
+        columns = ", ".join(["reservation_id"] + BOOKING_FIELDS)
+        placeholders = ", ".join("?" for _ in range(len(BOOKING_FIELDS) + 1))
+        updates = ", ".join(f"{field} = excluded.{field}" for field in BOOKING_FIELDS)
+        with self.transaction():
+            self._conn().execute(
+                f"INSERT INTO bookings ({columns}) VALUES ({placeholders}) ON CONFLICT(reservation_id) DO UPDATE SET {updates}",
+                [reservation_id] + [row[field] for field in BOOKING_FIELDS],
+            )
+        return row
+
+    def rows(self):
+        cursor = self._conn().execute(f"SELECT reservation_id, {', '.join(BOOKING_FIELDS)} FROM bookings ORDER BY rowid")
+        for found in cursor:
+            yield found[0], dict(zip(BOOKING_FIELDS, found[1:]))
+
+    def chunks(self, size=1000):
+        # One short read per chunk, resuming after the last rowid, so a long
+        # scan neither holds a read transaction open nor keeps the cursor's rows.
+        last = 0
+        while True:
+            found = self._conn().execute(
+                f"SELECT rowid, reservation_id, {', '.join(BOOKING_FIELDS)} FROM bookings WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last, size),
+            ).fetchall()
+            if not found:
+                return
+            last = found[-1][0]
+            yield [(item[1], dict(zip(BOOKING_FIELDS, item[2:]))) for item in found]
+
+    def find(self, field, value):
+        if field not in INDEXED_FIELDS:
+            return super().find(field, value)
+        collate = " COLLATE NOCASE" if field == "guest_name" else ""
+        cursor = self._conn().execute(
+            f"SELECT reservation_id, {', '.join(BOOKING_FIELDS)} FROM bookings WHERE {field}{collate} = ? ORDER BY rowid", (value,)
+        )
+        return [(found[0], dict(zip(BOOKING_FIELDS, found[1:]))) for found in cursor]
+
+    def check_in_between(self, start, end):
+        cursor = self._conn().execute(
+            f"SELECT reservation_id, {', '.join(BOOKING_FIELDS)} FROM bookings "
+            "WHERE check_in_date BETWEEN ? AND ? ORDER BY check_in_date, rowid", (start, end)
+        )
+        return [(found[0], dict(zip(BOOKING_FIELDS, found[1:]))) for found in cursor]
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class LogBookingStore(BookingStore):
+    """Append-only JSON-lines log with an in-memory index.
+
+    Each committed transaction is written as one line, so a torn write at the
+    end of the file is simply ignored on the next load. Secondary indexes on
+    INDEXED_FIELDS and a sorted check-in list are updated on every commit.
+    """
+
+    def __init__(self, path="bookings.log"):
+        self.path = path
+        self._lock = threading.RLock()
+        self._index = {}
+        self._secondary = {field: {} for field in INDEXED_FIELDS}
+        self._check_ins = []
+        self._order = {}
+        self._pending = None
+        self._load()
+        for reservation_id, row in self._index.items():
+            self._add_secondary(reservation_id, row)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                for reservation_id, row in record:
+                    self._index[reservation_id] = row
+
+    @staticmethod
+    def _key(field, value):
+        return value.lower() if field == "guest_name" and value is not None else value
+
+    def _add_secondary(self, reservation_id, row):
+        self._order.setdefault(reservation_id, len(self._order))
+        for field in INDEXED_FIELDS:
+            self._secondary[field].setdefault(self._key(field, row.get(field)), {})[reservation_id] = None
+        if row.get("check_in_date"):
+            bisect.insort(self._check_ins, (row["check_in_date"], reservation_id))
+
+    def _remove_secondary(self, reservation_id, row):
+        for field in INDEXED_FIELDS:
+            bucket = self._secondary[field].get(self._key(field, row.get(field)))
+            if bucket is not None:
+                bucket.pop(reservation_id, None)
+        if row.get("check_in_date"):
+            position = bisect.bisect_left(self._check_ins, (row["check_in_date"], reservation_id))
+            if position < len(self._check_ins) and self._check_ins[position] == (row["check_in_date"], reservation_id):
+                del self._check_ins[position]
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._pending is not None:
+                yield self
+                return
+            self._pending = []
+            try:
+                yield self
+                if self._pending:
+                    self._file.write(json.dumps(self._pending) + "\n")
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    for reservation_id, row in self._pending:
+                        previous = self._index.get(reservation_id)
+                        if previous is not None:
+                            self._remove_secondary(reservation_id, previous)
+                        self._index[reservation_id] = row
+                        self._add_secondary(reservation_id, row)
+            finally:
+                self._pending = None
+
+    def get(self, reservation_id):
+        with self._lock:
+            if self._pending:
+                for pending_id, row in reversed(self._pending):
+                    if pending_id == reservation_id:
+                        return dict(row)
+            row = self._index.get(reservation_id)
+            return dict(row) if row is not None else None
+
+    def upsert(self, reservation_id, row):
+        row = normalize_row(row)
+        with self.transaction():
+            self._pending.append((reservation_id, row))
+        return row
+
+    def rows(self):
+        with self._lock:
+            items = list(self._index.items())
+        for reservation_id, row in items:
+            yield reservation_id, dict(row)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index)
+
+    def find(self, field, value):
+        if field not in INDEXED_FIELDS:
+            return super().find(field, value)
+        with self._lock:
+            ids = sorted(self._secondary[field].get(self._key(field, value), {}), key=self._order.__getitem__)
+            return [(reservation_id, dict(self._index[reservation_id])) for reservation_id in ids]
+
+    def check_in_between(self, start, end):
+        with self._lock:
+            low = bisect.bisect_left(self._check_ins, (start, ""))
+            high = bisect.bisect_right(self._check_ins, (end, "\uffff"))
+            return [(reservation_id, dict(self._index[reservation_id])) for _, reservation_id in self._check_ins[low:high]]
+
+    def compact(self):
+        """Rewrite the log so it holds one record per reservation."""
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for reservation_id, row in self._index.items():
+                    f.write(json.dumps([(reservation_id, row)]) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def import_csv(store, csv_path="booking_data.csv"):
+    """Load a legacy booking_data.csv into `store` in a single transaction."""
+    count = 0
+    with open(csv_path, newline="", encoding="utf-8") as f, store.transaction():
+        for raw in csv.DictReader(f):
+            reservation_id = raw.pop("reservation_id", None)
+            if not reservation_id:
+                continue
+            store.upsert(reservation_id, raw)
+            count += 1
+    return count
+
+
+def import_snapshot(store, snapshot_path):
+    """Load a booking_snapshot file into `store` in a single transaction."""
+    from booking_snapshot import BookingSnapshot
+    snapshot = BookingSnapshot(snapshot_path)
+    try:
+        with store.transaction():
+            for reservation_id, row in snapshot.rows():
+                store.upsert(reservation_id, row)
+        return len(snapshot)
+    finally:
+        snapshot.close()
+
+
+def open_store(url=None, seed="booking_data.csv"):
+    """Open the store named by `url` (or the `booking_store` env var).
+
+    Accepted forms are "sqlite:<path>" and "log:<path>". A new, empty store is
+    seeded once from `seed` when that file exists: a booking CSV, or a
+    snapshot written by booking_snapshot.py if it ends in ".snap".
+    """
+    url = url or os.getenv("booking_store", "sqlite:bookings.db")
+    kind, _, path = url.partition(":")
+    if kind == "sqlite":
+        store = SQLiteBookingStore(path or "bookings.db")
+    elif kind == "log":
+        store = LogBookingStore(path or "bookings.log")
+    else:
+        raise ValueError(f"Unknown booking store: {url}")
+    if seed and len(store) == 0 and os.path.exists(seed):
+        imported = import_snapshot(store, seed) if seed.endswith(".snap") else import_csv(store, seed)
+        logger.info("Imported %d bookings from %s into %s", imported, seed, url)
+    return store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python booking_store.py <store-url> <csv-path>")
+        sys.exit(1)
+    target = open_store(sys.argv[1], seed=None)
+    print(f"Imported {import_csv(target, sys.argv[2])} bookings into {sys.argv[1]}")
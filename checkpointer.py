@@ -0,0 +1,304 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """Durable LangGraph checkpointer on a local SQLite file.
+
+    Nothing is held in memory between calls: a thread's state is read from
+    disk when its next message arrives, so a restarted worker picks up every
+    conversation without a warm-up pass. Storage stays bounded by keeping
+    only the newest `max_checkpoints` per thread, trimming the `messages`
+    channel to `max_messages`, and evicting threads that have been idle for
+    `ttl_seconds` or that fall outside the `max_threads` most recently used.
+    """
+
+    def __init__(self, path="checkpoints.db", ttl_seconds=7 * 24 * 3600, max_threads=10000,
+                 max_checkpoints=3, max_messages=200, evict_every=100):
+        super().__init__()
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_threads = max_threads
+        self.max_checkpoints = max_checkpoints
+        self.max_messages = max_messages
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._puts = 0
+        self._puts_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                checkpoint_type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                value_type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                task_path TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS threads (
+                thread_id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS threads_last_access ON threads (last_access);
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _touch(self, conn, thread_id):
+        conn.execute(
+            "INSERT INTO threads (thread_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET last_access = excluded.last_access",
+            (thread_id, time.time()),
+        )
+
+    def _trim(self, channel_values):
+        messages = channel_values.get("messages")
+        if not isinstance(messages, list) or len(messages) <= self.max_messages:
+            return channel_values
+        dropped = len(messages) - self.max_messages
+        channel_values = dict(channel_values)
+        channel_values["messages"] = messages[dropped:]
+        if isinstance(channel_values.get("summarized_count"), int):
+            channel_values["summarized_count"] = max(channel_values["summarized_count"] - dropped, 0)
+        return channel_values
+
+    def _writes_for(self, conn, thread_id, checkpoint_ns, checkpoint_id):
+        rows = conn.execute(
+            "SELECT task_id, channel, value_type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [(task_id, channel, self.serde.loads_typed((value_type, value))) for task_id, channel, value_type, value in rows]
+
+    def _tuple(self, conn, thread_id, checkpoint_ns, row):
+        checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=self._writes_for(conn, thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata"
+        conn = self._conn()
+        if checkpoint_id := get_checkpoint_id(config):
+            row = conn.execute(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            ).fetchone()
+        if row is None:
+            return None
+        return self._tuple(conn, thread_id, checkpoint_ns, row)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata FROM checkpoints"
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+        conn = self._conn()
+        for row in conn.execute(query, params).fetchall():
+            found = self._tuple(conn, row[0], row[1], row[2:])
+            if filter and not all(found.metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield found
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        stored = dict(checkpoint)
+        stored["channel_values"] = self._trim(checkpoint.get("channel_values", {}))
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(stored)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 checkpoint_type, checkpoint_blob, metadata_type, metadata_blob),
+            )
+            stale = conn.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, self.max_checkpoints),
+            ).fetchall()
+            for (stale_id,) in stale:
+                conn.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                             (thread_id, checkpoint_ns, stale_id))
+                conn.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                             (thread_id, checkpoint_ns, stale_id))
+            self._touch(conn, thread_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._puts_lock:
+            self._puts += 1
+            due = self._puts % self.evict_every == 0
+        if due:
+            self.evict()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                value_type, value_blob = self.serde.dumps_typed(value)
+                verb = "INSERT OR REPLACE" if write_idx < 0 else "INSERT OR IGNORE"
+                conn.execute(
+                    f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, write_idx, channel, value_type, value_blob, task_path),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete_thread(self, thread_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("checkpoints", "writes", "threads"):
+                conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def evict(self):
+        """Drop threads idle longer than the TTL, then the least recently used over the cap."""
+        conn = self._conn()
+        expired = [row[0] for row in conn.execute(
+            "SELECT thread_id FROM threads WHERE last_access < ?", (time.time() - self.ttl_seconds,)
+        ).fetchall()]
+        expired += [row[0] for row in conn.execute(
+            "SELECT thread_id FROM threads WHERE last_access >= ? ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+            (time.time() - self.ttl_seconds, self.max_threads),
+        ).fetchall()]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        if expired:
+            logger.info("Evicted %d idle conversation threads", len(expired))
+        return len(expired)
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            "threads": conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0],
+            "checkpoints": conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0],
+            "bytes": conn.execute("SELECT COALESCE(SUM(LENGTH(checkpoint)), 0) FROM checkpoints").fetchone()[0],
+        }
+
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for found in self.list(config, filter=filter, before=before, limit=limit):
+            yield found
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return self.delete_thread(thread_id)
+
+    def get_next_version(self, current, channel):
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.0"
+
+
+def open_checkpointer():
+    """Checkpointer named by the `checkpointer` env var: "sqlite:<path>" (default) or "memory"."""
+    url = os.getenv("checkpointer", "sqlite:checkpoints.db")
+    if url == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+        return MemorySaver()
+    kind, _, path = url.partition(":")
+    if kind != "sqlite":
+        raise ValueError(f"Unknown checkpointer: {url}")
+    return SQLiteCheckpointer(
+        path or "checkpoints.db",
+        ttl_seconds=float(os.getenv("checkpoint_ttl_seconds", str(7 * 24 * 3600))),
+        max_threads=int(os.getenv("checkpoint_max_threads", "10000")),
+        max_checkpoints=int(os.getenv("checkpoint_max_per_thread", "3")),
+        max_messages=int(os.getenv("checkpoint_max_messages", "200")),
+    )
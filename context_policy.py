@@ -0,0 +1,96 @@
+import json
+import os
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from usage_stats import usage_stats
+from structured_output import extract_object
+from dotenv import load_dotenv
+load_dotenv()
+
+POLICY = os.getenv("context_policy", "last_n")
+MAX_MESSAGES = int(os.getenv("context_max_messages", "12"))
+TOKEN_BUDGET = int(os.getenv("context_token_budget", "2000"))
+POLICIES = ("full", "last_n", "token_budget", "summary")
+
+if POLICY not in POLICIES:
+    raise ValueError(f"Unknown context_policy: {POLICY}")
+
+
+def estimate_tokens(messages):
+    """Cheap local estimate (~4 characters per token); no provider round trip."""
+    return sum(len(str(message.content)) for message in messages) // 4 + len(messages)
+
+
+def compact_message(message):
+    """Reduce an earlier AI turn to the text the guest actually saw.
+
+    Node replies are JSON; only their `message` field matters as history.
+    Classifier replies carry no `message` and are dropped (None).
+    """
+    if not isinstance(message, AIMessage) or not isinstance(message.content, str):
+        return message
+    body = extract_object(message.content)
+    if body is None:
+        return message
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError:
+        return message
+    if isinstance(data, dict) and data.get("message"):
+        return AIMessage(content=data["message"])
+    return None
+
+
+def recent_messages(messages, max_messages):
+    window = list(messages[-max_messages:]) if max_messages > 0 else list(messages[-1:])
+    for index, message in enumerate(window):
+        if isinstance(message, HumanMessage):
+            return window[index:]
+    return window[-1:]
+
+
+def within_budget(messages, budget):
+    kept = []
+    used = 0
+    for message in reversed(messages):
+        cost = estimate_tokens([message])
+        if kept and used + cost > budget:
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+    for index, message in enumerate(kept):
+        if isinstance(message, HumanMessage):
+            return kept[index:]
+    return kept
+
+
+def summary_split(messages):
+    """Index before which messages are old enough to be summarised."""
+    window = recent_messages(messages, MAX_MESSAGES)
+    return len(messages) - len(window)
+
+
+def needs_summary(state):
+    """True once enough messages have aged out of the window to fold them into the summary."""
+    if POLICY != "summary":
+        return False
+    return summary_split(state["messages"]) - state.get("summarized_count", 0) >= max(MAX_MESSAGES, 1)
+
+
+def window(state, node):
+    """History to send to the LLM for `node` under the configured policy."""
+    messages = state["messages"]
+    if POLICY == "full":
+        selected = list(messages)
+    else:
+        if POLICY == "last_n":
+            selected = recent_messages(messages, MAX_MESSAGES)
+        elif POLICY == "token_budget":
+            selected = within_budget(messages, TOKEN_BUDGET)
+        else:
+            selected = list(messages[state.get("summarized_count", 0):])
+        selected = [compacted for compacted in map(compact_message, selected) if compacted is not None]
+        if POLICY == "summary" and state.get("context_summary"):
+            selected = [SystemMessage(content=f"Summary of the earlier conversation: {state['context_summary']}")] + selected
+    usage_stats.record_context(node, estimate_tokens(messages), estimate_tokens(selected))
+    return selected
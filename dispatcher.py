@@ -0,0 +1,247 @@
+import fcntl
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class SenderLocks:
+    """Cross-process mutual exclusion per sender, using flock on local files.
+
+    Senders hash onto `slots` lock files in `directory`, so the number of
+    files stays fixed; two senders sharing a slot only wait for each other.
+    Locks are released by the kernel if a worker process dies.
+    """
+
+    def __init__(self, directory="locks", slots=256):
+        self.directory = directory
+        self.slots = slots
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def __call__(self, sender_id):
+        slot = int(hashlib.sha1(str(sender_id).encode()).hexdigest(), 16) % self.slots
+        with open(os.path.join(self.directory, f"sender-{slot}.lock"), "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SenderInbox:
+    """Durable queue of incoming messages per sender on SQLite, shared by worker processes.
+
+    The webhook adds every message here first, so messages waiting for a
+    turn survive a worker restart. `take` returns all of a sender's waiting
+    messages in arrival order, whichever process received them; run it
+    under the sender's SenderLocks lock and call `done` once the turn is
+    over, so one turn sees everything the guest sent so far and a second
+    process finds nothing left to do. `stale` lists senders whose messages
+    nobody took, e.g. because the worker that received them died.
+    """
+
+    def __init__(self, path="sender_inbox.db"):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS inbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sender_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                received_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS inbox_sender ON inbox (sender_id, id);
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # Every worker opens the file as it starts; switching a new file
+            # to WAL fails at once, without the busy timeout, while another
+            # process holds it.
+            for attempt in range(50):
+                try:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    break
+                except sqlite3.OperationalError:
+                    if attempt == 49:
+                        raise
+                    time.sleep(0.1)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, sender_id, text):
+        self._conn().execute("INSERT INTO inbox (sender_id, text, received_at) VALUES (?, ?, ?)",
+                             (str(sender_id), text or "", time.time()))
+
+    def take(self, sender_id):
+        """[(id, text)] of the sender's waiting messages, oldest first."""
+        return self._conn().execute("SELECT id, text FROM inbox WHERE sender_id = ? ORDER BY id", (str(sender_id),)).fetchall()
+
+    def done(self, ids):
+        if ids:
+            self._conn().execute(f"DELETE FROM inbox WHERE id IN ({','.join('?' * len(ids))})", list(ids))
+
+    def stale(self, seconds):
+        """Senders with a message waiting longer than `seconds`."""
+        rows = self._conn().execute("SELECT DISTINCT sender_id FROM inbox WHERE received_at < ?", (time.time() - seconds,))
+        return [row[0] for row in rows]
+
+    def stats(self):
+        waiting, senders, oldest = self._conn().execute(
+            "SELECT COUNT(*), COUNT(DISTINCT sender_id), MIN(received_at) FROM inbox").fetchone()
+        return {"waiting": waiting, "senders": senders, "oldest_seconds": round(time.time() - oldest, 3) if oldest else 0.0}
+
+
+class Coalescer:
+    """Merges messages that a sender sends in quick succession into one job.
+
+    A sender's first message opens a window; each further message extends it
+    by `delay` seconds, up to `max_delay` after the first one. When the window
+    closes, `flush(sender_id, items)` gets everything collected, in order.
+    One background thread tracks all deadlines. `delay=0` flushes at once.
+    """
+
+    def __init__(self, flush, delay=1.0, max_delay=4.0):
+        self._flush = flush
+        self.delay = delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._thread = None
+        self._received = 0
+        self._flushed = 0
+
+    def add(self, sender_id, item):
+        if self.delay <= 0:
+            with self._cond:
+                self._received += 1
+                self._flushed += 1
+            self._flush(sender_id, [item])
+            return
+        now = time.monotonic()
+        with self._cond:
+            self._received += 1
+            entry = self._pending.get(sender_id)
+            if entry is None:
+                entry = self._pending[sender_id] = {"items": [], "first": now}
+            entry["items"].append(item)
+            entry["deadline"] = min(now + self.delay, entry["first"] + self.max_delay)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="coalescer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [sender_id for sender_id, entry in self._pending.items() if entry["deadline"] <= now]
+                if not due:
+                    next_deadline = min((entry["deadline"] for entry in self._pending.values()), default=None)
+                    self._cond.wait(None if next_deadline is None else next_deadline - now)
+                    continue
+                batches = [(sender_id, self._pending.pop(sender_id)["items"]) for sender_id in due]
+                self._flushed += len(batches)
+            for sender_id, items in batches:
+                try:
+                    self._flush(sender_id, items)
+                except Exception:
+                    logger.error("Error while flushing messages for sender %s:\n%s", sender_id, traceback.format_exc())
+
+    def stats(self):
+        with self._cond:
+            return {
+                "delay_seconds": self.delay,
+                "max_delay_seconds": self.max_delay,
+                "received": self._received,
+                "turns": self._flushed,
+                "merged": self._received - self._flushed - sum(len(entry["items"]) for entry in self._pending.values()),
+                "waiting_senders": len(self._pending),
+            }
+
+
+class Dispatcher:
+    """Runs webhook work off the request thread.
+
+    Jobs for the same sender run one at a time in arrival order, jobs for
+    different senders run in parallel on at most `max_workers` threads.
+    With `sender_locks` (see SenderLocks) a job also waits while another
+    worker process is handling the same sender.
+    """
+
+    def __init__(self, max_workers=4, sender_locks=None):
+        self.max_workers = max_workers
+        self._sender_locks = sender_locks
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dispatch")
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._running = set()
+        self._depth = 0
+        self._processed = 0
+        self._failed = 0
+        self._last_lag = 0.0
+
+    def submit(self, sender_id, fn, *args, **kwargs):
+        with self._lock:
+            queue = self._queues.setdefault(sender_id, deque())
+            queue.append((time.monotonic(), fn, args, kwargs))
+            self._depth += 1
+            if sender_id in self._running:
+                return
+            self._running.add(sender_id)
+        self._executor.submit(self._drain, sender_id)
+
+    def _drain(self, sender_id):
+        while True:
+            with self._lock:
+                queue = self._queues.get(sender_id)
+                if not queue:
+                    self._queues.pop(sender_id, None)
+                    self._running.discard(sender_id)
+                    return
+                enqueued_at, fn, args, kwargs = queue.popleft()
+                self._depth -= 1
+                self._last_lag = time.monotonic() - enqueued_at
+            try:
+                if self._sender_locks is None:
+                    fn(*args, **kwargs)
+                else:
+                    with self._sender_locks(sender_id):
+                        fn(*args, **kwargs)
+                ok = True
+            except Exception:
+                logger.error("Error while processing event for sender %s:\n%s", sender_id, traceback.format_exc())
+                ok = False
+            with self._lock:
+                self._processed += 1
+                if not ok:
+                    self._failed += 1
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            oldest = [queue[0][0] for queue in self._queues.values() if queue]
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._depth,
+                "active_senders": len(self._running),
+                "oldest_pending_seconds": round(now - min(oldest), 3) if oldest else 0.0,
+                "last_lag_seconds": round(self._last_lag, 3),
+                "processed": self._processed,
+                "failed": self._failed,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
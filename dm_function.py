@@ -1,25 +1,145 @@
-import requests
+import asyncio
 import json
+import logging
 import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 user_access_token = os.getenv("access_token")
+API_BASE = os.getenv("instagram_api_base", "https://graph.instagram.com/v21.0")
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(response):
+    """Wait time requested by the Graph API, if any.
+
+    Uses `Retry-After`, then the `estimated_time_to_regain_access` (minutes)
+    that Meta reports in its usage headers once an app is throttled.
+    """
+    if response is None:
+        return None
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    for header in ("X-Business-Use-Case-Usage", "X-App-Usage"):
+        raw = response.headers.get(header)
+        if not raw:
+            continue
+        try:
+            usage = json.loads(raw)
+        except json.JSONDecodeError:
+            continue
+        entries = [entry for value in usage.values() if isinstance(value, list) for entry in value] if header == "X-Business-Use-Case-Usage" else [usage]
+        minutes = max((entry.get("estimated_time_to_regain_access", 0) or 0 for entry in entries if isinstance(entry, dict)), default=0)
+        if minutes:
+            return minutes * 60.0
+    return None
+
+
+class MessagingClient:
+    """Outbound Instagram messaging with a pooled keep-alive session.
+
+    At most `max_concurrency` requests are in flight at once. Failed sends
+    (connection errors, 429 and 5xx) are retried up to `max_retries` times
+    with full-jitter exponential backoff, waiting longer whenever the API
+    asks for it.
+    """
+
+    def __init__(self, access_token=None, api_base=API_BASE, max_concurrency=8, timeout=(3.05, 10),
+                 max_retries=3, backoff_base=0.5, backoff_cap=30.0):
+        self.access_token = access_token if access_token is not None else user_access_token
+        self.api_base = api_base.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.access_token}",
+            "Content-Type": "application/json",
+        })
+
+    def _backoff(self, attempt, response=None):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        requested = retry_after_seconds(response)
+        if requested is not None:
+            delay = max(delay, min(requested, self.backoff_cap))
+        return delay
+
+    def post(self, json_body):
+        with metrics.outbound("instagram"):
+            return self._post(json_body)
+
+    def _post(self, json_body):
+        url = f"{self.api_base}/me/messages"
+        response = None
+        for attempt in range(self.max_retries + 1):
+            error = None
+            try:
+                with self._slots:
+                    response = self.session.post(url, json=json_body, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                response = None
+            if attempt == self.max_retries:
+                if error is not None:
+                    raise error
+                break
+            delay = self._backoff(attempt, response)
+            logger.warning("Instagram send failed (%s), retrying in %.2fs", response.status_code if response is not None else error, delay)
+            time.sleep(delay)
+        if response.status_code >= 400:
+            logger.error("Instagram send failed with status %s: %s", response.status_code, response.text[:200])
+        return response
+
+    def send_message(self, id, message):
+        response = self.post({"recipient": {"id": id}, "message": {"text": message}})
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+    def send_action(self, id, action="typing_on"):
+        """Sender action such as typing_on / typing_off / mark_seen."""
+        response = self.post({"recipient": {"id": id}, "sender_action": action})
+        return response.status_code < 400
+
+    async def asend_message(self, id, message):
+        return await asyncio.to_thread(self.send_message, id, message)
+
+    def close(self):
+        self.session.close()
+
+
+client = MessagingClient(max_concurrency=int(os.getenv("instagram_max_concurrency", "8")))
+
+
 def send_message(id, message):
-    url = f"https://graph.instagram.com/v21.0/me/messages"
-    headers = {
-        "Authorization": f"Bearer {user_access_token}",
-        "Content-Type": "application/json"
-    }
-    json_body = {
-        "recipient": {
-            "id": id
-        },
-        "message": {
-            "text": message
-        }
-    }
-
-    response = requests.post(url, headers=headers, json=json_body)
-    data = response.json()
-    print(json.dumps(data, indent=4))
\ No newline at end of file
+    data = client.send_message(id, message)
+    logger.debug("Instagram send to %s: %s", id, data.get("message_id", data.get("error", data)))
+    return data
+
+
+def send_action(id, action="typing_on"):
+    return client.send_action(id, action)
+
+
+async def asend_message(id, message):
+    return await client.asend_message(id, message)
@@ -0,0 +1,73 @@
+import itertools
+import json
+import time
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+# Validates against every node schema in structured_output (unknown keys are
+# ignored), so one canned reply can drive the whole graph in load tests.
+UNIVERSAL_REPLY = json.dumps({
+    "intent": "QA",
+    "reservation_id": None,
+    "message": "Thanks for your message! How can I help with your stay?",
+    "booking_data": {},
+    "data": {},
+    "update_init": 0,
+})
+
+
+def detect_node(messages):
+    """Name of the graph node that built `messages`, found by the JSON schema its prompt embeds.
+
+    Prompts without a schema are the history summary ("compact_history").
+    """
+    from structured_output import NODE_SCHEMAS
+    text = "\n".join(str(message.content) for message in messages)
+    for node, (_, schema) in NODE_SCHEMAS.items():
+        if schema in text:
+            return node
+    return "compact_history"
+
+
+class FakeChatModel:
+    """Deterministic stand-in for ChatGoogleGenerativeAI in tests and benchmarks.
+
+    `responses` is either a list of reply strings (used in order, cycling)
+    or a callable `responses(messages) -> str`. `stream` yields the reply in
+    `chunk_size` character chunks after `first_token_latency` seconds, then
+    waits `token_latency` seconds per chunk; `invoke` waits for the whole
+    reply. Token usage is estimated at four characters per token.
+    """
+
+    def __init__(self, responses, first_token_latency=0.0, token_latency=0.0, chunk_size=4):
+        if callable(responses):
+            self._respond = responses
+        else:
+            cycle = itertools.cycle(responses)
+            self._respond = lambda messages: next(cycle)
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    def _usage(self, messages, text):
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        output_tokens = len(text) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def stream(self, messages, **kwargs):
+        self.calls += 1
+        text = self._respond(messages)
+        time.sleep(self.first_token_latency)
+        chunks = [text[index:index + self.chunk_size] for index in range(0, len(text), self.chunk_size)] or [""]
+        for index, piece in enumerate(chunks):
+            if index:
+                time.sleep(self.token_latency)
+            usage = self._usage(messages, text) if index == 0 else None
+            yield AIMessageChunk(content=piece, usage_metadata=usage)
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        text = self._respond(messages)
+        chunks = max(1, -(-len(text) // self.chunk_size))
+        time.sleep(self.first_token_latency + self.token_latency * (chunks - 1))
+        return AIMessage(content=text, usage_metadata=self._usage(messages, text))
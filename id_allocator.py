@@ -0,0 +1,117 @@
+import os
+import re
+import sqlite3
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+
+class IdAllocator:
+    """Monotonic, durable ID sequences backed by SQLite.
+
+    Each process reserves a block of `block_size` numbers in one short write
+    transaction and then hands them out from memory, so concurrent threads
+    and processes never see the same number and allocation never reads the
+    booking table. Numbers left in a block when a process exits are skipped,
+    never reused.
+    """
+
+    def __init__(self, path="sequences.db", block_size=20):
+        self.path = path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}
+        conn = self._connect()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, next_value INTEGER NOT NULL)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def has_sequence(self, name):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM sequences WHERE name = ?", (name,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def ensure_sequence(self, name, start):
+        """Create `name` starting at `start`; no-op if it already exists."""
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR IGNORE INTO sequences (name, next_value) VALUES (?, ?)", (name, start))
+        finally:
+            conn.close()
+
+    def _reserve_block(self, name):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            found = conn.execute("SELECT next_value FROM sequences WHERE name = ?", (name,)).fetchone()
+            start = found[0] if found else 1
+            conn.execute(
+                "INSERT INTO sequences (name, next_value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET next_value = excluded.next_value",
+                (name, start + self.block_size),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return [start, start + self.block_size]
+
+    def next(self, name):
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] >= block[1]:
+                block = self._reserve_block(name)
+                self._blocks[name] = block
+            value = block[0]
+            block[0] += 1
+            return value
+
+
+def highest_numbered_id(reservation_ids, prefix="RES"):
+    pattern = re.compile(rf"^{re.escape(prefix)}(\d+)$")
+    highest = 0
+    for reservation_id in reservation_ids:
+        match = pattern.match(str(reservation_id))
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return highest
+
+
+class ReservationIdAllocator:
+    """Hands out reservation IDs of the form RES<n>."""
+
+    SEQUENCE = "reservation_id"
+
+    def __init__(self, allocator, prefix="RES"):
+        self.allocator = allocator
+        self.prefix = prefix
+
+    def seed_from(self, store):
+        """One-time seed so new IDs start above any RES<n> already stored."""
+        if self.allocator.has_sequence(self.SEQUENCE):
+            return
+        highest = highest_numbered_id((reservation_id for reservation_id, _ in store.rows()), self.prefix)
+        self.allocator.ensure_sequence(self.SEQUENCE, highest + 1)
+
+    def next_id(self):
+        return f"{self.prefix}{self.allocator.next(self.SEQUENCE)}"
+
+
+def open_reservation_ids(store=None):
+    allocator = IdAllocator(
+        os.getenv("id_sequence_db", "sequences.db"),
+        block_size=int(os.getenv("id_block_size", "20")),
+    )
+    reservation_ids = ReservationIdAllocator(allocator)
+    if store is not None:
+        reservation_ids.seed_from(store)
+    return reservation_ids
@@ -0,0 +1,87 @@
+import os
+import re
+from dotenv import load_dotenv
+load_dotenv()
+
+# Questions the templates cannot answer ("how many nights", "can I bring my
+# dog") go to the LLM; with this off they get the full details and a note
+# that the question itself could not be answered.
+INQUIRE_LLM_FALLBACK = os.getenv("inquire_llm_fallback", "1") == "1"
+
+FIELD_LABELS = {
+    "guest_name": "guest name",
+    "check_in_date": "check-in date",
+    "check_out_date": "check-out date",
+    "num_guests": "number of guests",
+    "phone_number": "contact number",
+    "room_type": "room type",
+    "status": "status",
+}
+
+FIELD_PATTERNS = {
+    "guest_name": re.compile(r"\b(name|who)\b", re.IGNORECASE),
+    "check_in_date": re.compile(r"\b(check[\s-]?in|arriv\w*|start date|from when)\b", re.IGNORECASE),
+    "check_out_date": re.compile(r"\b(check[\s-]?out|depart\w*|leav\w*|end date|until when|till when)\b", re.IGNORECASE),
+    "num_guests": re.compile(r"\b(guests?|people|persons?|pax)\b", re.IGNORECASE),
+    "phone_number": re.compile(r"\b(phone|mobile|contact)(\s+(no|number))?\b", re.IGNORECASE),
+    "room_type": re.compile(r"\b(room|suite|bed)\b", re.IGNORECASE),
+    "status": re.compile(r"\b(status|confirm\w*|cancel\w*|pending|active)\b", re.IGNORECASE),
+}
+FULL_DETAILS = re.compile(r"\b(details?|everything|all|summary|info\w*|show|booking|reservation)\b", re.IGNORECASE)
+# Words that carry no question of their own once the fields are matched;
+# anything else left over ("nights", "dog") means the templates would
+# answer a different question than the one asked.
+FILLER_WORDS = {
+    "a", "about", "an", "and", "are", "at", "book", "booked", "can", "could", "date", "dates", "did", "do", "does",
+    "for", "give", "hello", "hey", "hi", "how", "i", "i'm", "in", "is", "it", "kind", "many", "me", "much", "my",
+    "number", "of", "on", "our", "please", "the", "thanks", "that", "this", "tell", "type", "under", "us", "was",
+    "we", "what", "what's", "whats", "when", "when's", "which", "whose", "with", "you", "your",
+}
+RESERVATION_ID = re.compile(r"\bRES\s?-?\d+\b", re.IGNORECASE)
+
+
+def requested_fields(question):
+    """Fields the guest asked about; empty for a plain details request."""
+    text = RESERVATION_ID.sub(" ", question or "")
+    return [field for field, pattern in FIELD_PATTERNS.items() if pattern.search(text)]
+
+
+def is_free_form(question):
+    """True when the question asks something the field and details templates don't cover."""
+    text = RESERVATION_ID.sub(" ", question or "")
+    for pattern in list(FIELD_PATTERNS.values()) + [FULL_DETAILS]:
+        text = pattern.sub(" ", text)
+    return any(word not in FILLER_WORDS for word in re.findall(r"[a-z']+", text.lower()))
+
+
+def _value(data, field):
+    value = data.get(field)
+    return "not provided yet" if value in (None, "") else value
+
+
+def render(reservation_id, data, question=""):
+    """Deterministic reply for an inquiry about `reservation_id`.
+
+    Returns (message, kind) where kind is "not_found", "fields", "full", or
+    "unanswered" for a free-form question answered with the full details.
+    """
+    if not data and not reservation_id:
+        return "I couldn't find a booking for that. Please share your reservation ID or the phone number you booked with.", "not_found"
+    if not data:
+        return f"I couldn't find a booking with ID: {reservation_id}. Please double-check the ID and try again.", "not_found"
+    free_form = is_free_form(question)
+    fields = [] if free_form else requested_fields(question)
+    if fields and len(fields) < len(FIELD_LABELS):
+        parts = [f"the {FIELD_LABELS[field]} is {_value(data, field)}" for field in fields]
+        answer = "; ".join(parts)
+        return f"For booking {reservation_id}, {answer}.", "fields"
+    guests = data.get("num_guests")
+    guest_text = f"{guests} guest{'s' if guests != 1 else ''}" if guests is not None else "an unspecified number of guests"
+    room = data.get("room_type")
+    room_text = f"a {room} room" if room else "a room type not chosen yet"
+    note = "I can't answer that from the booking record, but here is what it has. " if free_form else ""
+    return note + (
+        f"Your booking (ID: {reservation_id}) for {_value(data, 'guest_name')} from {_value(data, 'check_in_date')} "
+        f"to {_value(data, 'check_out_date')} for {guest_text} in {room_text} with contact number "
+        f"{_value(data, 'phone_number')} is {_value(data, 'status')}."
+    ), "unanswered" if free_form else "full"
@@ -0,0 +1,79 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class InstagramStub:
+    """Local stand-in for the Instagram Graph messaging endpoint.
+
+    Records every POST to /me/messages. The first `fail_first` requests get a
+    429 with `Retry-After: retry_after`, and every response is delayed by
+    `latency` seconds. Point the client at it with
+    MessagingClient(api_base=stub.url) or the instagram_api_base env var.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, fail_first=0, retry_after=0):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.retry_after = retry_after
+        self.requests = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with stub._lock:
+                    stub.requests.append({"path": self.path, "body": body, "authorization": self.headers.get("Authorization"), "at": time.time()})
+                    count = len(stub.requests)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if count <= stub.fail_first:
+                    self._reply(429, {"error": {"message": "rate limited", "code": 4}}, {"Retry-After": str(stub.retry_after)})
+                else:
+                    self._reply(200, {"recipient_id": body.get("recipient", {}).get("id"), "message_id": f"mid.stub.{count}"})
+
+            def _reply(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    stub = InstagramStub(port=port)
+    print(f"Instagram stub listening on {stub.url} (set instagram_api_base={stub.url})")
+    stub.server.serve_forever()
@@ -0,0 +1,91 @@
+import os
+import re
+import threading
+from collections import deque
+from dotenv import load_dotenv
+load_dotenv()
+
+RESERVATION_ID_PATTERN = re.compile(r"\bRES\s?-?(\d+)\b", re.IGNORECASE)
+
+STATUS_WORDS = re.compile(r"\b(status|details?|info|information|show|check|what|when|where|is my|look ?up)\b", re.IGNORECASE)
+CHANGE_WORDS = re.compile(r"\b(update|change|modify|edit|cancel|confirm|reschedule|extend|add|set)\b", re.IGNORECASE)
+NEW_BOOKING = re.compile(r"\b(new|another|fresh)\s+(booking|reservation|room)\b", re.IGNORECASE)
+START_BOOKING = re.compile(r"\b(book|reserve)\s+(a|an|one|me a)\s+(room|stay|suite)\b", re.IGNORECASE)
+PHONE_NUMBER = re.compile(r"(?<!\w)\+?\d[\d\s().-]{8,}\d(?!\w)")
+SMALL_TALK = re.compile(
+    r"^\s*(hi+|hello+|hey+|hiya|good (morning|afternoon|evening|night)|thanks?( you)?( so much| a lot)?|thank u|thx|ty|"
+    r"bye|goodbye|see you|ok(ay)? thanks?|cheers|who are you|what can you do)\s*[!.?]*\s*$",
+    re.IGNORECASE,
+)
+
+MIN_CONFIDENCE = float(os.getenv("intent_rule_min_confidence", "0.9"))
+
+
+def normalize_reservation_id(match):
+    return f"RES{int(match.group(1))}"
+
+
+def classify(text, booking_in_progress):
+    """Return (intent, reservation_id, confidence) for obvious messages.
+
+    Returns None when no rule applies; callers then ask the LLM.
+    """
+    if not text:
+        return None
+    match = RESERVATION_ID_PATTERN.search(text)
+    reservation_id = normalize_reservation_id(match) if match else None
+
+    if reservation_id:
+        if CHANGE_WORDS.search(text):
+            # "confirm the status of RES3" reads as both; an update can hold
+            # a room and text the guest, so the LLM decides unless the rules
+            # threshold is lowered, and never for mixed wording.
+            return "UPDATE", reservation_id, 0.6 if STATUS_WORDS.search(text) else 0.85
+        if STATUS_WORDS.search(text) or text.strip().upper() == reservation_id:
+            return "INQUIRE", reservation_id, 0.95
+        return "INQUIRE", reservation_id, 0.6
+
+    if NEW_BOOKING.search(text) or START_BOOKING.search(text):
+        if CHANGE_WORDS.search(text) or STATUS_WORDS.search(text):
+            # "confirm my new booking", "is my new booking confirmed?": about
+            # a booking, not a request for another one.
+            return "BOOK", None, 0.5
+    if NEW_BOOKING.search(text):
+        return "BOOK", None, 0.95
+    if START_BOOKING.search(text):
+        # While a booking is open only an explicit "new" starts another one.
+        return "BOOK", None, 0.5 if booking_in_progress else 0.95
+    if SMALL_TALK.match(text):
+        return "QA", None, 0.95
+    return None
+
+
+class PathStats:
+    """Counts how each message was classified and how long it took."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._latencies = {}
+        self._window = window
+
+    def record(self, path, seconds):
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + 1
+            self._latencies.setdefault(path, deque(maxlen=self._window)).append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            total = sum(self._counts.values())
+            result = {"total": total, "paths": {}}
+            for path, count in self._counts.items():
+                ordered = sorted(self._latencies[path])
+                result["paths"][path] = {
+                    "count": count,
+                    "share": round(count / total, 3) if total else 0.0,
+                    "p50_seconds": round(ordered[len(ordered) // 2], 4) if ordered else 0.0,
+                }
+            return result
+
+
+path_stats = PathStats()
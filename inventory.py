@@ -0,0 +1,208 @@
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+from datetime import date, timedelta
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_room_type(value):
+    """"King Room", "king rooms" and " KING " all map to "king"."""
+    if value is None:
+        return None
+    value = re.sub(r"\s+", " ", str(value).strip().lower())
+    value = re.sub(r"\s+rooms?$", "", value)
+    return value or None
+
+
+def nights(check_in, check_out):
+    """ISO dates of every night from check_in up to (not including) check_out."""
+    try:
+        start = date.fromisoformat(str(check_in))
+        end = date.fromisoformat(str(check_out))
+    except (TypeError, ValueError):
+        return []
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days)]
+
+
+def parse_room_counts(spec):
+    """"king:10,queen:8" -> {"king": 10, "queen": 8}."""
+    counts = {}
+    for part in (spec or "").split(","):
+        name, _, count = part.partition(":")
+        if normalize_room_type(name) and count.strip():
+            counts[normalize_room_type(name)] = int(count)
+    return counts
+
+
+class RoomInventory:
+    """Room counts per type and per-night occupancy, backed by SQLite.
+
+    `room_nights` holds one row per (room type, night) with the number of
+    rooms reserved, keyed by a WITHOUT ROWID primary key, so checking a stay
+    is one index range scan over its nights regardless of how many bookings
+    exist. `holds` remembers which room type and nights each reservation
+    occupies, so re-confirming a changed booking moves its hold and a
+    cancellation gives the rooms back. Each reserve/release runs in a
+    BEGIN IMMEDIATE transaction, which makes check-and-reserve atomic across
+    threads and processes.
+
+    With no room types configured the inventory is disabled and every
+    reservation is accepted.
+    """
+
+    def __init__(self, path="inventory.db"):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS room_types (room_type TEXT PRIMARY KEY, total INTEGER NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS room_nights (room_type TEXT NOT NULL, night TEXT NOT NULL, "
+            "reserved INTEGER NOT NULL, PRIMARY KEY (room_type, night)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS holds (reservation_id TEXT PRIMARY KEY, room_type TEXT NOT NULL, "
+            "check_in TEXT NOT NULL, check_out TEXT NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def set_rooms(self, counts):
+        conn = self._conn()
+        for room_type, total in counts.items():
+            conn.execute(
+                "INSERT INTO room_types (room_type, total) VALUES (?, ?) ON CONFLICT(room_type) DO UPDATE SET total = excluded.total",
+                (normalize_room_type(room_type), int(total)),
+            )
+
+    def room_types(self):
+        return dict(self._conn().execute("SELECT room_type, total FROM room_types ORDER BY room_type"))
+
+    @property
+    def enabled(self):
+        return self._conn().execute("SELECT 1 FROM room_types LIMIT 1").fetchone() is not None
+
+    def _available(self, conn, room_type, check_in, check_out):
+        found = conn.execute("SELECT total FROM room_types WHERE room_type = ?", (room_type,)).fetchone()
+        if found is None:
+            return 0
+        stay = nights(check_in, check_out)
+        if not stay:
+            return 0
+        busiest = conn.execute(
+            "SELECT MAX(reserved) FROM room_nights WHERE room_type = ? AND night >= ? AND night <= ?",
+            (room_type, stay[0], stay[-1]),
+        ).fetchone()[0]
+        return found[0] - (busiest or 0)
+
+    def available(self, room_type, check_in, check_out):
+        """Rooms of `room_type` free on every night of the stay."""
+        return self._available(self._conn(), normalize_room_type(room_type), check_in, check_out)
+
+    def _release(self, conn, reservation_id):
+        hold = conn.execute("SELECT room_type, check_in, check_out FROM holds WHERE reservation_id = ?", (reservation_id,)).fetchone()
+        if hold is None:
+            return
+        for night in nights(hold[1], hold[2]):
+            conn.execute("UPDATE room_nights SET reserved = reserved - 1 WHERE room_type = ? AND night = ?", (hold[0], night))
+            conn.execute("DELETE FROM room_nights WHERE room_type = ? AND night = ? AND reserved <= 0", (hold[0], night))
+        conn.execute("DELETE FROM holds WHERE reservation_id = ?", (reservation_id,))
+
+    def reserve(self, reservation_id, room_type, check_in, check_out):
+        """Atomically check availability and hold one room for the stay.
+
+        Any earlier hold for the same reservation is released first, in the
+        same transaction. Returns True when the room is held (or inventory is
+        disabled), False when the room type is unknown, the dates are invalid
+        or the room type is full on any night.
+        """
+        room_type = normalize_room_type(room_type)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM room_types LIMIT 1").fetchone() is None:
+                conn.execute("ROLLBACK")
+                return True
+            self._release(conn, reservation_id)
+            if self._available(conn, room_type, check_in, check_out) <= 0:
+                conn.execute("ROLLBACK")
+                return False
+            for night in nights(check_in, check_out):
+                conn.execute(
+                    "INSERT INTO room_nights (room_type, night, reserved) VALUES (?, ?, 1) "
+                    "ON CONFLICT(room_type, night) DO UPDATE SET reserved = reserved + 1",
+                    (room_type, night),
+                )
+            conn.execute(
+                "INSERT INTO holds (reservation_id, room_type, check_in, check_out) VALUES (?, ?, ?, ?)",
+                (reservation_id, room_type, str(check_in), str(check_out)),
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release(self, reservation_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._release(conn, reservation_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def sync_from(self, store):
+        """Hold rooms for confirmed bookings that have no hold yet (first start on an existing store)."""
+        held = {found[0] for found in self._conn().execute("SELECT reservation_id FROM holds")}
+        count = 0
+        for reservation_id, row in store.find("status", "confirmed"):
+            if reservation_id in held or not (row.get("room_type") and row.get("check_in_date") and row.get("check_out_date")):
+                continue
+            if self.reserve(reservation_id, row["room_type"], row["check_in_date"], row["check_out_date"]):
+                count += 1
+            else:
+                logger.warning("Inventory: no %s room left for confirmed booking %s", row["room_type"], reservation_id)
+        return count
+
+    def describe(self):
+        return ", ".join(f"{room_type} ({total})" for room_type, total in self.room_types().items())
+
+
+def open_inventory(store=None):
+    """Open the inventory in `inventory_db`, applying room counts from `room_inventory`
+    (e.g. "king:10,queen:8,suite:2")."""
+    inventory = RoomInventory(os.getenv("inventory_db", "inventory.db"))
+    counts = parse_room_counts(os.getenv("room_inventory", ""))
+    if counts:
+        inventory.set_rooms(counts)
+    if store is not None and inventory.enabled:
+        synced = inventory.sync_from(store)
+        if synced:
+            logger.info("Inventory: held rooms for %d confirmed bookings", synced)
+    return inventory
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        target = open_inventory()
+        target.set_rooms(parse_room_counts(f"{sys.argv[1]}:{sys.argv[2]}"))
+        print(f"Room types: {target.describe()}")
+    elif len(sys.argv) == 4:
+        print(f"{open_inventory().available(*sys.argv[1:])} {normalize_room_type(sys.argv[1])} rooms available")
+    else:
+        print("usage: python inventory.py <room-type> <count> | python inventory.py <room-type> <check-in> <check-out>")
+        sys.exit(1)
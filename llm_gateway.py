@@ -0,0 +1,402 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+import metrics
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first.
+PRIORITY_BOOKING = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_QA = 2
+PRIORITY_BACKGROUND = 3
+NODE_PRIORITIES = {
+    "book": PRIORITY_BOOKING,
+    "update": PRIORITY_BOOKING,
+    "chatBot": PRIORITY_DEFAULT,
+    "combined": PRIORITY_DEFAULT,
+    "inquire": PRIORITY_DEFAULT,
+    "qa": PRIORITY_QA,
+    "compact_history": PRIORITY_BACKGROUND,
+}
+
+GATEWAY_CALLS = metrics.registry.counter("hotel_llm_gateway_total", "LLM calls through the gateway by outcome.", ["outcome"])
+QUEUE_SECONDS = metrics.registry.histogram("hotel_llm_queue_seconds", "Time LLM calls waited for admission.", ["priority"])
+
+
+class LLMUnavailable(Exception):
+    """The LLM could not be called before the caller's deadline (quota or overload)."""
+
+
+def is_rate_limited(error):
+    text = f"{type(error).__name__} {error}"
+    return getattr(error, "code", None) == 429 or any(marker in text for marker in ("429", "RESOURCE_EXHAUSTED", "ResourceExhausted", "quota"))
+
+
+class TokenBucket:
+    """`per_minute` units refilled continuously, holding at most `burst_seconds` worth. 0 means unlimited."""
+
+    def __init__(self, per_minute, burst_seconds=60.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds) if per_minute else 0
+        self.level = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available; requests larger than the bucket wait for a full one."""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        """Take `amount` units (negative to give some back); the level may go below zero."""
+        if self.rate:
+            self._refill(now)
+            self.level -= amount
+
+
+class LocalLimits:
+    """The request and token buckets and the rate-limit pause of one process.
+
+    `acquire(tokens)` takes one request and `tokens` if all three allow it and
+    returns 0, else returns the seconds to wait; `settle` corrects the token
+    estimate afterwards. Callers serialise access (LLMGateway holds its lock).
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, burst_seconds=60.0):
+        self._requests = TokenBucket(requests_per_minute, burst_seconds)
+        self._tokens = TokenBucket(tokens_per_minute, burst_seconds)
+        self._paused_until = 0.0
+
+    def _acquire(self, tokens, now):
+        wait = max(self._paused_until - now, self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+        if wait <= 0:
+            self._requests.take(1, now)
+            self._tokens.take(tokens, now)
+        return wait
+
+    def _pause(self, seconds, now):
+        self._paused_until = max(self._paused_until, now + seconds)
+
+    def acquire(self, tokens):
+        return self._acquire(tokens, time.monotonic())
+
+    def settle(self, tokens):
+        self._tokens.take(tokens, time.monotonic())
+
+    def pause(self, seconds):
+        self._pause(seconds, time.monotonic())
+
+    def paused_seconds(self):
+        return max(0.0, self._paused_until - time.monotonic())
+
+
+class SharedLimits(LocalLimits):
+    """LocalLimits kept in a SQLite file, so worker processes draw on one provider quota.
+
+    Every call is one short write transaction that loads the buckets and
+    the pause, applies the change and stores them back. Times are wall-clock,
+    as processes don't share a monotonic clock. Priorities still only order
+    the calls of one process.
+    """
+
+    def __init__(self, path, requests_per_minute=0, tokens_per_minute=0, burst_seconds=60.0):
+        super().__init__(requests_per_minute, tokens_per_minute, burst_seconds)
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute("CREATE TABLE IF NOT EXISTS llm_limits (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # Every worker opens the file as it starts; switching a new file
+            # to WAL fails at once, without the busy timeout, while another
+            # process holds it.
+            for attempt in range(50):
+                try:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    break
+                except sqlite3.OperationalError:
+                    if attempt == 49:
+                        raise
+                    time.sleep(0.1)
+            self._local.conn = conn
+        return conn
+
+    def _shared(self, fn):
+        """`fn(now)` with the buckets and pause loaded from the file, stored back after it returns."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            rows = {name: (level, updated) for name, level, updated in conn.execute("SELECT name, level, updated FROM llm_limits")}
+            for name, bucket in (("requests", self._requests), ("tokens", self._tokens)):
+                bucket.level, bucket.updated = rows.get(name, (bucket.capacity, now))
+            self._paused_until = rows.get("paused", (0.0, now))[0]
+            result = fn(now)
+            conn.executemany("INSERT OR REPLACE INTO llm_limits (name, level, updated) VALUES (?, ?, ?)", [
+                ("requests", self._requests.level, self._requests.updated),
+                ("tokens", self._tokens.level, self._tokens.updated),
+                ("paused", self._paused_until, now),
+            ])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def acquire(self, tokens):
+        return self._shared(lambda now: self._acquire(tokens, now))
+
+    def settle(self, tokens):
+        self._shared(lambda now: self._tokens.take(tokens, now))
+
+    def pause(self, seconds):
+        self._shared(lambda now: self._pause(seconds, now))
+
+    def paused_seconds(self):
+        return self._shared(lambda now: max(0.0, self._paused_until - now))
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LLMGateway:
+    """Admission control in front of the chat model.
+
+    Calls queue by priority (then arrival) and are admitted when at most
+    `max_concurrency` are running and both token buckets (requests and
+    estimated tokens per minute) have room; `burst_seconds` bounds how much
+    of a minute's quota can go out at once. The buckets are `limits`
+    (default: LocalLimits for this process). Actual token usage is settled
+    afterwards. A call still queued at its deadline raises LLMUnavailable.
+    Rate-limit errors from the provider pause all admissions with
+    exponential backoff and the call is retried while its deadline allows.
+    Identical concurrent requests share one provider call.
+    """
+
+    def __init__(self, model, requests_per_minute=0, tokens_per_minute=0, burst_seconds=60.0, max_concurrency=8,
+                 deadline_seconds=30.0, max_output_tokens=256, coalesce=True, backoff_seconds=1.0, max_backoff_seconds=30.0,
+                 limits=None):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.deadline_seconds = deadline_seconds
+        self.max_output_tokens = max_output_tokens
+        self.coalesce = coalesce
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._limits = limits or LocalLimits(requests_per_minute, tokens_per_minute, burst_seconds)
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._flights = {}
+        self._counts = {"admitted": 0, "coalesced": 0, "rate_limited": 0, "deadline": 0}
+
+    def _count(self, outcome):
+        with self._cond:
+            self._counts[outcome] += 1
+        GATEWAY_CALLS.inc(outcome=outcome)
+
+    def _estimate(self, messages):
+        return sum(len(str(message.content)) for message in messages) // 4 + self.max_output_tokens
+
+    def _admit(self, priority, deadline, tokens):
+        started = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._waiting[0] == ticket and self._in_flight < self.max_concurrency:
+                        wait = self._limits.acquire(tokens)
+                        if wait <= 0:
+                            self._in_flight += 1
+                            self._counts["admitted"] += 1
+                            break
+                    if now >= deadline:
+                        self._counts["deadline"] += 1
+                        GATEWAY_CALLS.inc(outcome="deadline")
+                        raise LLMUnavailable(f"LLM call still queued after {now - started:.1f}s")
+                    self._cond.wait(deadline - now if wait is None else min(wait, deadline - now))
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+        GATEWAY_CALLS.inc(outcome="admitted")
+        QUEUE_SECONDS.observe(time.monotonic() - started, priority=priority)
+
+    def _release(self, estimated, usage):
+        with self._cond:
+            self._in_flight -= 1
+            if usage and usage.get("total_tokens"):
+                self._limits.settle(usage["total_tokens"] - estimated)
+            self._cond.notify_all()
+
+    def _backoff(self, attempt, deadline, error):
+        """Pause admissions after a rate-limit error; raises if the deadline would pass first."""
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)
+        self._count("rate_limited")
+        if time.monotonic() + delay >= deadline:
+            raise LLMUnavailable(f"LLM rate limited: {error}") from error
+        logger.warning("LLM rate limited (%s), pausing calls for %.1fs", error, delay)
+        with self._cond:
+            self._limits.pause(delay)
+
+    def _key(self, kind, messages, kwargs):
+        digest = hashlib.sha256()
+        for message in messages:
+            digest.update(f"{message.type}\0{message.content}\0".encode())
+        digest.update(repr(sorted(kwargs.items())).encode())
+        return kind, digest.hexdigest()
+
+    def _join(self, key):
+        """(flight, True) for the first caller with `key`, (flight, False) for callers that share its result."""
+        if not self.coalesce:
+            return _Flight(), True
+        with self._cond:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _land(self, key, flight):
+        with self._cond:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.done.set()
+
+    def _follow(self, flight, deadline):
+        self._count("coalesced")
+        if not flight.done.wait(max(0.0, deadline - time.monotonic())):
+            raise LLMUnavailable("shared LLM call did not finish before the deadline")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _deadline(self, deadline_seconds):
+        return time.monotonic() + (self.deadline_seconds if deadline_seconds is None else deadline_seconds)
+
+    def invoke(self, messages, priority=PRIORITY_DEFAULT, deadline_seconds=None, **kwargs):
+        deadline = self._deadline(deadline_seconds)
+        key = self._key("invoke", messages, kwargs) if self.coalesce else None
+        flight, leader = self._join(key)
+        if not leader:
+            # Tokens were spent once, by the leader's call.
+            return self._follow(flight, deadline).model_copy(update={"usage_metadata": None})
+        try:
+            estimated = self._estimate(messages)
+            for attempt in itertools.count():
+                self._admit(priority, deadline, estimated)
+                response = None
+                try:
+                    response = self.model.invoke(messages, **kwargs)
+                    break
+                except Exception as e:
+                    if not is_rate_limited(e):
+                        raise
+                    error = e
+                finally:
+                    self._release(estimated, getattr(response, "usage_metadata", None))
+                self._backoff(attempt, deadline, error)
+            flight.result = response
+            return response
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._land(key, flight)
+
+    def stream(self, messages, priority=PRIORITY_DEFAULT, deadline_seconds=None, **kwargs):
+        """Like `model.stream`; a rate-limit error is retried only if nothing has been yielded yet."""
+        deadline = self._deadline(deadline_seconds)
+        key = self._key("stream", messages, kwargs) if self.coalesce else None
+        flight, leader = self._join(key)
+        if not leader:
+            for chunk in self._follow(flight, deadline):
+                yield chunk.model_copy(update={"usage_metadata": None})
+            return
+        chunks = []
+        try:
+            estimated = self._estimate(messages)
+            for attempt in itertools.count():
+                self._admit(priority, deadline, estimated)
+                usage = {}
+                try:
+                    for chunk in self.model.stream(messages, **kwargs):
+                        for field, value in (getattr(chunk, "usage_metadata", None) or {}).items():
+                            if isinstance(value, int):
+                                usage[field] = usage.get(field, 0) + value
+                        chunks.append(chunk)
+                        yield chunk
+                    break
+                except Exception as e:
+                    if chunks or not is_rate_limited(e):
+                        raise
+                    error = e
+                finally:
+                    self._release(estimated, usage)
+                self._backoff(attempt, deadline, error)
+        except BaseException as e:
+            flight.error = e if isinstance(e, Exception) else None
+            raise
+        finally:
+            # A consumer that stops early (GeneratorExit) still leaves followers the chunks it saw.
+            flight.result = chunks
+            self._land(key, flight)
+
+    async def ainvoke(self, messages, priority=PRIORITY_DEFAULT, deadline_seconds=None, **kwargs):
+        return await asyncio.to_thread(self.invoke, messages, priority, deadline_seconds, **kwargs)
+
+    def stats(self):
+        with self._cond:
+            return {"waiting": len(self._waiting), "in_flight": self._in_flight, "shared_requests": len(self._flights),
+                    "paused_seconds": round(self._limits.paused_seconds(), 2), **self._counts}
+
+
+def open_gateway(model):
+    """The gateway for `model` from the llm_* env vars.
+
+    The quota is the provider's, so with `llm_limits_db` (serve.py sets it)
+    all worker processes share one set of buckets; `llm_max_concurrency` is
+    for the whole server and split evenly over `llm_processes` workers.
+    """
+    requests_per_minute = int(os.getenv("llm_requests_per_minute", "0"))
+    tokens_per_minute = int(os.getenv("llm_tokens_per_minute", "0"))
+    burst_seconds = float(os.getenv("llm_burst_seconds", "60"))
+    limits = None
+    if os.getenv("llm_limits_db"):
+        limits = SharedLimits(os.getenv("llm_limits_db"), requests_per_minute, tokens_per_minute, burst_seconds)
+    processes = max(1, int(os.getenv("llm_processes", "1")))
+    return LLMGateway(
+        model,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        burst_seconds=burst_seconds,
+        limits=limits,
+        max_concurrency=max(1, int(os.getenv("llm_max_concurrency", "8")) // processes),
+        deadline_seconds=float(os.getenv("llm_deadline_seconds", "30")),
+        coalesce=os.getenv("llm_coalesce", "1") == "1",
+    )
@@ -1,35 +1,121 @@
 import json
+import logging
 import os
+import re
+import threading
+import time
 from datetime import datetime
 from typing import Dict, Any, TypedDict, Annotated, List
 from langgraph.graph import StateGraph,START,END
 from langgraph.graph.message import add_messages
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langgraph.checkpoint.memory import MemorySaver
 import operator
-import pandas as pd
 import prompt
-from dm_function import send_message
-from sms import send_sms
+import intent_rules
+import context_policy
+import structured_output
+import inquire_renderer
+import metrics
+from log_config import SAMPLED
+from qa_cache import QA_CACHE_ENABLED, prompt_fingerprint, qa_cache
+from usage_stats import usage_stats
+from booking_store import BOOKING_FIELDS, open_store
+from booking_query import BookingQuery
+from inventory import open_inventory
+from prompt_cache import open_prompt_cache, prompt_bytes
+from llm_gateway import NODE_PRIORITIES, PRIORITY_BOOKING, PRIORITY_DEFAULT, open_gateway
+from id_allocator import open_reservation_ids
+from checkpointer import open_checkpointer
+from dm_function import send_message, send_action
+from reply_stream import REPLY_STREAMING, ReplyStreamer
+from sms import queue_sms
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 api_key = os.getenv("gemini_api_key")
-llm = ChatGoogleGenerativeAI(
-        model="gemini-1.5-flash-latest",
+LLM_MODEL = os.getenv("llm_model", "gemini-1.5-flash-latest")
+
+curr_date = datetime.now()
+current_date_for_llm = str(curr_date).split()[0]
+
+# Clients and the booking store are created on first use, so importing this
+# module (and booting a worker) does not pay for the Gemini SDK import or for
+# opening and seeding the databases. Tests and benchmarks can still assign
+# these globals directly.
+llm = None
+store = None
+reservation_ids = None
+booking_query = None
+inventory = None
+prompt_cache = None
+gateway = None
+_init_lock = threading.RLock()
+
+
+def _lazy(name, factory):
+    value = globals()[name]
+    if value is None:
+        with _init_lock:
+            value = globals()[name]
+            if value is None:
+                value = factory()
+                globals()[name] = value
+    return value
+
+def make_llm():
+    if os.getenv("llm_backend", "gemini") == "fake":
+        # Offline backend for load tests and local runs without an API key.
+        from fake_llm import FakeChatModel, UNIVERSAL_REPLY
+        return FakeChatModel([UNIVERSAL_REPLY], first_token_latency=float(os.getenv("fake_llm_latency", "0.5")))
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=LLM_MODEL,
         temperature=0.7,
         google_api_key=api_key,
     )
 
-curr_date = datetime.now()
-current_date_for_llm = str(curr_date).split()[0]
+def get_llm():
+    return _lazy("llm", make_llm)
+
+def get_store():
+    return _lazy("store", open_store)
+
+def get_reservation_ids():
+    return _lazy("reservation_ids", lambda: open_reservation_ids(get_store()))
+
+def get_booking_query():
+    return _lazy("booking_query", lambda: BookingQuery(get_store()))
+
+def get_inventory():
+    return _lazy("inventory", lambda: open_inventory(get_store()))
+
+def get_gateway():
+    """Every LLM call goes through here: queueing, rate limits, priorities and deadlines."""
+    return _lazy("gateway", lambda: open_gateway(get_llm()))
 
-df = pd.read_csv("booking_data.csv")
-df.set_index("reservation_id",inplace = True)
+def get_prompt_cache():
+    return _lazy("prompt_cache", lambda: open_prompt_cache(LLM_MODEL, api_key))
 
-in_progess = False
+def warm_up():
+    """Create every client up front, e.g. from a background thread after boot."""
+    started = time.perf_counter()
+    get_gateway()
+    get_reservation_ids()
+    get_booking_query()
+    get_inventory()
+    get_prompt_cache()
+    logger.info("Clients ready in %.2fs", time.perf_counter() - started)
+
+GRAPH_MODE = os.getenv("graph_mode", "two_hop")
+PRIVATE_LOOKUP_MESSAGE = (
+    "For your privacy I can only look up a booking made in this chat by phone number or name. "
+    "Please send your reservation ID (it starts with RES) and I'll check it for you."
+)
+LATEST_BOOKING = re.compile(r"\b(latest|last|most recent|newest)\b", re.IGNORECASE)
+LLM_STREAMING = os.getenv("llm_streaming", "1") == "1"
 
 
 
@@ -37,101 +123,189 @@ class State(TypedDict):
     messages: Annotated[list[HumanMessage | AIMessage], operator.add]
     intent: str
     current_reservation_id: str
+    # Reservation IDs this conversation created; only these are found by a
+    # phone number or name without the guest giving the ID.
+    own_reservation_ids: Annotated[list[str], operator.add]
+    # Reservation ID whose cancellation the guest was asked to confirm.
+    pending_cancellation: str
     sender_id: str
+    booking_in_progress: str
+    payload: dict
+    context_summary: str
+    summarized_count: int
+
+def invoke_llm(node, formatted_messages, mode="two_hop", structured=False, on_partial=None, priority=None):
+    started = time.perf_counter()
+    messages, kwargs = get_prompt_cache().prepare(formatted_messages)
+    if priority is None:
+        priority = NODE_PRIORITIES.get(node, PRIORITY_DEFAULT)
+    if structured and LLM_STREAMING:
+        response = structured_output.collect(get_gateway().stream(messages, priority, **kwargs), on_partial)
+    else:
+        response = get_gateway().invoke(messages, priority, **kwargs)
+    seconds = time.perf_counter() - started
+    total_bytes = prompt_bytes(formatted_messages)
+    sent_bytes = total_bytes if messages is formatted_messages else prompt_bytes(messages)
+    usage_stats.record_call(mode, node, seconds, getattr(response, "usage_metadata", None), total_bytes, sent_bytes)
+    metrics.observe_llm(node, seconds, getattr(response, "usage_metadata", None), total_bytes, sent_bytes)
+    return response
+
+def invoke_structured(node, formatted_messages, mode="two_hop", on_partial=None, priority=None):
+    return structured_output.complete(
+        node, formatted_messages,
+        lambda messages, on_partial: invoke_llm(node, messages, mode, structured=True, on_partial=on_partial, priority=priority),
+        on_partial,
+    )
+
+def reply_streamer(state, early=True):
+    if REPLY_STREAMING and LLM_STREAMING:
+        return ReplyStreamer(state["sender_id"], send_message, send_action, early=early).start()
+    return None
+
+def hold_room(reservation_id, row):
+    """Check-and-reserve a room for a booking being confirmed.
+
+    Returns None when the room is held, otherwise the message for the guest.
+    """
+    if not (row.get("room_type") and row.get("check_in_date") and row.get("check_out_date")):
+        return "I need the room type, check-in date and check-out date before I can confirm this booking."
+    if get_inventory().reserve(reservation_id, row["room_type"], row["check_in_date"], row["check_out_date"]):
+        return None
+    logger.info("No availability for %s: %s %s to %s", reservation_id, row["room_type"], row["check_in_date"], row["check_out_date"])
+    return (
+        f"Sorry, no {row['room_type']} room is available from {row['check_in_date']} to {row['check_out_date']}, "
+        f"so booking {reservation_id} is not confirmed yet. Room types: {get_inventory().describe()}. "
+        "Would you like to change the room type or dates?"
+    )
+
+def cancellation_step(state, reservation_id, merged, update_init):
+    """(pending_cancellation, message override) for an update turn.
+
+    The model marks a booking cancelled both when the guest asks to cancel
+    and when they confirm it, so the first of those turns only asks for
+    confirmation and remembers the ID; the booking is cancelled on the next
+    turn that still says cancelled. Any other turn drops the pending request.
+    """
+    if not (update_init and merged.get("status") == "cancelled"):
+        return None, None
+    if state.get("pending_cancellation") == reservation_id:
+        return None, None
+    return reservation_id, prompt.CANCEL_CONFIRMATION.format(reservation_id=reservation_id)
+
+def cancel_booking(reservation_id, data):
+    """Store the cancellation, then give the room back, so a booking never stays confirmed without its hold."""
+    get_store().upsert(reservation_id, dict(data, status="cancelled"))
+    get_inventory().release(reservation_id)
+    logger.info("Cancelled booking %s", reservation_id)
+
+def deliver_reply(state, streamer, message):
+    if streamer is None:
+        send_message(state["sender_id"], message)
+        return
+    streamer.deliver(message)
+    logger.debug("Reply timing: first feedback %ss, reply %ss", streamer.first_feedback_seconds, streamer.reply_seconds)
+
+def unparsed_reply(state, updates=None, streamer=None):
+    message = "I had trouble understanding that. Could you please rephrase?"
+    if streamer is None or streamer.sent is None:
+        send_message(state["sender_id"], message)
+    return {**(updates or {}), "messages": [AIMessage(content=json.dumps({"message": message}))]}
+
+def compact_history(state: State):
+    if not context_policy.needs_summary(state):
+        return {}
+    logger.debug("Entering compact_history node")
+    summarized_count = state.get("summarized_count", 0)
+    split = context_policy.summary_split(state["messages"])
+    aged_out = [message for message in map(context_policy.compact_message, state["messages"][summarized_count:split]) if message is not None]
+    response = invoke_llm("compact_history", prompt.history_summary_prompt(state.get("context_summary"), aged_out), mode=GRAPH_MODE)
+    return {"context_summary": str(response.content).strip(), "summarized_count": split}
+
+def routed(response, intent, reservation_id=None):
+    """State update for a classified turn; only an update turn keeps a cancellation waiting for its confirmation."""
+    result = {"messages": [response], "intent": intent}
+    if reservation_id is not None:
+        result["current_reservation_id"] = reservation_id
+    if intent != "UPDATE":
+        result["pending_cancellation"] = None
+    return result
 
 def chatBot(state: State):
-    print("\n--- Entering chatBot node (for intent classification) ---")
+    logger.debug("Entering chatBot node")
     current_user_input_content = ""
     if state["messages"] and isinstance(state["messages"][-1], HumanMessage):
         current_user_input_content = state["messages"][-1].content
     else:
-        print("Warning: Last message in chat_history is not a HumanMessage or list is empty. Cannot extract current_user_input_content.")
-
-    formatted_messages = [prompt.hotel_booking_flags_prompt]+state["messages"]+[HumanMessage(content=f"User Input: {current_user_input_content}\n current_booking_progress: {in_progess}")]
+        logger.warning("Last message in chat history is not a HumanMessage; cannot extract the user input.")
+
+    started = time.perf_counter()
+    booking_in_progress = state.get("booking_in_progress", "FALSE")
+    rule = intent_rules.classify(current_user_input_content, booking_in_progress == "TRUE")
+    if rule and rule[2] >= intent_rules.MIN_CONFIDENCE:
+        determined_intent, reservation_id, confidence = rule
+        logger.debug("Rule-based intent: %s (confidence %s, reservation_id %s)", determined_intent, confidence, reservation_id)
+        response = AIMessage(content=json.dumps({"reservation_id": reservation_id, "intent": determined_intent}))
+        intent_rules.path_stats.record("rules", time.perf_counter() - started)
+        return routed(response, determined_intent, reservation_id)
+
+    formatted_messages = [prompt.hotel_booking_flags_prompt]+context_policy.window(state, "chatBot")+[HumanMessage(content=f"User Input: {current_user_input_content}\n current_booking_progress: {booking_in_progress}")]
     
 
-    response = llm.invoke(formatted_messages)
-    print(f"LLM Raw Response from chatBot: {response.content}")
-    raw_json_string = response.content
-    start_index = raw_json_string.find('{')
-    end_index = raw_json_string.rfind('}') + 1
-
-    data = {}
-    if start_index != -1 and end_index != 0 and start_index < end_index:
-        json_substring = raw_json_string[start_index:end_index]
-        try:
-            data = json.loads(json_substring)
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON from LLM: {e}\nProblematic content: {json_substring}")
-    else:
-        print(f"Warning: No valid JSON object found in LLM response: {raw_json_string}")
-
+    # Classifying a turn of a booking in progress is part of that booking.
+    data, response = invoke_structured("chatBot", formatted_messages, priority=PRIORITY_BOOKING if booking_in_progress == "TRUE" else None)
+    intent_rules.path_stats.record("llm", time.perf_counter() - started)
+    logger.debug("LLM raw response from chatBot: %s", response.content, extra=SAMPLED)
+    if data is None:
+        logger.warning("Could not classify intent, answering as QA.")
+        data = {"intent": "QA"}
 
     determined_intent = data.get("intent")
     reservation_id = data.get("reservation_id")
 
-    if reservation_id != None and reservation_id != "null":
-        return {"messages": [response], "intent": determined_intent, "current_reservation_id": reservation_id}
-    return {"messages": [response], "intent": determined_intent}
+    return routed(response, determined_intent, reservation_id)
 
 
 def book(state: State):
-    global in_progess
-    in_progess = "TRUE"
-    print("\n--- Entering BOOK node ---")
+    booking_in_progress = "TRUE"
+    logger.debug("Entering book node")
     current_user_input_content = ""
     for msg in reversed(state["messages"]):
         if isinstance(msg, HumanMessage):
             current_user_input_content = msg.content
             break
     if not current_user_input_content:
-        print("Warning: No human input found for booking details.")
-        return {"messages": state["messages"] + [AIMessage(content="I couldn't understand your request. Please try again.")]}
-
-    reservation_id_for_llm = "RES"+str(len(df)+1)
-
-
-    system_message_context = prompt.booking_details_prompt(current_date_for_llm, reservation_id_for_llm)
-
-
-    formatted_messages = [SystemMessage(content=system_message_context)]+state["messages"]+[HumanMessage(content=f"User input: {current_user_input_content}")]
-    response = llm.invoke(formatted_messages)
-    print(f"LLM Raw Response from book node: {response.content}")
-
-    try:
-        raw_json_string = response.content
-        start_index = raw_json_string.find('{')
-        end_index = raw_json_string.rfind('}') + 1
-        
-        if start_index != -1 and end_index != 0 and start_index < end_index:
-            json_substring = raw_json_string[start_index:end_index]
-            booking_data_output = json.loads(json_substring)
-            extracted_booking_details = booking_data_output.get("booking_data", {})
-            print(booking_data_output.get("message"))
-            send_message(state["sender_id"], booking_data_output.get("message"))
-            values_list = list(extracted_booking_details.values())
-            df.loc[values_list[0]] = values_list[1:]
-            df.to_csv("booking_data.csv")
-            print(df)
-            return {
-                "messages": [response],
-                "current_reservation_id": extracted_booking_details.get("reservation_id") 
-            }
-        else:
-            print(f"Warning: No valid JSON object found in LLM response for booking: {raw_json_string}")
-            return {"messages": state["messages"] + [AIMessage(content="I had trouble understanding your booking details. Could you please rephrase?")]}
+        logger.warning("No human input found in the conversation.")
+        return {"booking_in_progress": booking_in_progress, "messages": [AIMessage(content="I couldn't understand your request. Please try again.")]}
+
+    reservation_id_for_llm = get_reservation_ids().next_id()
+
+
+    system_messages = prompt.booking_details_prompt(current_date_for_llm, reservation_id_for_llm)
+    formatted_messages = system_messages+context_policy.window(state, "book")+[HumanMessage(content=f"User input: {current_user_input_content}")]
+    streamer = reply_streamer(state)
+    booking_data_output, response = invoke_structured("book", formatted_messages, on_partial=streamer)
+    logger.debug("LLM raw response from book node: %s", response.content, extra=SAMPLED)
+    if booking_data_output is None:
+        return unparsed_reply(state, {"booking_in_progress": booking_in_progress}, streamer)
+
+    extracted_booking_details = booking_data_output.get("booking_data", {})
+    logger.debug("Reply: %s", booking_data_output.get("message"), extra=SAMPLED)
+    deliver_reply(state, streamer, booking_data_output.get("message"))
+    # Always the allocated ID: the model may echo one from history or the guest.
+    get_store().upsert(reservation_id_for_llm, {field: extracted_booking_details.get(field) for field in BOOKING_FIELDS})
+    logger.info("Saved new booking %s", reservation_id_for_llm)
+    return {
+        "booking_in_progress": booking_in_progress,
+        "messages": [response],
+        "current_reservation_id": reservation_id_for_llm,
+        "own_reservation_ids": [reservation_id_for_llm]
+    }
 
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from LLM in book node: {e}\nProblematic content: {response.content}")
-        return {"messages": state["messages"] + [AIMessage(content="I encountered an error processing your booking details. Please try again.")]}
 def update(state: State):
-    global in_progess
-    in_progess = "TRUE"
-    print("\n--- Entering UPDATE node ---")
+    booking_in_progress = "TRUE"
+    logger.debug("Entering update node")
     reservation_id = state.get("current_reservation_id")
-    data = {}
-    if reservation_id in df.index:
-        data = df.loc[reservation_id]
+    data = get_store().get(reservation_id) or {}
 
     current_user_input_content = ""
     for msg in reversed(state["messages"]):
@@ -139,64 +313,97 @@ def update(state: State):
             current_user_input_content = msg.content
             break
     if not current_user_input_content:
-        print("Warning: No human input found for booking details.")
-        return {"messages": state["messages"] + [AIMessage(content="I couldn't understand your request. Please try again.")]}
-
-    data = dict(data)
-
+        logger.warning("No human input found in the conversation.")
+        return {"booking_in_progress": booking_in_progress, "pending_cancellation": None, "messages": [AIMessage(content="I couldn't understand your request. Please try again.")]}
 
     if data == {}:
         send_message(state["sender_id"], "Please provide a valid reservation_id or initialize a new booking.")
         return {
+                "booking_in_progress": booking_in_progress,
+                "pending_cancellation": None,
                 "messages": [AIMessage(content="please provide correct reservation_id")]
             }
     elif data['status'] == "cancelled":
-        in_progess = "FALSE"
+        booking_in_progress = "FALSE"
         send_message(state["sender_id"], "Updation is not possible as this booking is cancelled. Please start a new booking.")
         return {
+                "booking_in_progress": booking_in_progress,
+                "pending_cancellation": None,
                 "messages": [AIMessage(content="updation is not possible as this booking is cancelled please start a new booking")]
             }
-    print("data=======",data,reservation_id)
-    update_system_message = prompt.update_details_prompt(current_date_for_llm, reservation_id, data)
-    print("data=======",data,reservation_id)
-    formatted_messages = [update_system_message]+state["messages"]+[HumanMessage(content=f"User input: {current_user_input_content}")]
-    response = llm.invoke(formatted_messages)
-    print(f"LLM Raw Response from book node: {response.content}")
-    try:
-        raw_json_string = response.content
-        start_index = raw_json_string.find('{')
-        end_index = raw_json_string.rfind('}') + 1
-        
-        if start_index != -1 and end_index != 0 and start_index < end_index:
-            json_substring = raw_json_string[start_index:end_index]
-            booking_data_output = json.loads(json_substring)
-            extracted_booking_details = booking_data_output.get("data", {})
-            print(booking_data_output.get("message"))
-            send_message(state["sender_id"], booking_data_output.get("message"))
-            values_list = list(extracted_booking_details.values())
-            if booking_data_output.get("update_init") and extracted_booking_details.get("status") == "confirmed":
-                print("Sending SMS with booking details...")
-                send_sms(extracted_booking_details.get("phone_number"), booking_data_output.get("message"))
-            if booking_data_output.get("update_init") and extracted_booking_details.get("status") != "cancelled":
-                df.loc[reservation_id] = values_list
-                df.to_csv("booking_data.csv")
-            return {
-                "messages": [response]
-            }
-        else:
-            print(f"Warning: No valid JSON object found in LLM response for booking: {raw_json_string}")
-            return {"messages": state["messages"] + [AIMessage(content="I had trouble understanding your booking details. Could you please rephrase?")]}
-
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from LLM in book node: {e}\nProblematic content: {response.content}")
-        return {"messages": state["messages"] + [AIMessage(content="I encountered an error processing your booking details. Please try again.")]}
+    logger.debug("Booking %s: %s", reservation_id, data, extra=SAMPLED)
+    update_system_messages = prompt.update_details_prompt(current_date_for_llm, reservation_id, data)
+    formatted_messages = update_system_messages+context_policy.window(state, "update")+[HumanMessage(content=f"User input: {current_user_input_content}")]
+    # The reply must wait for the availability check and the cancellation
+    # step, either of which can replace it.
+    streamer = reply_streamer(state, early=False)
+    booking_data_output, response = invoke_structured("update", formatted_messages, on_partial=streamer)
+    logger.debug("LLM raw response from update node: %s", response.content, extra=SAMPLED)
+    if booking_data_output is None:
+        return unparsed_reply(state, {"booking_in_progress": booking_in_progress, "pending_cancellation": None}, streamer)
+
+    extracted_booking_details = booking_data_output.get("data", {})
+    merged = {field: extracted_booking_details.get(field, data.get(field)) for field in BOOKING_FIELDS}
+    message = booking_data_output.get("message")
+    update_init = booking_data_output.get("update_init")
+    if update_init and merged.get("status") == "confirmed":
+        unavailable = hold_room(reservation_id, merged)
+        if unavailable:
+            message = unavailable
+            if data.get("status") == "confirmed":
+                # Keep the confirmed booking (and its held room) as it was.
+                update_init = 0
+            merged["status"] = data.get("status")
+            response = AIMessage(content=json.dumps({"message": message}))
+    pending, cancel_message = cancellation_step(state, reservation_id, merged, update_init)
+    if cancel_message:
+        message = cancel_message
+        response = AIMessage(content=json.dumps({"message": message}))
+    logger.debug("Reply: %s", message, extra=SAMPLED)
+    deliver_reply(state, streamer, message)
+    if update_init and merged.get("status") == "confirmed":
+        logger.info("Queueing booking confirmation SMS for %s", reservation_id)
+        queue_sms(merged.get("phone_number"), message, dedup_key=f"{reservation_id}:confirmed")
+    if update_init and merged.get("status") == "cancelled" and not pending:
+        cancel_booking(reservation_id, data)
+        booking_in_progress = "FALSE"
+    if update_init and merged.get("status") != "cancelled":
+        get_store().upsert(reservation_id, merged)
+    return {
+        "booking_in_progress": booking_in_progress,
+        "messages": [response],
+        "pending_cancellation": pending
+    }
+
+def resolve_inquiry(state, reservation_id, question):
+    """Find the booking an inquiry is about.
+
+    Uses the reservation ID when it exists, otherwise a phone number or guest
+    name in the question, but only among the bookings this conversation
+    created: anyone can type a phone number or name. Returns
+    (reservation_id, data, message) where message is set when the guest has
+    to pick between several bookings or has to send the ID.
+    """
+    data = get_store().get(reservation_id)
+    if data:
+        return reservation_id, data, None
+    own = set(state.get("own_reservation_ids") or [])
+    matches = [(rid, row) for rid, row in get_booking_query().resolve(question) if rid in own]
+    if not matches:
+        if get_booking_query().mentions_guest(question):
+            # Same reply whether or not other guests' bookings matched.
+            return None, {}, PRIVATE_LOOKUP_MESSAGE
+        return reservation_id, data or {}, None
+    if len(matches) == 1 or LATEST_BOOKING.search(question):
+        found_id, data = get_booking_query().latest(matches)
+        logger.info("Resolved inquiry to %s without a reservation ID", found_id)
+        return found_id, data, None
+    listing = "; ".join(f"{rid} ({row.get('check_in_date') or 'no date'} to {row.get('check_out_date') or 'no date'}, {row.get('status') or 'no status'})" for rid, row in matches)
+    return None, {}, f"I found {len(matches)} bookings: {listing}. Which reservation ID would you like to know about?"
 
 def inquire(state: State):
-    print("\n--- Entering INQUIRY node ---")
+    logger.debug("Entering inquire node")
     reservation_id = state.get("current_reservation_id")
-    data = {}
-    if reservation_id in df.index:
-        data = df.loc[reservation_id]
 
     current_user_input_content = ""
     for msg in reversed(state["messages"]):
@@ -204,40 +411,46 @@ def inquire(state: State):
             current_user_input_content = msg.content
             break
     if not current_user_input_content:
-        print("Warning: No human input found for booking details.")
-        return {"messages": state["messages"] + [AIMessage(content="I couldn't understand your request. Please try again.")]}
+        logger.warning("No human input found in the conversation.")
+        return {"messages": [AIMessage(content="I couldn't understand your request. Please try again.")]}
 
-    data = dict(data)
+    reservation_id, data, choice_message = resolve_inquiry(state, reservation_id, current_user_input_content)
+    if choice_message:
+        send_message(state["sender_id"], choice_message)
+        return {"messages": [AIMessage(content=json.dumps({"message": choice_message}))]}
 
-    print("data=======",data,reservation_id)
-    
-    inquire_response_prompt = prompt.inquire_response_prompt(reservation_id, data)
-    formatted_messages = [inquire_response_prompt]+state["messages"]+[HumanMessage(content=f"User input: {current_user_input_content}")]
-    response = llm.invoke(formatted_messages)
-    print(f"LLM Raw Response from book node: {response.content}")
-    try:
-        raw_json_string = response.content
-        start_index = raw_json_string.find('{')
-        end_index = raw_json_string.rfind('}') + 1
-        
-        if start_index != -1 and end_index != 0 and start_index < end_index:
-            json_substring = raw_json_string[start_index:end_index]
-            booking_data_output = json.loads(json_substring)
-            print(booking_data_output.get("message"))
-            send_message(state["sender_id"], booking_data_output.get("message"))
-            return {
-                "messages": [response]
-            }
-        else:
-            print(f"Warning: No valid JSON object found in LLM response for booking: {raw_json_string}")
-            return {"messages": state["messages"] + [AIMessage(content="I had trouble understanding your booking details. Could you please rephrase?")]}
+    logger.debug("Booking %s: %s", reservation_id, data, extra=SAMPLED)
+
+    if not (inquire_renderer.INQUIRE_LLM_FALLBACK and inquire_renderer.is_free_form(current_user_input_content)):
+        message, kind = inquire_renderer.render(reservation_id, data, current_user_input_content)
+        logger.debug("Templated inquiry reply (%s): %s", kind, message, extra=SAMPLED)
+        send_message(state["sender_id"], message)
+        return {"messages": [AIMessage(content=json.dumps({"message": message}))], "current_reservation_id": reservation_id}
 
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from LLM in book node: {e}\nProblematic content: {response.content}")
-        return {"messages": state["messages"] + [AIMessage(content="I encountered an error processing your booking details. Please try again.")]}
+    inquire_response_prompt = prompt.inquire_response_prompt(reservation_id, data)
+    formatted_messages = inquire_response_prompt+context_policy.window(state, "inquire")+[HumanMessage(content=f"User input: {current_user_input_content}")]
+    streamer = reply_streamer(state)
+    booking_data_output, response = invoke_structured("inquire", formatted_messages, on_partial=streamer)
+    logger.debug("LLM raw response from inquire node: %s", response.content, extra=SAMPLED)
+    if booking_data_output is None:
+        return unparsed_reply(state, streamer=streamer)
+
+    logger.debug("Reply: %s", booking_data_output.get("message"), extra=SAMPLED)
+    deliver_reply(state, streamer, booking_data_output.get("message"))
+    return {
+        "messages": [response],
+        "current_reservation_id": reservation_id,
+    }
+
+def opening_turn(state):
+    """True when the guest's latest message is the first in the conversation and nothing was summarised."""
+    if state.get("context_summary"):
+        return False
+    humans = [index for index, message in enumerate(state["messages"]) if isinstance(message, HumanMessage)]
+    return humans == [0]
 
 def qa(state: State):
-    print("\n--- Entering qa node ---")
+    logger.debug("Entering qa node")
     qa_response_prompt = prompt.qa_response_prompt
     current_user_input_content = ""
     for msg in reversed(state["messages"]):
@@ -245,45 +458,178 @@ def qa(state: State):
             current_user_input_content = msg.content
             break
     if not current_user_input_content:
-        print("Warning: No human input found for booking details.")
-        return {"messages": state["messages"] + [AIMessage(content="I couldn't understand your request. Please try again.")]}
-    formatted_messages = [qa_response_prompt]+state["messages"]+[HumanMessage(content=f"User input: {current_user_input_content}")]
-    response = llm.invoke(formatted_messages)
-    print(f"LLM Raw Response from book node: {response.content}")
-    try:
-        raw_json_string = response.content
-        start_index = raw_json_string.find('{')
-        end_index = raw_json_string.rfind('}') + 1
-        
-        if start_index != -1 and end_index != 0 and start_index < end_index:
-            json_substring = raw_json_string[start_index:end_index]
-            booking_data_output = json.loads(json_substring)
-            print(booking_data_output.get("message"))
-            send_message(state["sender_id"], booking_data_output.get("message"))
-            return {
-                "messages": [response]
-            }
-        else:
-            print(f"Warning: No valid JSON object found in LLM response for booking: {raw_json_string}")
-            return {"messages": state["messages"] + [AIMessage(content="I had trouble understanding your booking details. Could you please rephrase?")]}
+        logger.warning("No human input found in the conversation.")
+        return {"messages": [AIMessage(content="I couldn't understand your request. Please try again.")]}
+
+    fingerprint = prompt_fingerprint(qa_response_prompt)
+    # Answers to later turns depend on the conversation, not just the question.
+    use_cache = QA_CACHE_ENABLED and opening_turn(state)
+    if use_cache:
+        cached_answer = qa_cache.get(current_user_input_content, fingerprint)
+        if cached_answer is not None:
+            logger.debug("QA cache hit: %s", cached_answer, extra=SAMPLED)
+            send_message(state["sender_id"], cached_answer)
+            return {"messages": [AIMessage(content=json.dumps({"message": cached_answer}))]}
+
+    formatted_messages = [qa_response_prompt]+context_policy.window(state, "qa")+[HumanMessage(content=f"User input: {current_user_input_content}")]
+    streamer = reply_streamer(state)
+    started = time.perf_counter()
+    booking_data_output, response = invoke_structured("qa", formatted_messages, on_partial=streamer)
+    logger.debug("LLM raw response from qa node: %s", response.content, extra=SAMPLED)
+    if booking_data_output is None:
+        return unparsed_reply(state, streamer=streamer)
+
+    logger.debug("Reply: %s", booking_data_output.get("message"), extra=SAMPLED)
+    deliver_reply(state, streamer, booking_data_output.get("message"))
+    if use_cache:
+        qa_cache.put(current_user_input_content, booking_data_output.get("message"), fingerprint, time.perf_counter() - started)
+    return {
+        "messages": [response]
+    }
+
+def combined(state: State):
+    logger.debug("Entering combined node")
+    current_user_input_content = ""
+    if state["messages"] and isinstance(state["messages"][-1], HumanMessage):
+        current_user_input_content = state["messages"][-1].content
 
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from LLM in book node: {e}\nProblematic content: {response.content}")
-        return {"messages": state["messages"] + [AIMessage(content="I encountered an error processing your booking details. Please try again.")]}
+    reservation_id = state.get("current_reservation_id")
+    data = get_store().get(reservation_id) or {}
+    system_messages = prompt.combined_prompt(current_date_for_llm, state.get("booking_in_progress", "FALSE"), reservation_id, data)
+    formatted_messages = system_messages+context_policy.window(state, "combined")+[HumanMessage(content=f"User input: {current_user_input_content}")]
+    booking_priority = PRIORITY_BOOKING if state.get("booking_in_progress") == "TRUE" else None
+    payload, response = invoke_structured("combined", formatted_messages, mode="combined", priority=booking_priority)
+    logger.debug("LLM raw response from combined node: %s", response.content, extra=SAMPLED)
+    if payload is None:
+        payload = {"message": "I had trouble understanding your request. Could you please rephrase?"}
+    determined_intent = payload.get("intent", "QA")
+
+    new_reservation_id = payload.get("reservation_id")
+    result = routed(response, determined_intent, new_reservation_id if determined_intent != "BOOK" else None)
+    result["payload"] = payload
+    return result
+
+def apply_book(state: State):
+    booking_in_progress = "TRUE"
+    logger.debug("Entering apply_book node")
+    payload = state.get("payload") or {}
+    reservation_id = get_reservation_ids().next_id()
+    booking_data = payload.get("booking_data") or {}
+    row = {field: booking_data.get(field) for field in BOOKING_FIELDS}
+    row["status"] = "not_confirmed"
+    message = (payload.get("message") or "").replace(prompt.NEW_RESERVATION_ID_PLACEHOLDER, reservation_id)
+    send_message(state["sender_id"], message)
+    get_store().upsert(reservation_id, row)
+    return {"booking_in_progress": booking_in_progress, "current_reservation_id": reservation_id, "own_reservation_ids": [reservation_id]}
+
+def apply_update(state: State):
+    booking_in_progress = "TRUE"
+    logger.debug("Entering apply_update node")
+    payload = state.get("payload") or {}
+    reservation_id = state.get("current_reservation_id")
+    data = get_store().get(reservation_id) or {}
+    if data == {}:
+        send_message(state["sender_id"], "Please provide a valid reservation_id or initialize a new booking.")
+        return {"booking_in_progress": booking_in_progress, "pending_cancellation": None}
+    if data["status"] == "cancelled":
+        booking_in_progress = "FALSE"
+        send_message(state["sender_id"], "Updation is not possible as this booking is cancelled. Please start a new booking.")
+        return {"booking_in_progress": booking_in_progress, "pending_cancellation": None}
+
+    changes = payload.get("booking_data") or {}
+    merged = dict(data)
+    merged.update({field: value for field, value in changes.items() if field in BOOKING_FIELDS and value not in (None, "null")})
+    message = payload.get("message")
+    update_init = payload.get("update_init") == 1
+    if update_init and merged.get("status") == "confirmed":
+        unavailable = hold_room(reservation_id, merged)
+        if unavailable:
+            message = unavailable
+            if data.get("status") == "confirmed":
+                update_init = 0
+            merged["status"] = data.get("status")
+    pending, cancel_message = cancellation_step(state, reservation_id, merged, update_init)
+    message = cancel_message or message
+    send_message(state["sender_id"], message)
+    if update_init and merged.get("status") == "confirmed":
+        logger.info("Queueing booking confirmation SMS for %s", reservation_id)
+        queue_sms(merged.get("phone_number"), message, dedup_key=f"{reservation_id}:confirmed")
+    if update_init and merged.get("status") == "cancelled" and not pending:
+        cancel_booking(reservation_id, data)
+        booking_in_progress = "FALSE"
+    if update_init and merged.get("status") != "cancelled":
+        get_store().upsert(reservation_id, merged)
+    return {"booking_in_progress": booking_in_progress, "pending_cancellation": pending}
+
+def apply_inquire(state: State):
+    logger.debug("Entering apply_inquire node")
+    reservation_id = state.get("current_reservation_id")
+    question = ""
+    for msg in reversed(state["messages"]):
+        if isinstance(msg, HumanMessage):
+            question = msg.content
+            break
+    if inquire_renderer.INQUIRE_LLM_FALLBACK and inquire_renderer.is_free_form(question):
+        # The combined call leaves inquiry replies to the system, and the
+        # templates can't answer this one.
+        return inquire(state)
+    reservation_id, data, message = resolve_inquiry(state, reservation_id, question)
+    if not message:
+        message, kind = inquire_renderer.render(reservation_id, data, question)
+    send_message(state["sender_id"], message)
+    return {"current_reservation_id": reservation_id} if reservation_id else {}
+
+def apply_qa(state: State):
+    logger.debug("Entering apply_qa node")
+    payload = state.get("payload") or {}
+    send_message(state["sender_id"], payload.get("message"))
+    return {}
 
 def select_intent(state: State):
-    print(f"Selecting next node based on intent: {state['intent']}")
+    logger.debug("Selecting next node based on intent: %s", state["intent"])
     return state["intent"]
 
-def build_graph():
+def add_history_compaction(builder, entry_node):
+    if context_policy.POLICY == "summary":
+        builder.add_node("compact_history", metrics.timed_node("compact_history", compact_history))
+        builder.set_entry_point("compact_history")
+        builder.add_edge("compact_history", entry_node)
+    else:
+        builder.set_entry_point(entry_node)
+
+def build_graph(mode=None):
+    mode = mode or GRAPH_MODE
     builder = StateGraph(State)
-    builder.add_node("chatBot", chatBot)
-    builder.add_node("book", book)
-    builder.add_node("update", update)
-    #builder.add_node("cancel", cancel)
-    builder.add_node("inquire", inquire)
-    builder.add_node("qa", qa)
-    builder.set_entry_point("chatBot")
+    if mode == "combined":
+        builder.add_node("combined", metrics.timed_node("combined", combined))
+        add_history_compaction(builder, "combined")
+        builder.add_node("apply_book", metrics.timed_node("apply_book", apply_book))
+        builder.add_node("apply_update", metrics.timed_node("apply_update", apply_update))
+        builder.add_node("apply_inquire", metrics.timed_node("apply_inquire", apply_inquire))
+        builder.add_node("apply_qa", metrics.timed_node("apply_qa", apply_qa))
+        builder.add_conditional_edges(
+            "combined",
+            select_intent,
+            {
+                "BOOK": "apply_book",
+                "UPDATE": "apply_update",
+                "INQUIRE": "apply_inquire",
+                "QA": "apply_qa"
+            }
+        )
+        for node in ("apply_book", "apply_update", "apply_inquire", "apply_qa"):
+            builder.add_edge(node, END)
+        return builder.compile(checkpointer=open_checkpointer())
+    elif mode != "two_hop":
+        raise ValueError(f"Unknown graph mode: {mode}")
+
+    builder.add_node("chatBot", metrics.timed_node("chatBot", chatBot))
+    add_history_compaction(builder, "chatBot")
+    builder.add_node("book", metrics.timed_node("book", book))
+    builder.add_node("update", metrics.timed_node("update", update))
+    #builder.add_node("cancel", metrics.timed_node("cancel", cancel))
+    builder.add_node("inquire", metrics.timed_node("inquire", inquire))
+    builder.add_node("qa", metrics.timed_node("qa", qa))
     builder.add_conditional_edges(
         "chatBot",
         select_intent,
@@ -298,5 +644,4 @@ def build_graph():
     builder.add_edge("update", END)
     builder.add_edge("inquire", END)
     builder.add_edge("qa", END)
-    memory_saver = MemorySaver()
-    return builder.compile(checkpointer=memory_saver)
+    return builder.compile(checkpointer=open_checkpointer())
@@ -0,0 +1,34 @@
+import logging
+import os
+import random
+from dotenv import load_dotenv
+load_dotenv()
+
+LOG_LEVEL = os.getenv("log_level", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("log_sample_rate", "0.05"))
+
+# Pass as extra= for bulky records (webhook bodies, raw LLM output) that
+# should only be kept for a sample of turns.
+SAMPLED = {"sampled": True}
+
+
+class SampleFilter(logging.Filter):
+    """Keeps records logged with extra=SAMPLED only `rate` of the time."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return not getattr(record, "sampled", False) or random.random() < self.rate
+
+
+def setup_logging(level=None, sample_rate=None):
+    root = logging.getLogger()
+    if any(isinstance(f, SampleFilter) for handler in root.handlers for f in handler.filters):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"))
+    handler.addFilter(SampleFilter(LOG_SAMPLE_RATE if sample_rate is None else sample_rate))
+    root.addHandler(handler)
+    root.setLevel(level or LOG_LEVEL)
@@ -0,0 +1,379 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    record = inc
+
+    def series(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total, value):
+        return value if total is None else total + value
+
+    def samples(self, series=None):
+        items = sorted((self.series() if series is None else series).items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    record = observe
+
+    def counts(self):
+        """Observation count per label tuple."""
+        with self._lock:
+            return {key: series["count"] for key, series in self._series.items()}
+
+    def series(self):
+        with self._lock:
+            return {key: {"counts": list(series["counts"]), "sum": series["sum"], "count": series["count"]}
+                    for key, series in self._series.items()}
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return value
+        return {"counts": [a + b for a, b in zip(total["counts"], value["counts"])],
+                "sum": total["sum"] + value["sum"], "count": total["count"] + value["count"]}
+
+    def samples(self, series=None):
+        items = sorted((self.series() if series is None else series).items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': _format_value(bound)})} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series['sum'])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}"
+
+
+class Gauge:
+    """Value read from `fn()` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def series(self):
+        try:
+            return {(): self.fn()}
+        except Exception as e:
+            logger.warning("Could not read gauge %s: %s", self.name, e)
+            return {}
+
+    merge = staticmethod(Counter.merge)
+
+    def samples(self, series=None):
+        for value in (self.series() if series is None else series).values():
+            yield f"{self.name} {_format_value(value)}"
+
+
+class Registry:
+    """Metrics of this process in the Prometheus text exposition format.
+
+    After `share`, `render` shows the metrics of every process sharing the file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._shared = None
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, fn):
+        with self._lock:
+            self._metrics[name] = Gauge(name, help, fn)
+            return self._metrics[name]
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def share(self, path, interval=5.0):
+        """Publish this process's series to the SQLite file `path` and render the sum over all its processes."""
+        self._shared = SharedMetrics(self, path, interval).start()
+        return self._shared
+
+    def render(self):
+        merged = self._shared.collect() if self._shared is not None else None
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(None if merged is None else merged.get(metric.name, {})))
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMetrics:
+    """Series of several processes (gunicorn workers) added up through one SQLite file.
+
+    Each process writes its registry's series to its own row every
+    `interval` seconds and whenever it renders, so the sum can lag the other
+    workers by up to `interval`. Counters and histograms of exited workers
+    are kept, so totals don't drop when a worker is restarted; gauges only
+    count processes that are still running. The file should be removed when
+    the whole server starts (serve.py does), as counters start again at zero.
+    """
+
+    def __init__(self, registry, path, interval=5.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.pid = os.getpid()
+        self.worker = f"{self.pid}-{time.time()}"
+        self._local = threading.local()
+        self._conn().execute("CREATE TABLE IF NOT EXISTS metric_series (worker TEXT PRIMARY KEY, pid INTEGER NOT NULL, "
+                             "updated_at REAL NOT NULL, series TEXT NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # Every worker opens the file as it starts; switching a new file
+            # to WAL fails at once, without the busy timeout, while another
+            # process holds it.
+            for attempt in range(50):
+                try:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    break
+                except sqlite3.OperationalError:
+                    if attempt == 49:
+                        raise
+                    time.sleep(0.1)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        threading.Thread(target=self._run, name="metrics-publisher", daemon=True).start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.publish()
+            except Exception as e:
+                logger.warning("Could not publish metrics: %s", e)
+
+    def publish(self):
+        series = {metric.name: [[list(key), value] for key, value in metric.series().items()] for metric in self.registry.metrics()}
+        self._conn().execute("INSERT OR REPLACE INTO metric_series (worker, pid, updated_at, series) VALUES (?, ?, ?, ?)",
+                             (self.worker, self.pid, time.time(), json.dumps(series)))
+
+    def collect(self):
+        """{metric name: {label values: value}} summed over the processes."""
+        self.publish()
+        rows = self._conn().execute("SELECT pid, series FROM metric_series ORDER BY updated_at DESC").fetchall()
+        metrics = {metric.name: metric for metric in self.registry.metrics()}
+        merged = {}
+        seen_pids = set()
+        for pid, series in rows:
+            # A reused pid belongs to the newest row only.
+            live = pid not in seen_pids and _alive(pid)
+            seen_pids.add(pid)
+            for name, items in json.loads(series).items():
+                metric = metrics.get(name)
+                if metric is None or (metric.kind == "gauge" and not live):
+                    continue
+                totals = merged.setdefault(name, {})
+                for key, value in items:
+                    totals[tuple(key)] = metric.merge(totals.get(tuple(key)), value)
+        return merged
+
+
+registry = Registry()
+
+TURN_SECONDS = registry.histogram("hotel_turn_seconds", "Time to run the graph for one guest turn.", ["mode", "intent"])
+NODE_SECONDS = registry.histogram("hotel_node_seconds", "Time spent in each graph node.", ["node", "intent"])
+LLM_SECONDS = registry.histogram("hotel_llm_seconds", "LLM call latency.", ["node", "intent"])
+LLM_PROMPT_TOKENS = registry.histogram("hotel_llm_prompt_tokens", "Prompt tokens per LLM call.", ["node", "intent"], TOKEN_BUCKETS)
+LLM_TOKENS = registry.counter("hotel_llm_tokens_total", "LLM tokens used.", ["node", "intent", "kind"])
+LLM_PROMPT_BYTES = registry.counter("hotel_llm_prompt_bytes_total", "Prompt bytes, sent inline or served from a provider-side cache.", ["node", "intent", "kind"])
+PARSE_RESULTS = registry.counter("hotel_structured_output_total", "Structured output parse outcomes.", ["node", "intent", "outcome"])
+OUTBOUND_SECONDS = registry.histogram("hotel_outbound_seconds", "Time spent calling Instagram and SMS, retries included.", ["target", "intent"])
+OUTBOUND_ERRORS = registry.counter("hotel_outbound_errors_total", "Outbound calls that raised.", ["target"])
+
+
+class Trace:
+    """Observations made during one graph run, labelled with its intent when the run ends."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.intent = "unknown"
+        self.nodes = []
+        self.observations = []
+
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+def _record(metric, value, **labels):
+    trace = _current.get()
+    if trace is None:
+        metric.record(value, intent="none", **labels)
+    else:
+        trace.observations.append((metric, value, labels))
+
+
+@contextmanager
+def turn(mode):
+    """Trace one graph run; nodes, LLM calls and sends made inside it share its intent label."""
+    trace = Trace(mode)
+    token = _current.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        seconds = time.perf_counter() - started
+        _current.reset(token)
+        for metric, value, labels in trace.observations:
+            metric.record(value, intent=trace.intent, **labels)
+        TURN_SECONDS.observe(seconds, mode=mode, intent=trace.intent)
+        logger.info(
+            "turn mode=%s intent=%s seconds=%.3f nodes=%s", mode, trace.intent, seconds,
+            ",".join(f"{node}:{node_seconds:.3f}" for node, node_seconds in trace.nodes),
+        )
+
+
+def set_intent(intent):
+    trace = _current.get()
+    if trace is not None and intent:
+        trace.intent = intent
+
+
+def timed_node(name, fn):
+    """Wrap a graph node so its run time is recorded; nodes that return an intent set the trace's intent."""
+    def node(state):
+        started = time.perf_counter()
+        result = fn(state)
+        seconds = time.perf_counter() - started
+        if isinstance(result, dict) and result.get("intent"):
+            set_intent(result["intent"])
+        trace = _current.get()
+        if trace is not None:
+            trace.nodes.append((name, seconds))
+        _record(NODE_SECONDS, seconds, node=name)
+        return result
+    node.__name__ = getattr(fn, "__name__", name)
+    return node
+
+
+def observe_llm(node, seconds, usage=None, prompt_bytes=0, sent_bytes=0):
+    usage = usage or {}
+    _record(LLM_SECONDS, seconds, node=node)
+    if usage:
+        _record(LLM_PROMPT_TOKENS, usage.get("input_tokens", 0), node=node)
+        _record(LLM_TOKENS, usage.get("input_tokens", 0), node=node, kind="prompt")
+        _record(LLM_TOKENS, usage.get("output_tokens", 0), node=node, kind="completion")
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        if cached:
+            _record(LLM_TOKENS, cached, node=node, kind="cached")
+    if prompt_bytes:
+        _record(LLM_PROMPT_BYTES, sent_bytes, node=node, kind="sent")
+        _record(LLM_PROMPT_BYTES, prompt_bytes - sent_bytes, node=node, kind="cached")
+
+
+def record_parse(node, outcome):
+    _record(PARSE_RESULTS, 1, node=node, outcome=outcome)
+
+
+@contextmanager
+def outbound(target):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        OUTBOUND_ERRORS.inc(target=target)
+        raise
+    finally:
+        _record(OUTBOUND_SECONDS, time.perf_counter() - started, target=target)
@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+import time
+from langchain_core.messages import HumanMessage, SystemMessage
+import prompt
+from qa_cache import prompt_fingerprint
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Every node prompt starts with one of these static prefixes (instructions,
+# schema, examples) and carries the per-turn context in a short second system
+# message, so the prefix is byte-identical across turns and guests.
+STATIC_PREFIXES = {
+    "chatBot": prompt.hotel_booking_flags_prompt,
+    "book": prompt.BOOKING_DETAILS_PREFIX,
+    "update": prompt.UPDATE_DETAILS_PREFIX,
+    "inquire": prompt.INQUIRE_RESPONSE_PREFIX,
+    "qa": prompt.qa_response_prompt,
+    "combined": prompt.COMBINED_PREFIX,
+}
+_fingerprints = {id(message): prompt_fingerprint(message) for message in STATIC_PREFIXES.values()}
+
+
+def prompt_bytes(messages):
+    return sum(len(str(message.content).encode()) for message in messages)
+
+
+class PromptCache:
+    """Sends prompts as built. Providers with implicit prefix caching (Gemini
+    2.x and later) still reuse the static prefix, since it always comes first."""
+
+    def prepare(self, messages):
+        """(messages, call kwargs) to send for `messages`."""
+        return messages, {}
+
+    def stats(self):
+        return {"backend": "local", "prefixes": len(STATIC_PREFIXES)}
+
+
+class GeminiPromptCache(PromptCache):
+    """Uploads static prefixes as Gemini cached contents and sends only the rest.
+
+    A prefix is uploaded the first time it is used and referenced by name
+    until a minute before its TTL runs out, then uploaded again. Each worker
+    process keeps its own caches. Prefixes the API refuses (e.g. shorter than
+    the model's caching minimum) are sent inline from then on.
+    """
+
+    def __init__(self, model, api_key, ttl_seconds=3600):
+        from google import genai
+        self.client = genai.Client(api_key=api_key)
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._names = {}
+        self._refused = set()
+        self.uploads = 0
+
+    def _cache_name(self, fingerprint, message):
+        with self._lock:
+            if fingerprint in self._refused:
+                return None
+            name, expires_at = self._names.get(fingerprint, (None, 0))
+            if name and time.time() < expires_at:
+                return name
+            from google.genai import types
+            try:
+                cache = self.client.caches.create(model=self.model, config=types.CreateCachedContentConfig(
+                    display_name=f"hotel-prompt-{fingerprint}",
+                    system_instruction=str(message.content),
+                    ttl=f"{self.ttl_seconds}s",
+                ))
+            except Exception as e:
+                logger.warning("Sending prompt prefix %s inline, Gemini would not cache it: %s", fingerprint, e)
+                self._refused.add(fingerprint)
+                return None
+            self.uploads += 1
+            self._names[fingerprint] = (cache.name, time.time() + self.ttl_seconds - 60)
+            logger.info("Cached prompt prefix %s as %s", fingerprint, cache.name)
+            return cache.name
+
+    def prepare(self, messages):
+        fingerprint = _fingerprints.get(id(messages[0])) if messages else None
+        name = fingerprint and self._cache_name(fingerprint, messages[0])
+        if not name:
+            return messages, {}
+        # A request that uses cached content may not set its own system
+        # instruction, so the per-turn context goes in as user content.
+        rest = [HumanMessage(content=message.content) if isinstance(message, SystemMessage) else message for message in messages[1:]]
+        return rest, {"cached_content": name}
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "gemini", "prefixes": len(STATIC_PREFIXES), "cached": len(self._names),
+                    "refused": len(self._refused), "uploads": self.uploads}
+
+
+def open_prompt_cache(model, api_key):
+    """Prompt cache named by the `prompt_cache` env var: "local" (default) or "gemini"."""
+    backend = os.getenv("prompt_cache", "local")
+    if backend == "gemini" and os.getenv("llm_backend", "gemini") == "gemini":
+        return GeminiPromptCache(model, api_key, ttl_seconds=int(os.getenv("prompt_cache_ttl_seconds", "3600")))
+    if backend not in ("local", "gemini"):
+        raise ValueError(f"Unknown prompt_cache: {backend}")
+    return PromptCache()
@@ -0,0 +1,196 @@
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from dotenv import load_dotenv
+load_dotenv()
+
+QA_CACHE_ENABLED = os.getenv("qa_cache", "1") == "1"
+
+STOP_WORDS = {
+    "a", "an", "the", "is", "are", "do", "does", "you", "your", "yours", "i", "me", "my", "we", "can", "could",
+    "would", "please", "pls", "there", "any", "have", "has", "to", "of", "for", "at", "on", "it", "what",
+    "whats", "hey", "hi", "hello", "u", "ur", "tell", "about", "know", "want", "like",
+}
+# Words that flip a question's meaning ("check in" / "check out", "is
+# breakfast not included"). They are never stop words, and a near-duplicate
+# match must have exactly the same ones.
+POLARITY_WORDS = {
+    "not", "no", "never", "without", "none", "cannot", "cant", "dont", "doesnt", "isnt", "arent", "wont",
+    "didnt", "wasnt", "in", "out", "before", "after",
+}
+PERSONAL = re.compile(r"\d|\bRES\w*|@", re.IGNORECASE)
+# Answers about the guest's own booking, or that address the guest by name
+# ("Great Rohit, ..." or "Rohit, ..."), are not reusable for other guests.
+BOOKING_DATA = re.compile(
+    r"\byour\s+(booking|reservation|room|stay|dates?|check-?in|check-?out|guests?|phone)\b|\breservation id\b", re.IGNORECASE
+)
+NAME_AFTER_WORD = re.compile(r"(?<=[a-z,]) ([A-Z][a-z]+)\b")
+LEADING_WORD = re.compile(r"(?:^|[.!?]\s+)([A-Z][a-z]+),")
+INTERJECTIONS = {"Yes", "No", "Sure", "Hello", "Hi", "Hey", "Great", "Thanks", "Absolutely", "Certainly",
+                 "Unfortunately", "Sorry", "Well", "Okay", "Ok", "Also", "However", "Currently", "Otherwise"}
+
+
+def content_words(text):
+    words = re.findall(r"[a-z]+", text.lower().replace("'", ""))
+    return [word for word in words if word not in STOP_WORDS], words
+
+
+def normalize(text):
+    content, words = content_words(text)
+    return " ".join(content or words)
+
+
+def polarity(normalized):
+    return frozenset(word for word in normalized.split() if word in POLARITY_WORDS)
+
+
+def cacheable_answer(answer):
+    """False for answers that carry digits, IDs, booking details or a name."""
+    if not answer or PERSONAL.search(answer) or BOOKING_DATA.search(answer):
+        return False
+    if NAME_AFTER_WORD.search(answer):
+        return False
+    return all(word in INTERJECTIONS for word in LEADING_WORD.findall(answer))
+
+
+def vectorize(normalized):
+    """Bag of words plus character trigrams, so typos and plurals still match."""
+    features = Counter(f"w:{word}" for word in normalized.split())
+    padded = f" {normalized} "
+    features.update(f"c:{padded[index:index + 3]}" for index in range(len(padded) - 2))
+    norm = math.sqrt(sum(count * count for count in features.values())) or 1.0
+    return {feature: count / norm for feature, count in features.items()}
+
+
+def cosine(left, right):
+    if len(left) > len(right):
+        left, right = right, left
+    return sum(weight * right.get(feature, 0.0) for feature, weight in left.items())
+
+
+def prompt_fingerprint(prompt_message):
+    return hashlib.sha256(str(prompt_message.content).encode()).hexdigest()[:16]
+
+
+class QACache:
+    """Near-duplicate cache for general QA answers.
+
+    Questions are normalised (lower-case, punctuation and filler words
+    removed) and matched exactly first, then by cosine similarity over word
+    and character-trigram vectors; candidates come from an inverted index
+    on words, so lookups do not scan the whole cache. Entries expire after
+    `ttl_seconds`, the least recently used are evicted beyond `max_entries`,
+    and everything is dropped when the QA prompt fingerprint changes.
+    Only questions with at least two content words and no digits,
+    reservation IDs or e-mail addresses are cached, and only answers that
+    pass cacheable_answer; callers also keep follow-up turns out, since
+    their answers depend on the conversation.
+    """
+
+    def __init__(self, ttl_seconds=24 * 3600, max_entries=1000, min_similarity=0.85):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._index = {}
+        self._fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._miss_seconds = 0.0
+        self._miss_count = 0
+
+    def cacheable(self, question):
+        return (bool(question) and not PERSONAL.search(question) and len(question) <= 300
+                and len(content_words(question)[0]) >= 2)
+
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._index.clear()
+            self._fingerprint = fingerprint
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for word in key.split():
+            keys = self._index.get(word)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[word]
+
+    def get(self, question, fingerprint):
+        if not self.cacheable(question):
+            return None
+        key = normalize(question)
+        now = time.time()
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            entry = self._entries.get(key)
+            if entry is None:
+                vector = vectorize(key)
+                candidates = set()
+                for word in key.split():
+                    candidates |= self._index.get(word, set())
+                best_score = 0.0
+                for candidate in [candidate for candidate in candidates if polarity(candidate) == polarity(key)]:
+                    score = cosine(vector, self._entries[candidate]["vector"])
+                    if score > best_score:
+                        best_score, key = score, candidate
+                entry = self._entries.get(key) if best_score >= self.min_similarity else None
+            if entry is not None and now - entry["stored_at"] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["answer"]
+
+    def put(self, question, answer, fingerprint, llm_seconds=None):
+        if llm_seconds is not None:
+            with self._lock:
+                self._miss_seconds += llm_seconds
+                self._miss_count += 1
+        if not cacheable_answer(answer) or not self.cacheable(question):
+            return
+        key = normalize(question)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._remove(key)
+            self._entries[key] = {"answer": answer, "vector": vectorize(key), "stored_at": time.time()}
+            for word in key.split():
+                self._index.setdefault(word, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            mean_miss = self._miss_seconds / self._miss_count if self._miss_count else 0.0
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "mean_llm_seconds": round(mean_miss, 4),
+                "latency_saved_seconds": round(self.hits * mean_miss, 3),
+            }
+
+
+qa_cache = QACache(
+    ttl_seconds=float(os.getenv("qa_cache_ttl_seconds", str(24 * 3600))),
+    max_entries=int(os.getenv("qa_cache_max_entries", "1000")),
+    min_similarity=float(os.getenv("qa_cache_min_similarity", "0.85")),
+)
@@ -0,0 +1,62 @@
+import logging
+import os
+import threading
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REPLY_STREAMING = os.getenv("reply_streaming", "1") == "1"
+
+
+class ReplyStreamer:
+    """Gets the guest's reply out while the LLM is still generating.
+
+    `start` fires a typing indicator in the background as soon as the call
+    is issued. Used as the `on_partial` callback of
+    structured_output.collect, it sends the `message` field as soon as that
+    JSON string closes, without waiting for the rest of the object
+    (booking data, flags) to be generated. With `early=False` only the
+    typing indicator is streamed and the reply waits for `deliver`.
+    """
+
+    def __init__(self, sender_id, send_message, send_action, field="message", early=True):
+        self.sender_id = sender_id
+        self.send_message = send_message
+        self.send_action = send_action
+        self.field = field
+        self.early = early
+        self.sent = None
+        self.started_at = None
+        self.first_feedback_seconds = None
+        self.reply_seconds = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        threading.Thread(target=self._typing, daemon=True).start()
+        return self
+
+    def _typing(self):
+        try:
+            self.send_action(self.sender_id, "typing_on")
+            if self.first_feedback_seconds is None:
+                self.first_feedback_seconds = time.perf_counter() - self.started_at
+        except Exception as e:
+            logger.warning("Could not send typing indicator: %s", e)
+
+    def __call__(self, parser):
+        if self.sent is not None or not self.early:
+            return
+        value, closed = parser.string_field(self.field)
+        if closed and value:
+            self.send_message(self.sender_id, value)
+            self.sent = value
+            self.reply_seconds = time.perf_counter() - self.started_at
+
+    def deliver(self, message):
+        """Send `message` unless the streamed reply already went out."""
+        if self.sent is None and message:
+            self.send_message(self.sender_id, message)
+            self.sent = message
+            self.reply_seconds = time.perf_counter() - self.started_at
@@ -0,0 +1,90 @@
+"""Production entry point: the webhook app in several gunicorn worker processes.
+
+    python serve.py
+
+Workers share state only through local files in the working directory:
+bookings, checkpoints, reservation ID sequences, room inventory and the SMS
+outbox are SQLite databases in WAL mode, and conversations are serialised
+across processes with flock (dispatcher.SenderLocks). A guest's messages can
+reach different workers, so they are queued in a shared SQLite inbox
+(dispatcher.SenderInbox): whichever worker runs the sender's next turn takes
+all of them in arrival order, and messages a dead worker never handled are
+picked up by another one after `inbox_recover_seconds` (default 60).
+/metrics adds up the metrics of all workers, which each publish theirs to
+`metrics_db` (default metrics.db, emptied at start) every
+`metrics_publish_seconds` (default 5). The LLM quota (llm_requests_per_minute,
+llm_tokens_per_minute) is drawn from buckets shared through `llm_limits_db`
+(default llm_limits.db), and llm_max_concurrency is split over the workers.
+Settings:
+
+    web_bind       address to listen on (default 0.0.0.0:5000)
+    web_workers    worker processes (default: number of CPUs)
+    web_threads    request threads per worker (default 4)
+    web_timeout    seconds before a stuck worker is restarted (default 30)
+"""
+import multiprocessing
+import os
+import sys
+from gunicorn.app.base import BaseApplication
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def shared_state_problems(workers):
+    """Settings that keep state inside one process and so break with several workers."""
+    problems = []
+    if workers > 1:
+        if os.getenv("checkpointer", "sqlite:checkpoints.db") == "memory":
+            problems.append("checkpointer=memory keeps conversations in one process; use sqlite:<path>")
+        if os.getenv("booking_store", "sqlite:bookings.db").startswith("log:"):
+            problems.append("the log booking store indexes bookings in one process; use sqlite:<path>")
+    return problems
+
+
+def post_fork(server, worker):
+    import app
+    app.warm_up()
+
+
+class Server(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        return app
+
+
+def options():
+    return {
+        "bind": os.getenv("web_bind", "0.0.0.0:5000"),
+        "workers": int(os.getenv("web_workers", str(multiprocessing.cpu_count()))),
+        "worker_class": "gthread",
+        "threads": int(os.getenv("web_threads", "4")),
+        "timeout": int(os.getenv("web_timeout", "30")),
+        "post_fork": post_fork,
+        "accesslog": "-",
+    }
+
+
+if __name__ == "__main__":
+    config = options()
+    problems = shared_state_problems(config["workers"])
+    if problems:
+        print("Cannot run several workers with this configuration:\n  " + "\n  ".join(problems))
+        sys.exit(1)
+    os.environ.setdefault("sender_lock_dir", "locks")
+    os.environ.setdefault("sender_inbox", "sender_inbox.db")
+    os.environ.setdefault("metrics_db", "metrics.db")
+    os.environ.setdefault("llm_limits_db", "llm_limits.db")
+    os.environ["llm_processes"] = str(config["workers"])
+    # Counters start again at zero with the new workers.
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(os.environ["metrics_db"] + suffix):
+            os.remove(os.environ["metrics_db"] + suffix)
+    Server(config).run()
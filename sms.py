@@ -1,16 +1,223 @@
-from twilio.rest import Client
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import metrics
+from booking_store import normalize_phone
 from dotenv import load_dotenv
 load_dotenv()
-import os
+
+logger = logging.getLogger(__name__)
 
 account_sid = os.getenv('account_sid')
 auth_token = os.getenv('auth_token')
-client = Client(account_sid, auth_token)
+
+SMS_SKIPPED = metrics.registry.counter("hotel_sms_skipped_total", "SMS not queued because the phone number was missing or invalid.", [])
+
+
+class TwilioTransport:
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from twilio.rest import Client
+                self._client = Client(account_sid, auth_token)
+            return self._client
+
+    def send(self, to, body):
+        message = self.client().messages.create(
+            from_=os.getenv('phone_number'),
+            body=body,
+            to='+91'+str(to)
+        )
+        return message.sid
+
+
+class FakeTransport:
+    """Offline transport: records messages, optionally failing the first `fail_first` sends."""
+
+    def __init__(self, fail_first=0):
+        self.fail_first = fail_first
+        self.sent = []
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        with self._lock:
+            self.attempts += 1
+            if self.attempts <= self.fail_first:
+                raise RuntimeError("fake transport failure")
+            self.sent.append((to, body))
+            return f"SMfake{len(self.sent)}"
+
+
+class SmsOutbox:
+    """Durable SMS outbox on SQLite with a background sender.
+
+    `enqueue` only writes a row, so callers never wait on Twilio. Rows share
+    a `dedup_key` (e.g. one confirmation per reservation) and are stored
+    once. The sender thread picks up due rows in batches, sends at most
+    `rate_per_second`, and retries failures with jittered backoff until
+    `max_attempts` is reached. Rows are claimed atomically with a lease, so
+    several processes can share one outbox file and rows held by a crashed
+    sender are picked up again once the lease runs out.
+    """
+
+    def __init__(self, path="sms_outbox.db", transport=None, rate_per_second=1.0, batch_size=10,
+                 max_attempts=5, poll_interval=1.0, lease_seconds=300):
+        self.path = path
+        self.transport = transport or TwilioTransport()
+        self.rate_per_second = rate_per_second
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                dedup_key TEXT UNIQUE,
+                to_number TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL,
+                sid TEXT
+            );
+            CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, to, body, dedup_key=None):
+        """Queue an SMS; returns False if `dedup_key` was already queued or `to` is not a phone number.
+
+        A missing or malformed number is logged here once instead of being
+        retried by the sender until max_attempts.
+        """
+        number = normalize_phone(to)
+        if not number or not 10 <= len(number) <= 15:
+            logger.warning("Not queueing SMS %s: invalid phone number %r", dedup_key or "", to)
+            SMS_SKIPPED.inc()
+            return False
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT OR IGNORE INTO outbox (dedup_key, to_number, body, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+            (dedup_key, number, body, now, now),
+        )
+        self._wake.set()
+        return cursor.rowcount == 1
+
+    def _claim(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, to_number, body, attempts FROM outbox WHERE status IN ('pending', 'sending') AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (time.time(), self.batch_size),
+            ).fetchall()
+            lease_until = time.time() + self.lease_seconds
+            conn.executemany("UPDATE outbox SET status = 'sending', next_attempt_at = ? WHERE id = ?", [(lease_until, row[0]) for row in rows])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def send_due(self):
+        """Send one batch of due messages; returns how many were attempted."""
+        rows = self._claim()
+        conn = self._conn()
+        for index, (row_id, to, body, attempts) in enumerate(rows):
+            if index and self.rate_per_second > 0:
+                time.sleep(1.0 / self.rate_per_second)
+            try:
+                with metrics.outbound("sms"):
+                    sid = self.transport.send(to, body)
+            except Exception as e:
+                attempts += 1
+                status = "failed" if attempts >= self.max_attempts else "pending"
+                delay = random.uniform(0.5, 1.0) * min(300, 2 ** attempts)
+                logger.warning("SMS to %s failed (attempt %s): %s", to, attempts, e)
+                conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (status, attempts, time.time() + delay, str(e), row_id),
+                )
+            else:
+                conn.execute(
+                    "UPDATE outbox SET status = 'sent', attempts = ?, sent_at = ?, sid = ? WHERE id = ?",
+                    (attempts + 1, time.time(), sid, row_id),
+                )
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.send_due():
+                    continue
+            except Exception as e:
+                logger.exception("SMS outbox sender error: %s", e)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="sms-outbox", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = SmsOutbox(
+                os.getenv("sms_outbox_db", "sms_outbox.db"),
+                rate_per_second=float(os.getenv("sms_rate_per_second", "1")),
+                max_attempts=int(os.getenv("sms_max_attempts", "5")),
+            )
+            _outbox.start()
+        return _outbox
+
+
+def queue_sms(to, body, dedup_key=None):
+    return get_outbox().enqueue(to, body, dedup_key)
+
 
 def send_sms(to, body):
-    message = client.messages.create(
-        from_=os.getenv('phone_number'),
-        body=body,
-        to='+91'+to
-    )
-    return message.sid
\ No newline at end of file
+    return TwilioTransport().send(to, body)
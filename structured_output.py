@@ -0,0 +1,351 @@
+import json
+import logging
+import re
+import threading
+from typing import Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+from langchain_core.messages import AIMessage, HumanMessage
+import prompt
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _null_to_none(value):
+    if isinstance(value, str) and value.strip().lower() in ("", "null", "none", "nan"):
+        return None
+    return value
+
+
+class LenientModel(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+
+class BookingData(LenientModel):
+    guest_name: Optional[str] = None
+    check_in_date: Optional[str] = None
+    check_out_date: Optional[str] = None
+    num_guests: Optional[int] = None
+    phone_number: Optional[str] = None
+    room_type: Optional[str] = None
+    status: Optional[str] = None
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def nulls(cls, value):
+        return _null_to_none(value)
+
+    @field_validator("num_guests", mode="before")
+    @classmethod
+    def guests(cls, value):
+        if value is None:
+            return None
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return None
+
+    @field_validator("phone_number", mode="before")
+    @classmethod
+    def phone(cls, value):
+        if isinstance(value, float):
+            value = int(value)
+        return None if value is None else str(value)
+
+
+class NewBookingData(BookingData):
+    reservation_id: Optional[str] = None
+
+
+class BookingFlags(LenientModel):
+    """JSON_HOTEL_BOOKING_FLAGS_SCHEMA"""
+    reservation_id: Optional[str] = None
+    intent: Literal["BOOK", "UPDATE", "INQUIRE", "QA"]
+
+    @field_validator("reservation_id", mode="before")
+    @classmethod
+    def nulls(cls, value):
+        return _null_to_none(value)
+
+    @field_validator("intent", mode="before")
+    @classmethod
+    def upper(cls, value):
+        return value.strip().upper() if isinstance(value, str) else value
+
+
+class NewBookingDetails(LenientModel):
+    """JSON_NEW_BOOKING_DETAILS_SCHEMA"""
+    message: str
+    booking_data: NewBookingData = Field(default_factory=NewBookingData)
+
+
+class UpdateDetails(LenientModel):
+    """JSON_UPDATE_DETAILS_SCHEMA"""
+    message: str
+    reservation_id: Optional[str] = None
+    data: BookingData = Field(default_factory=BookingData)
+    update_init: int = 0
+
+    @field_validator("reservation_id", mode="before")
+    @classmethod
+    def nulls(cls, value):
+        return _null_to_none(value)
+
+    @field_validator("update_init", mode="before")
+    @classmethod
+    def flag(cls, value):
+        return 1 if str(value).strip().lower() in ("1", "true") else 0
+
+
+class MessageResponse(LenientModel):
+    """JSON_INQUIRE_RESPONSE_SCHEMA / JSON_QA_RESPONSE_SCHEMA"""
+    message: str
+
+
+class CombinedResponse(UpdateDetails):
+    """JSON_COMBINED_SCHEMA"""
+    intent: Literal["BOOK", "UPDATE", "INQUIRE", "QA"]
+    message: str = ""
+    booking_data: BookingData = Field(default_factory=BookingData)
+    data: Optional[BookingData] = None
+
+    @field_validator("intent", mode="before")
+    @classmethod
+    def upper(cls, value):
+        return value.strip().upper() if isinstance(value, str) else value
+
+
+NODE_SCHEMAS = {
+    "chatBot": (BookingFlags, prompt.JSON_HOTEL_BOOKING_FLAGS_SCHEMA),
+    "book": (NewBookingDetails, prompt.JSON_NEW_BOOKING_DETAILS_SCHEMA),
+    "update": (UpdateDetails, prompt.JSON_UPDATE_DETAILS_SCHEMA),
+    "inquire": (MessageResponse, prompt.JSON_INQUIRE_RESPONSE_SCHEMA),
+    "qa": (MessageResponse, prompt.JSON_QA_RESPONSE_SCHEMA),
+    "combined": (CombinedResponse, prompt.JSON_COMBINED_SCHEMA),
+}
+
+
+class IncrementalJsonParser:
+    """Tracks the first top-level JSON object in a growing token stream.
+
+    `feed` returns True as soon as the object's closing brace arrives, so
+    callers can stop reading even if the model keeps writing prose after it.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.start = -1
+        self.end = -1
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def complete(self):
+        return self.end != -1
+
+    def feed(self, chunk):
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text) and self.end == -1:
+            ch = text[self._pos]
+            if self.start == -1:
+                if ch == "{":
+                    self.start = self._pos
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = self._pos + 1
+            self._pos += 1
+        return self.complete
+
+    def object_text(self):
+        if self.start == -1:
+            return None
+        return self.text[self.start:self.end] if self.complete else self.text[self.start:]
+
+    def string_field(self, key):
+        """(decoded prefix, closed) for the string value of `key`, or (None, False) if it has not started."""
+        body = self.object_text()
+        if body is None:
+            return None, False
+        match = re.search(r'"%s"\s*:\s*"' % re.escape(key), body)
+        if not match:
+            return None, False
+        raw = []
+        escape = False
+        closed = False
+        for ch in body[match.end():]:
+            if escape:
+                raw.append(ch)
+                escape = False
+            elif ch == "\\":
+                raw.append(ch)
+                escape = True
+            elif ch == '"':
+                closed = True
+                break
+            else:
+                raw.append(ch)
+        if escape:
+            raw.pop()
+        raw = "".join(raw)
+        while raw:
+            try:
+                return json.loads(f'"{raw}"'), closed
+            except json.JSONDecodeError:
+                raw = raw[:-1]
+        return "", closed
+
+    def partial_string(self, key):
+        """Decoded prefix of the string value of `key`, or None if it has not started."""
+        return self.string_field(key)[0]
+
+
+def extract_object(text):
+    parser = IncrementalJsonParser()
+    parser.feed(text or "")
+    return parser.object_text()
+
+
+def repair_json(text):
+    """Best-effort fixes for the mistakes models make most: comments copied
+    from the schema, Python literals, trailing commas and truncated output."""
+    out = []
+    in_string = False
+    escape = False
+    depth = 0
+    index = 0
+    while index < len(text):
+        ch = text[index]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif text.startswith("//", index):
+            while index < len(text) and text[index] != "\n":
+                index += 1
+            continue
+        else:
+            if ch in "{[":
+                depth += 1
+            elif ch in "}]":
+                depth -= 1
+            out.append(ch)
+        index += 1
+    if in_string:
+        out.append('"')
+    repaired = "".join(out)
+    repaired = re.sub(r"\bNone\b", "null", repaired)
+    repaired = re.sub(r"\bTrue\b", "true", repaired)
+    repaired = re.sub(r"\bFalse\b", "false", repaired)
+    repaired = re.sub(r",\s*$", "", repaired)
+    repaired += "}" * max(depth, 0)
+    repaired = re.sub(r",(\s*[}\]])", r"\1", repaired)
+    return repaired
+
+
+def validate(node, text):
+    """Return (dict, None) on success or (None, error message)."""
+    model = NODE_SCHEMAS[node][0]
+    body = extract_object(text)
+    if body is None:
+        return None, "no JSON object found"
+    try:
+        return model.model_validate_json(body).model_dump(exclude_unset=True), None
+    except ValidationError as first_error:
+        try:
+            return model.model_validate_json(repair_json(body)).model_dump(exclude_unset=True), "repaired"
+        except ValidationError:
+            return None, str(first_error.errors()[0].get("msg", first_error))
+
+
+class ParseStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nodes = {}
+
+    def record(self, node, outcome):
+        with self._lock:
+            entry = self._nodes.setdefault(node, {"calls": 0, "ok": 0, "repaired": 0, "reasked": 0, "failed": 0})
+            entry["calls"] += 1
+            entry[outcome] += 1
+        metrics.record_parse(node, outcome)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                node: dict(entry, failure_rate=round(entry["failed"] / entry["calls"], 3), first_pass_rate=round(entry["ok"] / entry["calls"], 3))
+                for node, entry in self._nodes.items()
+            }
+
+
+parse_stats = ParseStats()
+
+
+def collect(chunks, on_partial=None):
+    """Consume a stream of message chunks until the JSON object is complete.
+
+    Returns the merged AIMessage. `on_partial(parser)` is called after every
+    chunk so callers can act on fields before generation finishes.
+    """
+    parser = IncrementalJsonParser()
+    merged = None
+    for chunk in chunks:
+        merged = chunk if merged is None else merged + chunk
+        if isinstance(chunk.content, str) and parser.feed(chunk.content):
+            if on_partial:
+                on_partial(parser)
+            break
+        if on_partial:
+            on_partial(parser)
+    if merged is None:
+        return AIMessage(content="")
+    return AIMessage(content=merged.content, usage_metadata=getattr(merged, "usage_metadata", None))
+
+
+def complete(node, formatted_messages, call, on_partial=None):
+    """Run `call(messages, on_partial) -> AIMessage`, validate against the node's schema,
+    and re-ask once in the same turn if the reply is unusable.
+
+    Returns (data dict or None, last AIMessage).
+    """
+    response = call(formatted_messages, on_partial)
+    data, error = validate(node, response.content)
+    if data is not None:
+        parse_stats.record(node, "repaired" if error == "repaired" else "ok")
+        return data, response
+    logger.info("Invalid structured output from %s (%s), asking again", node, error)
+    schema = NODE_SCHEMAS[node][1]
+    retry_messages = formatted_messages + [
+        response,
+        HumanMessage(content=f"Your previous reply could not be used ({error}). Reply again with ONLY a JSON object that follows this structure exactly:\n{schema}"),
+    ]
+    response = call(retry_messages, on_partial)
+    data, error = validate(node, response.content)
+    if data is not None:
+        parse_stats.record(node, "reasked")
+        return data, response
+    logger.warning("Invalid structured output from %s after re-ask (%s): %s", node, error, response.content)
+    parse_stats.record(node, "failed")
+    return None, response
@@ -0,0 +1,96 @@
+import threading
+from collections import deque
+
+
+def _p50(values):
+    ordered = sorted(values)
+    return round(ordered[len(ordered) // 2], 4) if ordered else 0.0
+
+
+class UsageStats:
+    """LLM calls, tokens and turn latency per graph mode ("two_hop" / "combined")."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._modes = {}
+        self._context = {}
+
+    def _mode(self, mode):
+        return self._modes.setdefault(mode, {
+            "turns": 0,
+            "llm_calls": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cached_tokens": 0,
+            "prompt_bytes": 0,
+            "sent_bytes": 0,
+            "nodes": {},
+            "llm_latencies": deque(maxlen=self._window),
+            "turn_latencies": deque(maxlen=self._window),
+        })
+
+    def record_call(self, mode, node, seconds, usage=None, prompt_bytes=0, sent_bytes=0):
+        """`sent_bytes` is the part of the `prompt_bytes` prompt not served from a provider-side cache."""
+        usage = usage or {}
+        with self._lock:
+            entry = self._mode(mode)
+            entry["llm_calls"] += 1
+            entry["input_tokens"] += usage.get("input_tokens", 0)
+            entry["output_tokens"] += usage.get("output_tokens", 0)
+            entry["cached_tokens"] += (usage.get("input_token_details") or {}).get("cache_read", 0)
+            entry["prompt_bytes"] += prompt_bytes
+            entry["sent_bytes"] += sent_bytes
+            entry["nodes"][node] = entry["nodes"].get(node, 0) + 1
+            entry["llm_latencies"].append(seconds)
+
+    def record_context(self, node, history_tokens, sent_tokens):
+        with self._lock:
+            entry = self._context.setdefault(node, {"calls": 0, "history_tokens": 0, "sent_tokens": 0, "last_sent_tokens": 0})
+            entry["calls"] += 1
+            entry["history_tokens"] += history_tokens
+            entry["sent_tokens"] += sent_tokens
+            entry["last_sent_tokens"] = sent_tokens
+
+    def record_turn(self, mode, seconds):
+        with self._lock:
+            entry = self._mode(mode)
+            entry["turns"] += 1
+            entry["turn_latencies"].append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for mode, entry in self._modes.items():
+                turns = entry["turns"] or 1
+                result[mode] = {
+                    "turns": entry["turns"],
+                    "llm_calls": entry["llm_calls"],
+                    "llm_calls_per_turn": round(entry["llm_calls"] / turns, 3),
+                    "input_tokens_per_turn": round(entry["input_tokens"] / turns, 1),
+                    "output_tokens_per_turn": round(entry["output_tokens"] / turns, 1),
+                    "cached_input_tokens_per_turn": round(entry["cached_tokens"] / turns, 1),
+                    "prompt_bytes_per_turn": round(entry["prompt_bytes"] / turns, 1),
+                    "sent_prompt_bytes_per_turn": round(entry["sent_bytes"] / turns, 1),
+                    "llm_p50_seconds": _p50(entry["llm_latencies"]),
+                    "turn_p50_seconds": _p50(entry["turn_latencies"]),
+                    "calls_by_node": dict(entry["nodes"]),
+                }
+            return result
+
+    def context_snapshot(self):
+        with self._lock:
+            result = {}
+            for node, entry in self._context.items():
+                calls = entry["calls"] or 1
+                result[node] = {
+                    "calls": entry["calls"],
+                    "history_tokens_per_call": round(entry["history_tokens"] / calls, 1),
+                    "sent_tokens_per_call": round(entry["sent_tokens"] / calls, 1),
+                    "last_sent_tokens": entry["last_sent_tokens"],
+                    "saved_share": round(1 - entry["sent_tokens"] / entry["history_tokens"], 3) if entry["history_tokens"] else 0.0,
+                }
+            return result
+
+
+usage_stats = UsageStats()
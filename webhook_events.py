@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def iter_messages(payload):
+    """Yield (sender_id, message_id, text) for every incoming message in a webhook body.
+
+    Covers every entry and every messaging item; echoes of our own messages
+    and non-message events (reads, reactions, postbacks) are skipped. Messages
+    without text (attachments, stickers) yield an empty string.
+    """
+    for entry in (payload or {}).get("entry") or []:
+        for event in entry.get("messaging") or []:
+            message = event.get("message")
+            sender_id = (event.get("sender") or {}).get("id")
+            if not message or not sender_id or message.get("is_echo") or message.get("is_deleted"):
+                continue
+            yield sender_id, message.get("mid"), message.get("text", "") or ""
+
+
+class MessageDeduper:
+    """Remembers message IDs for `window_seconds` so redelivered events are dropped.
+
+    Backed by SQLite so worker processes share one view: the first process
+    to insert a message ID wins. Rows older than the window are pruned every
+    `prune_every` messages, which keeps the table bounded.
+    """
+
+    def __init__(self, path="webhook_events.db", window_seconds=24 * 3600, prune_every=500):
+        self.path = path
+        self.window_seconds = window_seconds
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._count = 0
+        self.duplicates = 0
+        self._conn().execute("CREATE TABLE IF NOT EXISTS seen_messages (message_id TEXT PRIMARY KEY, seen_at REAL NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def seen(self, message_id):
+        """True if `message_id` was already processed within the window; records it otherwise."""
+        if not message_id:
+            return False
+        now = time.time()
+        conn = self._conn()
+        inserted = conn.execute(
+            "INSERT INTO seen_messages (message_id, seen_at) VALUES (?, ?) "
+            "ON CONFLICT(message_id) DO UPDATE SET seen_at = excluded.seen_at WHERE seen_messages.seen_at < ?",
+            (message_id, now, now - self.window_seconds),
+        ).rowcount
+        with self._lock:
+            self._count += 1
+            due = self._count % self.prune_every == 0
+            if not inserted:
+                self.duplicates += 1
+        if due:
+            conn.execute("DELETE FROM seen_messages WHERE seen_at < ?", (now - self.window_seconds,))
+        return not inserted
+
+    def stats(self):
+        tracked = self._conn().execute("SELECT COUNT(*) FROM seen_messages").fetchone()[0]
+        return {"tracked": tracked, "duplicates": self.duplicates, "window_seconds": self.window_seconds}
+
+
+def open_deduper():
+    return MessageDeduper(
+        os.getenv("webhook_dedup_db", "webhook_events.db"),
+        window_seconds=float(os.getenv("webhook_dedup_window_seconds", str(24 * 3600))),
+    )